@@ -1,60 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import defer
 from sqlmodel import select
 from datetime import datetime
 import json
-from app.db.session import get_session
+from app.db.session import get_async_session, get_session
 from app.db.models import AnnotatedFrame, SessionDB
-from app.schemas.keyframes import KeyframeRequest, KeyframeResponse, KeyframeListResponse
+from app.db.session_data import (
+    KEYFRAME_PAYLOAD_COLUMNS, decode_cursor, delete_keyframes, keyframe_metadata, keyframe_metadata_page
+)
+from app.schemas.keyframes import KeyframeRequest, KeyframeResponse, KeyframeListResponse, KeyframePageResponse
+from app.core.config import settings
 from app.services.keyframe_detector import keyframe_detector
+from app.services.form_flags import form_flag_detector
+from app.services.blob_store import blob_store
+from app.services.keyframe_writer import keyframe_writer
+from app.services.compaction import compaction_scheduler
+from app.services.keyframe_storage import (
+    blob_path, image_etag, image_fields, load_frame_bytes, pack_landmarks, thumbnail_for
+)
 from sqlmodel import Session as SQLSession
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
 
 @router.post("/keyframes", response_model=KeyframeResponse)
-def store_keyframe(keyframe: KeyframeRequest, db: SQLSession = Depends(get_session)):
+async def store_keyframe(keyframe: KeyframeRequest, db: AsyncSession = Depends(get_async_session)):
     """Store an annotated keyframe"""
     
     # Verify session exists
-    session = db.get(SessionDB, keyframe.session_id)
+    session = await db.get(SessionDB, keyframe.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Create annotated frame record
+    # Create annotated frame record; base64/JSON from the client is stored as binary
     annotated_frame = AnnotatedFrame(
         session_id=keyframe.session_id,
-        frame_data=keyframe.frame_data,
         keyframe_type=keyframe.keyframe_type,
         timestamp=datetime.now(),
         exercise=keyframe.exercise,
-        pose_landmarks=json.dumps(keyframe.pose_landmarks)
+        landmarks_packed=pack_landmarks(keyframe.pose_landmarks),
+        **await run_in_threadpool(image_fields, keyframe.frame_data)  # Blob store write is file I/O
     )
     
     db.add(annotated_frame)
-    db.commit()
-    db.refresh(annotated_frame)
+    await db.commit()
     
     return KeyframeResponse(
         id=annotated_frame.id,
         session_id=annotated_frame.session_id,
         keyframe_type=annotated_frame.keyframe_type,
         timestamp=annotated_frame.timestamp,
-        exercise=annotated_frame.exercise
+        exercise=annotated_frame.exercise,
+        image_digest=annotated_frame.frame_ref
     )
 
 @router.get("/sessions/{session_id}/keyframes", response_model=KeyframeListResponse)
-def get_session_keyframes(session_id: int, db: SQLSession = Depends(get_session)):
+async def get_session_keyframes(session_id: int, db: AsyncSession = Depends(get_async_session)):
     """Get all keyframes for a session"""
     
     # Verify session exists
-    session = db.get(SessionDB, session_id)
+    session = await db.get(SessionDB, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get keyframes
-    keyframes = db.exec(
-        select(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
-        .order_by(AnnotatedFrame.timestamp)
-    ).all()
+    # Get keyframe metadata only; images are never read for a listing
+    keyframes = await db.run_sync(keyframe_metadata, session_id)
     
     keyframe_responses = [
         KeyframeResponse(
@@ -62,7 +74,8 @@ def get_session_keyframes(session_id: int, db: SQLSession = Depends(get_session)
             session_id=kf.session_id,
             keyframe_type=kf.keyframe_type,
             timestamp=kf.timestamp,
-            exercise=kf.exercise
+            exercise=kf.exercise,
+            image_digest=kf.frame_ref
         )
         for kf in keyframes
     ]
@@ -72,6 +85,104 @@ def get_session_keyframes(session_id: int, db: SQLSession = Depends(get_session)
         total_count=len(keyframe_responses)
     )
 
+@router.get("/sessions/{session_id}/keyframes/page", response_model=KeyframePageResponse)
+async def get_session_keyframes_page(
+    session_id: int,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Get one page of keyframe metadata; follow next_cursor for the rest"""
+    
+    # Verify session exists
+    session = await db.get(SessionDB, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows, next_cursor = await db.run_sync(keyframe_metadata_page, session_id, after, limit)
+    return KeyframePageResponse(
+        keyframes=[
+            KeyframeResponse(
+                id=kf.id,
+                session_id=kf.session_id,
+                keyframe_type=kf.keyframe_type,
+                timestamp=kf.timestamp,
+                exercise=kf.exercise,
+                image_digest=kf.frame_ref
+            )
+            for kf in rows
+        ],
+        next_cursor=next_cursor
+    )
+
+# A URL carrying the image digest (?v=, KeyframeResponse.image_digest) names
+# one exact image: compaction re-encodes under a new digest, hence a new URL,
+# so browsers and proxies may keep it forever. Unversioned URLs can change
+# content under the same keyframe id and are revalidated every time; the ETag
+# is the image hash, so an unchanged image costs a 304 without reading it
+IMAGE_CACHE_CONTROL = "no-cache"
+VERSIONED_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+@router.get("/sessions/{session_id}/keyframes/{keyframe_id}/image")
+def get_keyframe_image(
+    session_id: int,
+    keyframe_id: int,
+    request: Request,
+    size: str = Query("full", pattern="^(full|thumb)$"),
+    v: str | None = None,
+    db: SQLSession = Depends(get_session)
+):
+    """Raw JPEG of a keyframe, full size or as a thumbnail, with a strong ETag; `v` is the image digest"""
+    keyframe = db.exec(
+        select(AnnotatedFrame)
+        .options(*[defer(column) for column in KEYFRAME_PAYLOAD_COLUMNS])
+        .where(AnnotatedFrame.id == keyframe_id)
+        .where(AnnotatedFrame.session_id == session_id)
+    ).first()
+    if not keyframe:
+        raise HTTPException(status_code=404, detail="Keyframe not found")
+    
+    # Blob-stored images are named by their hash, so a revalidation needs no read
+    digest = image_etag(keyframe)
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Keyframe has no image")
+    etag = f'"{digest}"' if size == "full" else f'"{digest}-t{settings.KEYFRAME_THUMB_SIZE}"'
+    # A stale version (the image was re-encoded since) gets the current image, revalidated
+    cache_control = VERSIONED_IMAGE_CACHE_CONTROL if v == digest else IMAGE_CACHE_CONTROL
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    path = blob_path(keyframe)
+    if size == "full" and path is not None:
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Keyframe image missing from blob store")
+        # Streamed from the blob file rather than read into memory first
+        return FileResponse(path, media_type="image/jpeg", headers=headers)
+    
+    try:
+        data = load_frame_bytes(keyframe)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Keyframe image missing from blob store")
+    if size == "thumb":
+        try:
+            data = thumbnail_for(digest, data, settings.KEYFRAME_THUMB_SIZE)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
 @router.delete("/sessions/{session_id}/keyframes")
 def clear_session_keyframes(session_id: int, db: SQLSession = Depends(get_session)):
     """Clear all keyframes for a session"""
@@ -81,27 +192,38 @@ def clear_session_keyframes(session_id: int, db: SQLSession = Depends(get_sessio
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Delete keyframes
-    keyframes = db.exec(
-        select(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
-    ).all()
-    
-    for kf in keyframes:
-        db.delete(kf)
+    # Keyframes still queued for writing would outlive the cleanup
+    keyframe_writer.flush(session_id)
     
+    # Delete keyframes in one statement, without loading their images
+    deleted = delete_keyframes(db, session_id)
     db.commit()
     
+    # Drop image blobs no other keyframe references
+    blob_store.release(db, deleted['frame_refs'])
+    
     # Reset detector state
     keyframe_detector.reset_session(session_id)
+    form_flag_detector.reset_session(session_id)
     
-    return {"message": f"Cleared {len(keyframes)} keyframes for session {session_id}"}
+    return {
+        "message": f"Cleared {deleted['keyframes']} keyframes for session {session_id}",
+        "deleted_keyframes": deleted['keyframes']
+    }
+
+@router.post("/compact")
+def compact_keyframe_storage():
+    """Apply keyframe retention now and report the bytes reclaimed"""
+    # Keyframes still queued for writing must not be swept as orphans
+    keyframe_writer.flush()
+    return compaction_scheduler.run_once()
 
 @router.get("/sessions/{session_id}/rep-count")
-def get_session_rep_count(session_id: int, db: SQLSession = Depends(get_session)):
+async def get_session_rep_count(session_id: int, db: AsyncSession = Depends(get_async_session)):
     """Get current rep count for a session"""
     
     # Verify session exists
-    session = db.get(SessionDB, session_id)
+    session = await db.get(SessionDB, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -114,3 +236,18 @@ def get_session_rep_count(session_id: int, db: SQLSession = Depends(get_session)
         "rep_count": rep_count,
         "counts_reps": session.exercise in ['squat', 'pushup', 'lunges']
     }
+
+@router.get("/sessions/{session_id}/plank-stats")
+async def get_session_plank_stats(session_id: int, db: AsyncSession = Depends(get_async_session)):
+    """Get continuous plank hold statistics for a session"""
+    
+    # Verify session exists
+    session = await db.get(SessionDB, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {
+        "session_id": session_id,
+        "exercise": session.exercise,
+        **keyframe_detector.get_plank_stats(session_id)
+    }
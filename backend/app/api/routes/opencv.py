@@ -1,5 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.services.frame_processor import process_frame
+from app.services.frame_processor import extract_pose, detect_keyframe, error_result
+from app.services.frame_reorder import frame_reorder_buffer
+from app.services.keyframe_detector import keyframe_detector
+from app.services.keyframe_writer import keyframe_writer
 from app.schemas.opencv import FrameRequest
 from app.schemas.keyframes import KeyframeRequest
 from app.db.session import get_session
@@ -11,9 +14,59 @@ import numpy as np
 from PIL import Image
 import io
 import json
+from datetime import datetime
 
 router = APIRouter()
 
+def _store_keyframe(result: dict, session_id: int, exercise: str):
+    """Queue the frame for persistence if the detector flagged it as a keyframe"""
+    if result.get('should_save_keyframe') and result.get('keyframe_type'):
+        print(f"💾 [KEYFRAME SAVE] Session {session_id}: Queueing {result.get('keyframe_type')} keyframe")
+        # Written in a background batch; the response does not wait for the commit
+        keyframe_writer.submit(
+            session_id, exercise, result['keyframe_type'], result.get('timestamp'),
+            result.get('landmarks'), result['annotated_jpeg']
+        )
+        result['keyframe_queued'] = True
+    else:
+        print(f"⏭️ [NO KEYFRAME] Session {session_id}: No keyframe to save (should_save={result.get('should_save_keyframe')}, type={result.get('keyframe_type')})")
+
+def _decode_frame(frame: str):
+    """Decode a base64 (optionally data URL) JPEG into an OpenCV BGR image"""
+    # Remove the data URL prefix (e.g., "data:image/jpeg;base64,")
+    if frame.startswith('data:image'):
+        header, encoded = frame.split(',', 1)
+        frame_data = base64.b64decode(encoded)
+    else:
+        # If it's just base64 without data URL prefix
+        frame_data = base64.b64decode(frame)
+    
+    # Convert PIL Image to OpenCV format (BGR)
+    image = Image.open(io.BytesIO(frame_data))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+def _detect(session_id: int, exercise: str, item):
+    """Run keyframe detection for a decoded frame (released in order for sequenced clients)"""
+    pose, captured_at = item
+    if isinstance(pose, Exception):
+        return error_result(session_id, pose)
+    landmarks, landmarks_list, annotated_jpeg = pose
+    return detect_keyframe(session_id, exercise, landmarks, landmarks_list, annotated_jpeg, captured_at)
+
+def _frame_response(result: dict, return_image: bool) -> dict:
+    """Drop raw JPEG bytes from a frame result; base64 only if the client asked for the image"""
+    annotated_jpeg = result.pop('annotated_jpeg', None)
+    if return_image and annotated_jpeg is not None:
+        result['annotated_image'] = base64.b64encode(annotated_jpeg).decode('utf-8')
+    return result
+
+def drain_frames(session_id: int, exercise: str):
+    """Detect and store frames still held in the reorder window (on session stop)"""
+    released = frame_reorder_buffer.drain(session_id, lambda item: _detect(session_id, exercise, item))
+    for seq in sorted(released):
+        _store_keyframe(released[seq], session_id, exercise)
+    return released
+
 @router.post("/frames/{session_id}")
 def process_frame_endpoint(request: FrameRequest, session_id: int, db: SQLSession = Depends(get_session)):
     try:
@@ -24,85 +77,42 @@ def process_frame_endpoint(request: FrameRequest, session_id: int, db: SQLSessio
         
         exercise = session.exercise
         
-        # Decode the base64 data URL
-        # Remove the data URL prefix (e.g., "data:image/jpeg;base64,")
-        if request.frame.startswith('data:image'):
-            header, encoded = request.frame.split(',', 1)
-            frame_data = base64.b64decode(encoded)
-        else:
-            # If it's just base64 without data URL prefix
-            frame_data = base64.b64decode(request.frame)
+        # Late or duplicate frames are dropped before decoding and inference
+        if request.seq is not None and frame_reorder_buffer.is_stale(session_id, request.seq):
+            return {"status": "dropped", "seq": request.seq}
         
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(frame_data))
+        captured_at = request.captured_at or datetime.now()
+        try:
+            pose = extract_pose(_decode_frame(request.frame), session_id)
+        except Exception as e:
+            pose = e
         
-        # Convert PIL Image to OpenCV format (BGR)
-        opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        if request.seq is None:
+            # Unsequenced client: detect immediately, in arrival order
+            print(f"🔍 [OPENCV ROUTE] Session {session_id}: Detecting keyframe with exercise={exercise}")
+            result = _detect(session_id, exercise, (pose, captured_at))
+            _store_keyframe(result, session_id, exercise)
+            return {"status": "success", "result": _frame_response(result, request.return_image)}
         
-        # Process the frame with session info
-        print(f"🔍 [OPENCV ROUTE] Session {session_id}: Calling process_frame with exercise={exercise}")
-        result = process_frame(opencv_image, session_id=session_id, exercise=exercise)
-        print(f"🔍 [OPENCV ROUTE] Session {session_id}: process_frame returned result keys: {list(result.keys())}")
+        # Pose inference runs in parallel across requests; keyframe detection
+        # sees the frames in capture order through the reorder buffer
+        released = frame_reorder_buffer.submit(
+            session_id, request.seq, (pose, captured_at),
+            lambda item: _detect(session_id, exercise, item)
+        )
         
-        # If this is a keyframe, store it
-        if result.get('should_save_keyframe') and result.get('keyframe_type'):
-            print(f"💾 [KEYFRAME SAVE] Session {session_id}: Saving {result.get('keyframe_type')} keyframe to database")
-            
-            # Test database connection
-            try:
-                from sqlmodel import select
-                test_query = db.exec(select(SessionDB).where(SessionDB.id == session_id)).first()
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: Database connection test - found session: {test_query is not None}")
-            except Exception as e:
-                print(f"❌ [KEYFRAME DEBUG] Session {session_id}: Database connection test failed: {e}")
-            
-            # Create annotated frame record
-            from app.db.models import AnnotatedFrame
-            from datetime import datetime
-            
-            annotated_frame = AnnotatedFrame(
-                session_id=session_id,
-                frame_data=result['annotated_image'],
-                keyframe_type=result['keyframe_type'],
-                timestamp=datetime.now(),
-                exercise=exercise,
-                pose_landmarks=json.dumps([
-                    {"name": name, "x": coords[0], "y": coords[1]} 
-                    for name, coords in result.get('landmarks', {}).items()
-                ] if result.get('landmarks') else [])
-            )
-            
-            try:
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: About to save keyframe")
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: frame_data length: {len(annotated_frame.frame_data)}")
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: keyframe_type: {annotated_frame.keyframe_type}")
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: exercise: {annotated_frame.exercise}")
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: pose_landmarks length: {len(annotated_frame.pose_landmarks)}")
-                
-                db.add(annotated_frame)
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: Added to session")
-                
-                db.commit()
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: Committed to database")
-                
-                db.refresh(annotated_frame)
-                print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: Refreshed object")
-                
-                result['keyframe_stored'] = True
-                result['keyframe_id'] = annotated_frame.id
-                print(f"✅ [KEYFRAME SAVED] Session {session_id}: Keyframe saved with ID {annotated_frame.id}")
-            except Exception as e:
-                print(f"❌ [KEYFRAME SAVE ERROR] Session {session_id}: Failed to save keyframe - {str(e)}")
-                print(f"❌ [KEYFRAME SAVE ERROR] Session {session_id}: Exception type: {type(e)}")
-                import traceback
-                print(f"❌ [KEYFRAME SAVE ERROR] Session {session_id}: Traceback: {traceback.format_exc()}")
-                db.rollback()
-                result['keyframe_stored'] = False
-                result['keyframe_id'] = None
-        else:
-            print(f"⏭️ [NO KEYFRAME] Session {session_id}: No keyframe to save (should_save={result.get('should_save_keyframe')}, type={result.get('keyframe_type')})")
+        # Frames released by this request may include earlier frames held back by other requests
+        for seq in sorted(released):
+            _store_keyframe(released[seq], session_id, exercise)
+            _frame_response(released[seq], request.return_image)
         
-        return {"status": "success", "result": result}
+        if request.seq not in released:
+            return {
+                "status": "pending",
+                "seq": request.seq,
+                "current_rep_count": keyframe_detector.get_rep_count(session_id)
+            }
+        return {"status": "success", "seq": request.seq, "result": released[request.seq]}
         
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
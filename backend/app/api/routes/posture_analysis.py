@@ -1,16 +1,24 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session as SQLSession, select
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session as SQLSession
 from app.db.session import get_session
-from app.db.models import SessionDB, AnnotatedFrame, SessionMetric
+from app.db.models import SessionDB
+from app.db.session_data import count_keyframes, purge_session, sample_size
 from app.services.gemini_service import get_gemini_analyzer
+from app.services.analysis_stream import sse_event, stream_analysis
+from app.services.analysis_jobs import (
+    QueueFullError, TERMINAL_STATUSES, analysis_job_queue, analysis_response, job_response
+)
 from app.schemas.posture_analysis import (
+    AnalysisJobRequest,
+    AnalysisJobResponse,
     SessionAnalysisRequest, 
     SessionAnalysisResponse, 
-    SessionCleanupResponse,
-    PostureAnalysis
+    SessionCleanupResponse
 )
 from app.core.config import settings
-from datetime import datetime
 import json
 
 router = APIRouter()
@@ -44,8 +52,8 @@ def analyze_session_posture(
         
         # Perform Gemini analysis
         try:
-            print(f"🔍 [ANALYSIS ROUTE] Getting Gemini analyzer...")
-            analyzer = get_gemini_analyzer()
+            print(f"🔍 [ANALYSIS ROUTE] Getting analyzer ({settings.ANALYSIS_PROVIDER})...")
+            analyzer = analysis_job_queue.provider()
             print(f"🔍 [ANALYSIS ROUTE] Calling analyze_session_posture...")
             analysis_result = analyzer.analyze_session_posture(
                 request.session_id, 
@@ -70,35 +78,103 @@ def analyze_session_posture(
                 detail=analysis_result["message"]
             )
         
-        # Parse suggestions into structured format
-        suggestions_data = analysis_result.get("suggestions", {})
-        posture_analysis = None
-        
-        if suggestions_data and "overall_assessment" in suggestions_data:
-            posture_analysis = PostureAnalysis(
-                overall_assessment=suggestions_data.get("overall_assessment", ""),
-                strengths=suggestions_data.get("strengths", []),
-                areas_for_improvement=suggestions_data.get("areas_for_improvement", []),
-                specific_suggestions=suggestions_data.get("specific_suggestions", []),
-                exercise_specific_tips=suggestions_data.get("exercise_specific_tips", []),
-                next_session_focus=suggestions_data.get("next_session_focus", "")
-            )
-        
-        return SessionAnalysisResponse(
-            status="success",
-            session_id=request.session_id,
-            exercise=session.exercise,
-            total_keyframes=analysis_result["total_keyframes"],
-            analyzed_keyframes=analysis_result["analyzed_keyframes"],
-            suggestions=posture_analysis,
-            analysis_timestamp=datetime.fromisoformat(analysis_result["analysis_timestamp"])
-        )
+        return analysis_response(request.session_id, session.exercise, analysis_result)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/jobs", response_model=AnalysisJobResponse, status_code=202)
+def submit_analysis_job(request: AnalysisJobRequest, db: SQLSession = Depends(get_session)):
+    """
+    Queue a posture analysis and return its job id immediately.
+    Poll GET /analysis/jobs/{job_id} or follow /analysis/jobs/{job_id}/events.
+    """
+    session = db.get(SessionDB, request.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.end_ts:
+        raise HTTPException(
+            status_code=400, 
+            detail="Session must be ended before analysis can be performed"
+        )
+    try:
+        job = analysis_job_queue.submit(request.session_id, cleanup=request.cleanup)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+def get_analysis_job(job_id: str):
+    """Status of an analysis job, with the result once it has succeeded"""
+    job = analysis_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+# Seconds between status checks of an SSE job stream
+JOB_EVENTS_POLL_SEC = 0.5
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """Server-sent events: a 'status' event per change, then 'result' with the final job"""
+    if await run_in_threadpool(analysis_job_queue.status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last = None
+        while True:
+            status = await run_in_threadpool(analysis_job_queue.status, job_id)
+            if status != last:
+                last = status
+                yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+            if status in TERMINAL_STATUSES:
+                job = await run_in_threadpool(analysis_job_queue.get, job_id)
+                yield f"event: result\ndata: {job_response(job).model_dump_json()}\n\n"
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SEC)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/stream/{session_id}")
+def stream_session_analysis(session_id: int, db: SQLSession = Depends(get_session)):
+    """
+    Server-sent events for one analysis as it is produced: a local 'preview',
+    model 'delta's and 'section's, then 'result' (see app.services.analysis_stream)
+    """
+    session = db.get(SessionDB, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.end_ts:
+        raise HTTPException(
+            status_code=400, 
+            detail="Session must be ended before analysis can be performed"
+        )
+    try:
+        analyzer = analysis_job_queue.provider()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=f"AI analysis service unavailable: {str(e)}")
+    exercise = session.exercise
+    # The request's session is closed before the body is sent
+    engine = db.get_bind()
+    
+    def events():
+        try:
+            with SQLSession(engine) as stream_db:
+                for event, data in stream_analysis(analyzer, session_id, exercise, stream_db):
+                    if event != "result":
+                        yield sse_event(event, json.dumps(data))
+                    elif data.get("status") == "error":
+                        yield sse_event("error", json.dumps({"detail": data.get("message", "Analysis failed")}))
+                    else:
+                        yield sse_event(event, analysis_response(session_id, exercise, data).model_dump_json())
+        except Exception as e:
+            print(f"❌ [ANALYSIS ROUTE] Streamed analysis failed for session {session_id}: {e}")
+            yield sse_event("error", json.dumps({"detail": f"Analysis failed: {str(e)}"}))
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.post("/cleanup/{session_id}", response_model=SessionCleanupResponse)
 def cleanup_session_data(session_id: int, db: SQLSession = Depends(get_session)):
     """
@@ -110,35 +186,15 @@ def cleanup_session_data(session_id: int, db: SQLSession = Depends(get_session))
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Count keyframes before deletion
-        keyframes = db.exec(
-            select(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
-        ).all()
-        keyframe_count = len(keyframes)
-        
-        # Delete all keyframes for this session
-        for keyframe in keyframes:
-            db.delete(keyframe)
-        
-        # Delete all session metrics
-        metrics = db.exec(
-            select(SessionMetric).where(SessionMetric.session_id == session_id)
-        ).all()
-        for metric in metrics:
-            db.delete(metric)
-        
-        # Delete the session itself
-        db.delete(session)
-        
-        # Commit all deletions
-        db.commit()
+        # Delete keyframes, metrics and the session itself, one statement per table
+        deleted = purge_session(db, session_id)
         
         return SessionCleanupResponse(
             status="success",
             session_id=session_id,
-            deleted_keyframes=keyframe_count,
-            deleted_session=True,
-            message=f"Successfully deleted {keyframe_count} keyframes and session data"
+            deleted_keyframes=deleted['keyframes'],
+            deleted_session=deleted['sessions'] > 0,
+            message=f"Successfully deleted {deleted['keyframes']} keyframes and session data"
         )
         
     except HTTPException:
@@ -198,15 +254,15 @@ def get_keyframe_count(session_id: int, db: SQLSession = Depends(get_session)):
     Get the count of keyframes for a session (useful for checking before analysis)
     """
     try:
-        keyframes = db.exec(
-            select(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
-        ).all()
+        keyframe_count = count_keyframes(db, session_id)
+        # Analyzers read the sample_keyframes sample of this size
+        size = sample_size(db, session_id, settings.ANALYSIS_MAX_CANDIDATES)
         
         return {
             "session_id": session_id,
-            "keyframe_count": len(keyframes),
-            "will_sample": len(keyframes) > 150,
-            "sample_size": min(150, len(keyframes)) if len(keyframes) > 150 else len(keyframes)
+            "keyframe_count": keyframe_count,
+            "will_sample": size < keyframe_count,
+            "sample_size": size
         }
         
     except Exception as e:
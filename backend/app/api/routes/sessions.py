@@ -1,67 +1,89 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timezone
-from app.db.session import get_session, init_db
-from app.db.models import SessionDB, SessionMetric
+from app.db.session import get_async_session
+from app.db.models import SessionDB, SessionMetric, SessionRollup
+from app.db.session_data import add_flags_to_session, add_metric_to_rollup
+from app.api.routes.opencv import drain_frames
+from app.services.keyframe_writer import keyframe_writer
+from app.services.form_flags import form_flag_detector, parse_flags_json, flags_from_counts
 from app.schemas.session import (
     SessionStartRequest, SessionStartResponse, MetricsIngest, SessionStopRequest, SessionSummary
 )
-from sqlmodel import Session as SQLSession
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
-init_db()
 
 @router.post("/start", response_model=SessionStartResponse)
-def start_session(payload: SessionStartRequest, db: SQLSession = Depends(get_session)):
+async def start_session(payload: SessionStartRequest, db: AsyncSession = Depends(get_async_session)):
     s = SessionDB(exercise=payload.exercise, user_id=payload.user_id, start_ts=datetime.now(timezone.utc))
     db.add(s)
-    db.commit()
-    db.refresh(s)
+    await db.commit()
     return SessionStartResponse(session_id=s.id)
 
 @router.post("/{session_id}/metrics")
-def ingest_metrics(session_id: int, m: MetricsIngest, db: SQLSession = Depends(get_session)):
-    s = db.get(SessionDB, session_id)
+async def ingest_metrics(session_id: int, m: MetricsIngest, db: AsyncSession = Depends(get_async_session)):
+    s = await db.get(SessionDB, session_id)
     if not s:
         raise HTTPException(status_code=404, detail="session not found")
+    flags = form_flag_detector.interval_aggregate(session_id)  # Form flag counts since last ingest
     rec = SessionMetric(
         session_id=session_id,
         reps=m.reps,
         avg_score=m.avg_score,
-        flags_json="[]",  # Empty flags array
+        flags_json=json.dumps(flags, separators=(',', ':')),
         duration_sec=m.duration_sec,
         ts=m.ts,
     )
     db.add(rec)
-    db.commit()
+    await db.flush()  # INSERT first so the rollup update below runs under the write lock
+    await db.run_sync(add_metric_to_rollup, rec)
+    await db.commit()
+    # Only stored counts are cleared; if the commit failed they go with the next ingest
+    form_flag_detector.clear_aggregate(session_id, flags)
     return {"ok": True}
 
 @router.post("/{session_id}/stop")
-def stop_session(session_id: int, payload: SessionStopRequest, db: SQLSession = Depends(get_session)):
-    s = db.get(SessionDB, session_id)
+async def stop_session(session_id: int, payload: SessionStopRequest, db: AsyncSession = Depends(get_async_session)):
+    s = await db.get(SessionDB, session_id)
     if not s:
         raise HTTPException(status_code=404, detail="session not found")
     s.end_ts = payload.ts
     db.add(s)
-    db.commit()
+    await db.commit()
+    # Frames held back waiting for an earlier sequence number would otherwise never be detected
+    await run_in_threadpool(drain_frames, session_id, s.exercise)
+    # Analysis runs on the stored keyframes, so write out any still queued
+    await run_in_threadpool(keyframe_writer.flush, session_id)
+    # Flags counted since the last ingest (including the drained frames) would go with the reset
+    flags = form_flag_detector.interval_aggregate(session_id)
+    if flags['frames']:
+        await db.run_sync(add_flags_to_session, session_id, flags, payload.ts)
+        await db.commit()
+    form_flag_detector.reset_session(session_id)
     return {"ok": True}
 
 @router.get("/{session_id}/summary", response_model=SessionSummary)
-def session_summary(session_id: int, db: SQLSession = Depends(get_session)):
-    s = db.get(SessionDB, session_id)
+async def session_summary(session_id: int, db: AsyncSession = Depends(get_async_session)):
+    s = await db.get(SessionDB, session_id)
     if not s:
         raise HTTPException(status_code=404, detail="session not found")
-    metrics = db.exec(select(SessionMetric).where(SessionMetric.session_id == session_id)).all()
-    total_reps = sum(m.reps for m in metrics)
-    avg_score = (sum(m.avg_score for m in metrics) / len(metrics)) if metrics else 0.0
-    duration = sum(m.duration_sec for m in metrics)
+    # Maintained by ingest_metrics, so this is one row however many metrics the session has
+    rollup = await db.get(SessionRollup, session_id) or SessionRollup(session_id=session_id)
+    flag_counts = parse_flags_json(rollup.flags_json)
 
     return SessionSummary(
         session_id=session_id,
-        total_reps=total_reps,
-        avg_score=avg_score,
-        duration_sec=duration,
+        total_reps=rollup.reps_sum,
+        avg_score=(rollup.score_sum / rollup.metric_count) if rollup.metric_count else 0.0,
+        duration_sec=rollup.duration_sum,
         exercise=s.exercise,
         start_ts=s.start_ts,
         end_ts=s.end_ts,
+        min_score=rollup.score_min,
+        max_score=rollup.score_max,
+        last_metric_ts=rollup.last_ts,
+        flag_counts=flag_counts["counts"],
+        flags=flags_from_counts(flag_counts),
     )
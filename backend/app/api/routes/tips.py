@@ -1,13 +1,14 @@
 from fastapi import APIRouter
 from app.schemas.tips import TipsRequest, TipsResponse
-from app.services.tips import gemini_tips, rule_based_tips
+from app.services.tips import tips_cache
+from app.services.form_flags import form_flag_detector
 
 router = APIRouter()
 
 @router.post("/tips", response_model=TipsResponse)
 def generate_tips(payload: TipsRequest):
-    tips = gemini_tips(payload.exercise, payload.flags, payload.level)
-    source = "gemini" if tips else "rule-based"
-    if not tips:
-        tips = rule_based_tips(payload.exercise, payload.flags, payload.level)
+    flags = payload.flags
+    if not flags and payload.session_id is not None:
+        flags = form_flag_detector.active_flags(payload.session_id)
+    tips, source = tips_cache.get(payload.exercise, flags, payload.level)
     return TipsResponse(tips=tips, source=source)
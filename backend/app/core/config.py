@@ -7,7 +7,46 @@ class Settings(BaseSettings):
     APP_PORT: int = 8000
     CORS_ORIGINS: str = "http://localhost:3000,http://127.0.0.1:5173,http://localhost:5173,http://localhost:5174,http://127.0.0.1:5174,http://localhost:5175,http://127.0.0.1:5175"
     DATABASE_URL: str = "sqlite:///./trainer.db"
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 8  # Connections kept open (frame writer + request threads)
+    DB_MAX_OVERFLOW: int = 8
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_BUSY_TIMEOUT_MS: int = 5000  # Wait for a competing writer instead of failing with "database is locked"
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024  # Bytes of the database file read through mmap
+    BLOB_STORE_DIR: str = "./keyframe_blobs"  # Content-addressed keyframe images
+    KEYFRAME_IMAGE_STORAGE: str = "blob"  # "blob" (files in BLOB_STORE_DIR) or "db" (LargeBinary column)
+    KEYFRAME_THUMB_SIZE: int = 320  # Longest side of keyframe thumbnails, in pixels
+    RETENTION_FULL_IMAGE_DAYS: int = 7  # Older keyframes are downsampled to thumbnails
+    RETENTION_IMAGE_DAYS: int = 30  # Older keyframes keep landmarks only
+    COMPACTION_INTERVAL_SEC: int = 6 * 3600  # Background compaction period; 0 disables
+    KEYFRAME_FLUSH_INTERVAL_MS: int = 250  # Write-behind keyframe batch interval
+    KEYFRAME_FLUSH_MAX_ROWS: int = 64  # ...or flush as soon as this many keyframes are queued
+    ANALYSIS_PROVIDER: str = "gemini"  # Posture analysis backend: "gemini", "local" or "hedged"
+    ANALYSIS_LLM_BUDGET_SEC: float = 8.0  # "hedged": wait this long for Gemini before answering locally
+    ANALYSIS_WORKERS: int = 2  # Concurrent analysis jobs
+    ANALYSIS_JOB_TIMEOUT_SEC: float = 120.0  # From when the job's provider call starts
+    ANALYSIS_JOB_QUEUE_TIMEOUT_SEC: float = 120.0  # Jobs whose call has not started by then end as "timeout"
+    ANALYSIS_MAX_PENDING: int = 100  # Queued + running jobs before submissions get 429
+    ANALYSIS_MAX_IMAGES: int = 8  # Keyframe images attached to one analysis request
+    ANALYSIS_MAX_CANDIDATES: int = 240  # Keyframes read (sampled evenly in SQL) to choose those images from
+    ANALYSIS_TOKEN_BUDGET: int = 8000  # Prompt text + image tokens per analysis request
+    ANALYSIS_IMAGE_BYTES_BUDGET: int = 512 * 1024  # Total downscaled JPEG bytes per analysis request
+    ANALYSIS_CACHE_TTL_SEC: int = 7 * 24 * 3600  # Cached analyses of identical keyframes; 0 disables
+    TIPS_CACHE_SIZE: int = 256  # (exercise, flags, level) combinations kept
+    TIPS_CACHE_TTL_SEC: float = 3600.0  # Gemini tips are served without refreshing this long
+    TIPS_CACHE_STALE_SEC: float = 86400.0  # ...then served stale while refreshed in the background
+    TIPS_CACHE_FALLBACK_TTL_SEC: float = 60.0  # Rule-based answers (Gemini unavailable) go stale sooner
+    TIPS_WARMUP: bool = False  # Precompute common combinations at startup (calls Gemini)
     GEMINI_API_KEY: str | None = None
+    LLM_TIMEOUT_SEC: float = 60.0  # Deadline per posture analysis call, retries included
+    LLM_TIPS_TIMEOUT_SEC: float = 5.0  # Deadline per /tips call; rule-based tips are used past it
+    LLM_MAX_RETRIES: int = 2  # Retries of timeouts, connection errors, 429 and 5xx
+    LLM_BACKOFF_BASE_SEC: float = 0.5
+    LLM_BACKOFF_MAX_SEC: float = 4.0
+    LLM_BREAKER_FAILURES: int = 5  # Consecutive failed calls that open the circuit
+    LLM_BREAKER_RESET_SEC: float = 30.0  # Open circuit refuses calls this long before one probe
+    LLM_MAX_CONCURRENCY: int = 4  # Calls in flight; more are refused instead of waiting
     GEMINI_MODEL: str = "gemini-1.5-flash"
 
     class Config:
@@ -1,13 +1,12 @@
-from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel import SQLModel, Session
 from app.db.models import *
-
-DATABASE_URL = "sqlite:///trainer.db"
-engine = create_engine(DATABASE_URL, echo=True)
+from app.db.migrations import run_migrations
+from app.db.session import engine  # The one shared application engine
 
 def get_db():
     with Session(engine) as session:
         yield session
 
 def create_db_and_tables():
-    """Create all database tables"""
-    SQLModel.metadata.create_all(engine)
+    """Create all database tables and apply pending migrations"""
+    run_migrations(engine)
@@ -0,0 +1,122 @@
+"""
+Versioned schema/data migrations.
+
+run_migrations() creates missing tables, adds missing nullable columns, then
+applies each (version, name, fn(engine)) step newer than the version
+recorded in the schemaversion table, in order. New steps are appended to
+MIGRATIONS; applied steps are never edited.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session, select, func
+from app.db.models import AnnotatedFrame, SchemaVersion, SessionMetric, User
+
+
+def add_missing_columns(engine):
+    """Add nullable model columns that older databases lack (create_all only creates tables)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+
+
+def _binary_keyframes(engine, batch_size: int = 200):
+    """v1: move base64 frame_data / JSON pose_landmarks into binary columns"""
+    from app.services.keyframe_storage import image_fields, keyframe_landmarks, pack_landmarks
+
+    converted = 0
+    last_id = 0
+    while True:
+        with Session(engine) as db:
+            rows = db.exec(
+                select(AnnotatedFrame)
+                .where(AnnotatedFrame.id > last_id)
+                .where((AnnotatedFrame.frame_data != "") | (AnnotatedFrame.pose_landmarks != "[]"))
+                .order_by(AnnotatedFrame.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                if row.frame_data and not row.frame_ref and not row.frame_bytes:
+                    fields = image_fields(row.frame_data)
+                    if not fields.get('frame_data'):
+                        row.frame_ref = fields['frame_ref']
+                        row.frame_bytes = fields['frame_bytes']
+                        row.frame_data = ""
+                if row.pose_landmarks and row.pose_landmarks != "[]" and not row.landmarks_packed:
+                    row.landmarks_packed = pack_landmarks(keyframe_landmarks(row))
+                    row.pose_landmarks = "[]"
+                db.add(row)
+                converted += 1
+            db.commit()
+    print(f"🔍 [MIGRATION] Converted {converted} keyframes to binary columns")
+
+
+def _hot_query_indexes(engine):
+    """v2: create the indexes declared on the models for existing tables"""
+    inspector = inspect(engine)
+    with Session(engine) as db:
+        if "email" in {c["name"] for c in inspector.get_columns(User.__tablename__)}:
+            duplicates = db.exec(
+                select(User.email).group_by(User.email).having(func.count() > 1)
+            ).all()
+            if duplicates:
+                raise RuntimeError(f"Cannot create unique email index; duplicate users: {duplicates}")
+
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for index in table.indexes:
+                if all(column.name in existing for column in index.columns):
+                    index.create(conn, checkfirst=True)
+                else:
+                    print(f"⚠️ [MIGRATION] Skipping index {index.name}: {table.name} lacks its columns")
+
+
+def _session_rollups(engine):
+    """v3: back-fill SessionRollup for sessions that already have metrics"""
+    from app.db.session_data import rebuild_rollup
+
+    with Session(engine) as db:
+        session_ids = db.exec(select(SessionMetric.session_id).distinct()).all()
+        for session_id in session_ids:
+            rebuild_rollup(db, session_id)
+        db.commit()
+    print(f"🔍 [MIGRATION] Built rollups for {len(session_ids)} sessions")
+
+
+MIGRATIONS = [
+    (1, "binary_keyframe_columns", _binary_keyframes),
+    (2, "hot_query_indexes", _hot_query_indexes),
+    (3, "session_rollups", _session_rollups),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine) -> int:
+    with Session(engine) as db:
+        return db.exec(select(func.max(SchemaVersion.version))).one() or 0
+
+
+def run_migrations(engine):
+    """Bring the database up to SCHEMA_VERSION"""
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    version = current_version(engine)
+    for target, name, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        print(f"🔍 [MIGRATION] Applying v{target} {name}")
+        migrate(engine)
+        with Session(engine) as db:
+            db.add(SchemaVersion(version=target, name=name, applied_at=datetime.now(timezone.utc)))
+            db.commit()
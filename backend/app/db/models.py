@@ -1,8 +1,12 @@
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import SQLModel, Field
 
 class User(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_user_email", "email", unique=True),  # Login / register lookup
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     full_name: str | None = None
     email: str
@@ -16,6 +20,9 @@ class SessionDB(SQLModel, table=True):
     end_ts: datetime | None = None
 
 class SessionMetric(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_sessionmetric_session_id_ts", "session_id", "ts"),  # Summary / cleanup
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: int = Field(foreign_key="sessiondb.id")
     reps: int = 0
@@ -24,11 +31,56 @@ class SessionMetric(SQLModel, table=True):
     duration_sec: int = 0
     ts: datetime
 
+class SessionRollup(SQLModel, table=True):
+    """Running totals of a session's SessionMetric rows, updated by ingest_metrics"""
+    session_id: int = Field(primary_key=True, foreign_key="sessiondb.id")
+    metric_count: int = 0
+    reps_sum: int = 0
+    score_sum: float = 0.0
+    score_min: float | None = None
+    score_max: float | None = None
+    duration_sum: int = 0
+    flags_json: str = "{}"  # Merged form flag counts, see form_flags.merge_counts
+    last_ts: datetime | None = None
+
 class AnnotatedFrame(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_annotatedframe_session_id_timestamp", "session_id", "timestamp"),  # Listing / count / cleanup
+        Index("ix_annotatedframe_frame_ref", "frame_ref"),  # Blob reference counting
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: int = Field(foreign_key="sessiondb.id")
-    frame_data: str  # Base64 encoded annotated frame
-    keyframe_type: str  # 'bottom', 'top', 'middle', 'plank_interval'
+    frame_data: str = ""  # Base64 encoded annotated frame (legacy, pre schema v1)
+    frame_ref: Optional[str] = None  # Content hash of the image in the blob store
+    frame_bytes: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # JPEG bytes when stored in the DB
+    image_variant: Optional[str] = None  # None = full size; 'thumb' / 'none' after retention compaction
+    keyframe_type: str  # 'bottom', 'top', 'middle', 'plank_good', 'plank_sag', 'plank_pike'
     timestamp: datetime
     exercise: str
-    pose_landmarks: str = "[]"  # JSON string of pose landmarks
+    pose_landmarks: str = "[]"  # JSON string of pose landmarks (legacy, pre schema v1)
+    landmarks_packed: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # See keyframe_storage.pack_landmarks
+
+class AnalysisJob(SQLModel, table=True):
+    id: str = Field(primary_key=True)  # uuid4 hex
+    session_id: int = Field(index=True)
+    status: str = "queued"  # 'queued', 'running', 'succeeded', 'failed', 'timeout'
+    cleanup: bool = False  # Delete the session's data once analysed
+    result_json: str | None = None  # SessionAnalysisResponse JSON when succeeded
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+class AnalysisCacheEntry(SQLModel, table=True):
+    key: str = Field(primary_key=True)  # SHA-256 of the analysed keyframes, exercise and prompt version
+    session_id: int  # Session first analysed; entries outlive it until they expire
+    exercise: str
+    prompt_version: str
+    result_json: str  # Parsed suggestions
+    created_at: datetime
+    expires_at: datetime = Field(index=True)
+
+class SchemaVersion(SQLModel, table=True):
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime
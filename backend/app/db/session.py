@@ -1,11 +1,100 @@
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.core.config import settings
+from app.db import models  # Registers tables on SQLModel.metadata
+from app.db.migrations import run_migrations
 
-engine = create_engine(settings.DATABASE_URL, echo=False)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets frame writes and keyframe/summary reads proceed concurrently;
+    # NORMAL only fsyncs at checkpoints, which is durable enough under WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+    # Only takes effect before the first table exists, so set it on new files alone:
+    # on an existing database the pragma needs the write lock and would wait behind
+    # any open write. Compaction converts older databases once.
+    cursor.execute("PRAGMA page_count")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}")
+    cursor.close()
+
+
+def _engine_options(url, poolclass=QueuePool) -> dict:
+    options = {"echo": settings.DB_ECHO}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # One shared connection, or each checkout would see an empty database
+            options["poolclass"] = StaticPool
+        else:
+            options["poolclass"] = poolclass
+            if issubclass(poolclass, QueuePool):
+                options.update(
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                )
+    return options
+
+
+def make_engine(url: str = None, **kwargs):
+    """
+    Build the application engine. Every module shares the one created below;
+    tests may build their own with a different URL.
+    """
+    url = make_url(url or settings.DATABASE_URL)
+    options = _engine_options(url, kwargs.pop("poolclass", QueuePool))
+    engine = create_engine(url, **(options | kwargs))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url: str = None, **kwargs):
+    """Async engine on the same database (sqlite URLs are switched to aiosqlite)"""
+    url = make_url(url or settings.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    # aiosqlite defaults to NullPool; keep connections (and their threads) open instead
+    options = _engine_options(url, kwargs.pop("poolclass", AsyncAdaptedQueuePool))
+    engine = create_async_engine(url, **(options | kwargs))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
+_async_engine = None
+
+def get_async_engine():
+    # Created on first use, inside the running event loop
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = make_async_engine()
+    return _async_engine
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    """Create tables and apply pending migrations (called once at app startup)"""
+    run_migrations(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    """Session dependency for async routes: waiting on SQLite does not hold a threadpool thread"""
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
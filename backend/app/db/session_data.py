@@ -0,0 +1,317 @@
+"""
+Set-based queries over a session's stored data.
+
+Counts and deletes run one COUNT(*) / DELETE ... WHERE session_id = ?
+statement per table instead of loading rows into the ORM; the delete
+helpers do not commit, the caller commits and then releases the returned
+blob refs. Keyframe listings project or defer the image columns so only
+callers that need the pixels read them; sample_keyframes thins long
+sessions in SQL, per keyframe type, and streams the rows so callers hold a
+bounded number. Session summaries read the SessionRollup row that
+ingest_metrics keeps current.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, delete, or_, tuple_
+from sqlalchemy.orm import defer
+from sqlmodel import Session as SQLSession, select, func
+from app.db.models import AnnotatedFrame, SessionDB, SessionMetric, SessionRollup
+from app.services.form_flags import merge_counts, parse_flags_json
+
+# Columns holding image (and legacy JSON landmark) payloads
+KEYFRAME_PAYLOAD_COLUMNS = (
+    AnnotatedFrame.frame_data,
+    AnnotatedFrame.frame_bytes,
+    AnnotatedFrame.pose_landmarks,
+)
+
+
+def keyframe_metadata(db: SQLSession, session_id: int):
+    """(id, session_id, keyframe_type, timestamp, exercise, frame_ref) rows in time order"""
+    return db.exec(
+        select(
+            AnnotatedFrame.id, AnnotatedFrame.session_id, AnnotatedFrame.keyframe_type,
+            AnnotatedFrame.timestamp, AnnotatedFrame.exercise, AnnotatedFrame.frame_ref,
+        )
+        .where(AnnotatedFrame.session_id == session_id)
+        .order_by(AnnotatedFrame.timestamp)
+    ).all()
+
+
+def encode_cursor(timestamp: datetime, keyframe_id: int) -> str:
+    """Opaque keyset cursor for the keyframe after which the next page starts"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{keyframe_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        timestamp, keyframe_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(keyframe_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyframe_metadata_page(db: SQLSession, session_id: int, after: Optional[Tuple[datetime, int]] = None,
+                           limit: int = 50) -> Tuple[List, Optional[str]]:
+    """
+    One page of keyframe metadata ordered by (timestamp, id), seeking past
+    `after` through the (session_id, timestamp) index rather than OFFSET.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = (
+        select(
+            AnnotatedFrame.id, AnnotatedFrame.session_id, AnnotatedFrame.keyframe_type,
+            AnnotatedFrame.timestamp, AnnotatedFrame.exercise, AnnotatedFrame.frame_ref,
+        )
+        .where(AnnotatedFrame.session_id == session_id)
+        .order_by(AnnotatedFrame.timestamp, AnnotatedFrame.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.where(tuple_(AnnotatedFrame.timestamp, AnnotatedFrame.id) > tuple_(*after))
+    rows = db.exec(query).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+
+def keyframes_without_images(db: SQLSession, session_id: int) -> List[AnnotatedFrame]:
+    """
+    Keyframe entities in time order with the payload columns deferred.
+    Touching frame_data/frame_bytes/pose_landmarks on one issues a query
+    per row, so load the ones you need with keyframes_by_id instead.
+    """
+    return db.exec(
+        select(AnnotatedFrame)
+        .options(*[defer(column) for column in KEYFRAME_PAYLOAD_COLUMNS])
+        .where(AnnotatedFrame.session_id == session_id)
+        .order_by(AnnotatedFrame.timestamp)
+    ).all()
+
+
+def keyframe_type_counts(db: SQLSession, session_id: int) -> Dict[str, int]:
+    """Keyframes of a session per keyframe_type"""
+    return dict(db.exec(
+        select(AnnotatedFrame.keyframe_type, func.count())
+        .where(AnnotatedFrame.session_id == session_id)
+        .group_by(AnnotatedFrame.keyframe_type)
+    ).all())
+
+
+def sample_quotas(counts: Dict[str, int], limit: int) -> Dict[str, int]:
+    """
+    Rows sample_keyframes keeps per keyframe_type: all of them when there are
+    at most `limit`, else shares of `limit` proportional to each type's count
+    (largest remainders round up), at least one per type while `limit` allows.
+    """
+    total = sum(counts.values())
+    if limit <= 0 or total <= limit:
+        return dict(counts)
+    quotas = {kind: max(1, n * limit // total) for kind, n in counts.items()}
+    rounded_down = [kind for kind, n in counts.items() if quotas[kind] == n * limit // total]
+    by_remainder = sorted(rounded_down, key=lambda kind: (-(counts[kind] * limit % total), kind))
+    for kind in by_remainder[:max(0, limit - sum(quotas.values()))]:
+        quotas[kind] += 1
+    while sum(quotas.values()) > limit and max(quotas.values()) > 1:
+        quotas[max(quotas, key=quotas.get)] -= 1
+    return quotas
+
+
+def sample_size(db: SQLSession, session_id: int, limit: int) -> int:
+    """Number of keyframes sample_keyframes returns for the same arguments"""
+    return sum(sample_quotas(keyframe_type_counts(db, session_id), limit).values())
+
+
+def sample_keyframes(db: SQLSession, session_id: int, limit: int, batch_size: int = 100) -> Iterator[AnnotatedFrame]:
+    """
+    About `limit` keyframes (see sample_quotas), payload columns deferred, in
+    time order. Each keyframe_type is thinned on its own so a top/middle/
+    bottom cycle keeps every phase: its k-th of n rows by ROW_NUMBER() over
+    (timestamp, id) is kept when (k - 1) * quota % n < quota, which spreads
+    `quota` rows evenly. Rows are streamed `batch_size` at a time; the
+    caller's session must stay open while iterating.
+    """
+    counts = keyframe_type_counts(db, session_id)
+    quotas = sample_quotas(counts, limit)
+    query = (
+        select(AnnotatedFrame)
+        .options(*[defer(column) for column in KEYFRAME_PAYLOAD_COLUMNS])
+        .where(AnnotatedFrame.session_id == session_id)
+        .order_by(AnnotatedFrame.timestamp, AnnotatedFrame.id)
+    )
+    if quotas != counts:
+        numbered = (
+            select(
+                AnnotatedFrame.id,
+                AnnotatedFrame.keyframe_type,
+                func.row_number().over(
+                    partition_by=AnnotatedFrame.keyframe_type,
+                    order_by=(AnnotatedFrame.timestamp, AnnotatedFrame.id),
+                ).label("row_number"),
+            )
+            .where(AnnotatedFrame.session_id == session_id)
+            .subquery()
+        )
+        # IN rather than a join keeps the outer rows in (session_id, timestamp) index order
+        query = query.where(AnnotatedFrame.id.in_(select(numbered.c.id).where(or_(*[
+            and_(numbered.c.keyframe_type == kind, (numbered.c.row_number - 1) * quota % counts[kind] < quota)
+            for kind, quota in quotas.items()
+        ]))))
+    yield from db.exec(query.execution_options(yield_per=batch_size))
+
+
+def keyframes_by_id(db: SQLSession, ids: List[int]) -> List[AnnotatedFrame]:
+    """Full keyframe rows (images included) for the given ids, in time order"""
+    if not ids:
+        return []
+    return db.exec(
+        select(AnnotatedFrame)
+        .where(AnnotatedFrame.id.in_(ids))
+        .order_by(AnnotatedFrame.timestamp)
+    ).all()
+
+
+def count_keyframes(db: SQLSession, session_id: int) -> int:
+    return db.exec(
+        select(func.count()).select_from(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
+    ).one()
+
+
+def session_frame_refs(db: SQLSession, session_id: int) -> List[str]:
+    """Distinct blob digests referenced by a session's keyframes"""
+    return db.exec(
+        select(AnnotatedFrame.frame_ref).distinct()
+        .where(AnnotatedFrame.session_id == session_id)
+        .where(AnnotatedFrame.frame_ref.is_not(None))
+    ).all()
+
+
+def delete_keyframes(db: SQLSession, session_id: int) -> Dict:
+    """Delete a session's keyframes; returns {'keyframes': n, 'frame_refs': [...]}"""
+    frame_refs = session_frame_refs(db, session_id)
+    result = db.exec(
+        delete(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
+        .execution_options(synchronize_session=False)
+    )
+    return {'keyframes': result.rowcount, 'frame_refs': frame_refs}
+
+
+def delete_session_cascade(db: SQLSession, session_id: int) -> Dict:
+    """
+    Delete a session with its keyframes and metrics.
+    Returns {'keyframes', 'metrics', 'sessions', 'frame_refs'}.
+    """
+    deleted = delete_keyframes(db, session_id)
+    deleted['metrics'] = db.exec(
+        delete(SessionMetric).where(SessionMetric.session_id == session_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.exec(
+        delete(SessionRollup).where(SessionRollup.session_id == session_id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted['sessions'] = db.exec(
+        delete(SessionDB).where(SessionDB.id == session_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return deleted
+
+
+def purge_session(db: SQLSession, session_id: int) -> Dict:
+    """
+    delete_session_cascade after writing out queued keyframes, committed,
+    with the freed image blobs released.
+    """
+    from app.services import blob_store as blob_store_module
+    from app.services.keyframe_writer import keyframe_writer
+
+    # Keyframes still queued for writing would outlive the cleanup
+    keyframe_writer.flush(session_id)
+    deleted = delete_session_cascade(db, session_id)
+    db.commit()
+    # Drop image blobs no other keyframe references
+    blob_store_module.blob_store.release(db, deleted['frame_refs'])
+    return deleted
+
+
+def add_metric_to_rollup(db: SQLSession, metric: SessionMetric) -> SessionRollup:
+    """
+    Fold a new SessionMetric into its session's rollup, in the caller's
+    transaction. Add the metric first: its INSERT takes SQLite's write lock,
+    so the rollup read here cannot race another ingest for the session.
+    """
+    rollup = db.get(SessionRollup, metric.session_id)
+    if rollup is None:
+        rollup = SessionRollup(session_id=metric.session_id)
+    rollup.metric_count += 1
+    rollup.reps_sum += metric.reps
+    rollup.score_sum += metric.avg_score
+    rollup.score_min = metric.avg_score if rollup.score_min is None else min(rollup.score_min, metric.avg_score)
+    rollup.score_max = metric.avg_score if rollup.score_max is None else max(rollup.score_max, metric.avg_score)
+    rollup.duration_sum += metric.duration_sec
+    rollup.flags_json = json.dumps(
+        merge_counts([parse_flags_json(rollup.flags_json), parse_flags_json(metric.flags_json)]),
+        separators=(',', ':')
+    )
+    rollup.last_ts = metric.ts if rollup.last_ts is None else max(rollup.last_ts, metric.ts)
+    db.add(rollup)
+    return rollup
+
+
+def add_flags_to_session(db: SQLSession, session_id: int, flags: Dict, ts: datetime) -> SessionRollup:
+    """
+    Fold form flag counts no ingest stored (the interval pending when the
+    session stops) into its latest SessionMetric and its rollup, in the
+    caller's transaction, so rebuild_rollup agrees. A session without
+    metrics gets a flags-only one at `ts`.
+    """
+    metric = db.exec(
+        select(SessionMetric)
+        .where(SessionMetric.session_id == session_id)
+        .order_by(SessionMetric.ts.desc(), SessionMetric.id.desc())
+        .limit(1)
+    ).first()
+    if metric is None:
+        metric = SessionMetric(session_id=session_id, flags_json=json.dumps(flags, separators=(',', ':')), ts=ts)
+        db.add(metric)
+        db.flush()
+        return add_metric_to_rollup(db, metric)
+    metric.flags_json = json.dumps(merge_counts([parse_flags_json(metric.flags_json), flags]), separators=(',', ':'))
+    db.add(metric)
+    db.flush()  # UPDATE first, as in add_metric_to_rollup, so the rollup read holds the write lock
+    rollup = db.get(SessionRollup, session_id) or SessionRollup(session_id=session_id)
+    rollup.flags_json = json.dumps(merge_counts([parse_flags_json(rollup.flags_json), flags]), separators=(',', ':'))
+    db.add(rollup)
+    return rollup
+
+
+def rebuild_rollup(db: SQLSession, session_id: int) -> SessionRollup:
+    """Recompute a session's rollup from its metrics with SQL aggregates (back-fill / repair)"""
+    count, reps, score_sum, score_min, score_max, duration, last_ts = db.exec(
+        select(
+            func.count(), func.coalesce(func.sum(SessionMetric.reps), 0),
+            func.coalesce(func.sum(SessionMetric.avg_score), 0.0),
+            func.min(SessionMetric.avg_score), func.max(SessionMetric.avg_score),
+            func.coalesce(func.sum(SessionMetric.duration_sec), 0), func.max(SessionMetric.ts),
+        ).where(SessionMetric.session_id == session_id)
+    ).one()
+    flags = merge_counts([
+        parse_flags_json(flags_json) for flags_json in db.exec(
+            select(SessionMetric.flags_json).where(SessionMetric.session_id == session_id)
+        )
+    ])
+    rollup = db.get(SessionRollup, session_id) or SessionRollup(session_id=session_id)
+    rollup.metric_count = count
+    rollup.reps_sum = reps
+    rollup.score_sum = score_sum
+    rollup.score_min = score_min
+    rollup.score_max = score_max
+    rollup.duration_sum = duration
+    rollup.flags_json = json.dumps(flags, separators=(',', ':'))
+    rollup.last_ts = last_ts
+    db.add(rollup)
+    return rollup
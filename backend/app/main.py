@@ -1,7 +1,7 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings
+from app.core.config import settings as app_settings
 from app.api.routes import health, sessions, tips, opencv
 
 
@@ -16,6 +16,14 @@ class Settings(BaseSettings):
 settings = Settings()
 
 from app.api.routes import health, sessions, tips, auth, keyframes, posture_analysis
+from app.db.session import dispose_async_engine, init_db
+from app.services.keyframe_writer import keyframe_writer
+from app.services.compaction import compaction_scheduler
+from app.services.analysis_jobs import analysis_job_queue
+from app.services.tips import tips_cache, warm_tips_cache
+
+# Create tables and apply pending schema migrations before serving
+init_db()
 
 app = FastAPI(title=settings.APP_NAME)
 
@@ -36,6 +44,27 @@ app.include_router(opencv.router, tags=["opencv"])
 app.include_router(keyframes.router, prefix="/keyframes", tags=["keyframes"])
 app.include_router(posture_analysis.router, prefix="/analysis", tags=["posture-analysis"])
 
+@app.on_event("startup")
+def start_compaction():
+    # Periodic keyframe retention / VACUUM (COMPACTION_INTERVAL_SEC, 0 disables)
+    compaction_scheduler.start()
+    # Jobs queued before a restart will never run
+    analysis_job_queue.recover()
+    if app_settings.TIPS_WARMUP:
+        warm_tips_cache()
+
+@app.on_event("shutdown")
+def flush_keyframes():
+    # Commit keyframes still queued by the write-behind writer
+    keyframe_writer.stop()
+    compaction_scheduler.stop()
+    analysis_job_queue.shutdown()
+    tips_cache.shutdown()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
+
 @app.get("/")
 def root():
     return {"ok": True, "name": settings.APP_NAME}
@@ -5,7 +5,7 @@ from datetime import datetime
 class KeyframeRequest(BaseModel):
     session_id: int
     frame_data: str  # Base64 encoded annotated frame
-    keyframe_type: str  # 'bottom', 'top', 'middle', 'plank_interval'
+    keyframe_type: str  # 'bottom', 'top', 'middle', 'plank_good', 'plank_sag', 'plank_pike'
     exercise: str
     pose_landmarks: List[dict] = []
 
@@ -15,7 +15,12 @@ class KeyframeResponse(BaseModel):
     keyframe_type: str
     timestamp: datetime
     exercise: str
+    image_digest: Optional[str] = None  # Blob-stored images; pass as ?v= to the image URL to cache it for good
 
 class KeyframeListResponse(BaseModel):
     keyframes: List[KeyframeResponse]
     total_count: int
+
+class KeyframePageResponse(BaseModel):
+    keyframes: List[KeyframeResponse]
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page; None on the last page
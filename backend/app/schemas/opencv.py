@@ -1,5 +1,9 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 class FrameRequest(BaseModel):
     frame: str  # Base64 encoded image data
+    seq: Optional[int] = None  # Client frame sequence number, starting at 0
+    captured_at: Optional[datetime] = None  # Client capture time
+    return_image: bool = False  # Include the annotated frame as base64 in the response
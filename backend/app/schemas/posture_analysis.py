@@ -29,6 +29,20 @@ class SessionAnalysisResponse(BaseModel):
     analysis_timestamp: datetime
     message: Optional[str] = None
 
+class AnalysisJobRequest(BaseModel):
+    session_id: int
+    cleanup: bool = False  # Delete the session's data after a successful analysis
+
+class AnalysisJobResponse(BaseModel):
+    job_id: str
+    session_id: int
+    status: str  # 'queued', 'running', 'succeeded', 'failed', 'timeout'
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[SessionAnalysisResponse] = None
+    error: Optional[str] = None
+
 class SessionCleanupResponse(BaseModel):
     status: str
     session_id: int
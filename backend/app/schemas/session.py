@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class SessionStartRequest(BaseModel):
@@ -26,3 +26,8 @@ class SessionSummary(BaseModel):
     exercise: str
     start_ts: datetime
     end_ts: datetime | None = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    last_metric_ts: Optional[datetime] = None
+    flag_counts: Dict[str, int] = {}  # Form flag counts across the session
+    flags: List[str] = []  # Most frequent form flags, for tips
@@ -1,10 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class TipsRequest(BaseModel):
     exercise: str
     flags: List[str] = []
     level: str = "beginner"
+    session_id: Optional[int] = None  # Use the session's detected form flags when flags is empty
 
 class TipsResponse(BaseModel):
     tips: List[str]
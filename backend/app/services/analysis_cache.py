@@ -0,0 +1,130 @@
+"""
+Persistent cache of posture analysis results.
+
+An analysis depends only on the keyframes sent, the exercise and the prompt,
+so results are stored in the AnalysisCacheEntry table under a hash of those
+(see analysis_key) and reused until ANALYSIS_CACHE_TTL_SEC has passed.
+Concurrent requests for the same key wait for the first one's upstream call
+instead of making their own. Failed calls are not cached.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import delete
+from sqlmodel import Session as SQLSession
+from app.core.config import settings
+from app.db.models import AnalysisCacheEntry, AnnotatedFrame
+from app.services.keyframe_storage import image_etag
+
+
+def analysis_key(exercise: str, keyframes: List[AnnotatedFrame], *salt: str) -> str:
+    """
+    SHA-256 over the exercise, each keyframe's type, landmarks and image hash
+    (in time order) and `salt` (prompt version, model, budget...).
+    """
+    digest = hashlib.sha256()
+    for part in (exercise, *salt):
+        digest.update(part.encode() + b"\0")
+    for keyframe in sorted(keyframes, key=lambda k: (k.timestamp, k.id)):
+        digest.update(keyframe.keyframe_type.encode() + b"\0")
+        digest.update(keyframe.landmarks_packed or keyframe.pose_landmarks.encode())
+        digest.update((image_etag(keyframe) or "").encode() + b"\0")
+    return digest.hexdigest()
+
+
+def purge_expired(db: SQLSession, now: Optional[datetime] = None) -> int:
+    """Delete expired entries (not committed); returns how many"""
+    now = now or datetime.now(timezone.utc)
+    return db.exec(
+        delete(AnalysisCacheEntry).where(AnalysisCacheEntry.expires_at <= now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands datetimes back without their timezone
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class AnalysisCache:
+    """Table-backed result cache with TTL and in-process request coalescing"""
+
+    def __init__(self, engine=None, ttl_sec: int = 7 * 24 * 3600):
+        self._engine = engine
+        self.ttl_sec = ttl_sec
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def get(self, key: str) -> Optional[Dict]:
+        if self.ttl_sec <= 0:
+            return None
+        with SQLSession(self.engine) as db:
+            entry = db.get(AnalysisCacheEntry, key)
+        if entry is None or _aware(entry.expires_at) <= datetime.now(timezone.utc):
+            return None
+        return json.loads(entry.result_json)
+
+    def put(self, key: str, value: Dict, session_id: int, exercise: str, prompt_version: str):
+        if self.ttl_sec <= 0:
+            return
+        now = datetime.now(timezone.utc)
+        with SQLSession(self.engine) as db:
+            db.merge(AnalysisCacheEntry(
+                key=key, session_id=session_id, exercise=exercise, prompt_version=prompt_version,
+                result_json=json.dumps(value, separators=(',', ':')),
+                created_at=now, expires_at=now + timedelta(seconds=self.ttl_sec),
+            ))
+            db.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict], session_id: int, exercise: str,
+                       prompt_version: str) -> Dict:
+        """
+        Cached value for `key`, or compute() it once: callers arriving while
+        it runs get the same result (or exception) instead of calling again.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.stats['hits'] += 1
+            print(f"🔍 [ANALYSIS CACHE] Hit for session {session_id} ({key[:12]})")
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            self.stats['coalesced'] += 1
+            print(f"🔍 [ANALYSIS CACHE] Waiting on in-flight analysis for session {session_id} ({key[:12]})")
+            return future.result()
+
+        try:
+            # The previous owner may have stored it between our miss and taking the key
+            value = self.get(key)
+            if value is None:
+                self.stats['misses'] += 1
+                value = compute()
+                self.put(key, value, session_id, exercise, prompt_version)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+# Global instance
+analysis_cache = AnalysisCache(ttl_sec=settings.ANALYSIS_CACHE_TTL_SEC)
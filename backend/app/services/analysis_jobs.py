@@ -0,0 +1,294 @@
+"""
+Background posture-analysis jobs.
+
+POST /analysis/jobs returns a job id at once. A bounded pool of workers
+runs the analysis provider with a per-job timeout (and a cap on how long a
+job may wait for its call to start), and every state change
+is saved to the AnalysisJob table. Clients poll GET /analysis/jobs/{id} or
+follow GET /analysis/jobs/{id}/events (SSE).
+
+The provider is anything with `analyze_session_posture(session_id, exercise, db)`
+returning the GeminiPostureAnalyzer result dict. It is chosen by name from
+ANALYSIS_PROVIDERS (settings.ANALYSIS_PROVIDER), or passed to
+AnalysisJobQueue directly, e.g. a local stub in tests.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+from sqlmodel import Session as SQLSession, select
+from app.core.config import settings
+from app.db.models import AnalysisJob, SessionDB
+from app.schemas.posture_analysis import AnalysisJobResponse, PostureAnalysis, SessionAnalysisResponse
+
+
+def _gemini():
+    from app.services.gemini_service import get_gemini_analyzer
+    return get_gemini_analyzer()
+
+
+def _local():
+    from app.services.local_analyzer import LocalPostureAnalyzer
+    return LocalPostureAnalyzer()
+
+
+def _hedged():
+    from app.services.local_analyzer import get_hedged_analyzer
+    return get_hedged_analyzer()
+
+
+# Provider name -> zero-argument factory returning an analyzer
+ANALYSIS_PROVIDERS: Dict[str, Callable] = {
+    "gemini": _gemini,
+    "local": _local,  # Landmark/angle rules only, milliseconds
+    "hedged": _hedged,  # Gemini within ANALYSIS_LLM_BUDGET_SEC, else local
+}
+
+TERMINAL_STATUSES = {"succeeded", "failed", "timeout"}
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def analysis_response(session_id: int, exercise: str, analysis_result: Dict) -> SessionAnalysisResponse:
+    """SessionAnalysisResponse for a provider result dict"""
+    # Parse suggestions into structured format
+    suggestions_data = analysis_result.get("suggestions", {})
+    posture_analysis = None
+    if suggestions_data and "overall_assessment" in suggestions_data:
+        posture_analysis = PostureAnalysis(
+            overall_assessment=suggestions_data.get("overall_assessment", ""),
+            strengths=suggestions_data.get("strengths", []),
+            areas_for_improvement=suggestions_data.get("areas_for_improvement", []),
+            specific_suggestions=suggestions_data.get("specific_suggestions", []),
+            exercise_specific_tips=suggestions_data.get("exercise_specific_tips", []),
+            next_session_focus=suggestions_data.get("next_session_focus", "")
+        )
+    return SessionAnalysisResponse(
+        status="success",
+        session_id=session_id,
+        exercise=exercise,
+        total_keyframes=analysis_result["total_keyframes"],
+        analyzed_keyframes=analysis_result["analyzed_keyframes"],
+        suggestions=posture_analysis,
+        analysis_timestamp=datetime.fromisoformat(analysis_result["analysis_timestamp"])
+    )
+
+
+def job_response(job: AnalysisJob) -> AnalysisJobResponse:
+    return AnalysisJobResponse(
+        job_id=job.id,
+        session_id=job.session_id,
+        status=job.status,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result=SessionAnalysisResponse.model_validate_json(job.result_json) if job.result_json else None,
+        error=job.error,
+    )
+
+
+# Seconds between checks that a job's provider call has started (or was cancelled)
+CALL_START_POLL_SEC = 0.5
+
+
+class AnalysisJobQueue:
+    """Bounded worker pool for posture analysis with saved, pollable results"""
+
+    def __init__(self, provider_factory: Optional[Callable] = None, engine=None, workers: int = 2,
+                 timeout_sec: float = 120.0, max_pending: int = 100, call_workers: Optional[int] = None,
+                 queue_timeout_sec: Optional[float] = None):
+        self._provider_factory = provider_factory
+        self._engine = engine
+        self.workers = workers
+        # Timed-out calls keep their thread until they return, so leave room beyond one per job
+        self.call_workers = call_workers or 2 * workers
+        self.timeout_sec = timeout_sec
+        # A job waits at most this long for its call to start, then timeout_sec for it to finish
+        self.queue_timeout_sec = timeout_sec if queue_timeout_sec is None else queue_timeout_sec
+        self.max_pending = max_pending
+        self._status: Dict[str, str] = {}  # job_id -> status, for jobs of this process
+        self._done: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._calls: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def provider(self):
+        if self._provider_factory is not None:
+            return self._provider_factory()
+        factory = ANALYSIS_PROVIDERS.get(settings.ANALYSIS_PROVIDER)
+        if factory is None:
+            raise ValueError(f"Unknown ANALYSIS_PROVIDER: {settings.ANALYSIS_PROVIDER}")
+        return factory()
+
+    def set_provider(self, provider_factory: Optional[Callable]):
+        """Swap the analysis backend (None restores settings.ANALYSIS_PROVIDER)"""
+        self._provider_factory = provider_factory
+
+    def _executors(self):
+        if self._runner is None:
+            # Runners wait on provider calls so a call that overruns its timeout
+            # can be abandoned without holding up the job's status
+            self._runner = ThreadPoolExecutor(self.workers, thread_name_prefix="analysis-job")
+            self._calls = ThreadPoolExecutor(self.call_workers, thread_name_prefix="analysis-call")
+        return self._runner, self._calls
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for status in self._status.values() if status not in TERMINAL_STATUSES)
+
+    def submit(self, session_id: int, cleanup: bool = False) -> AnalysisJob:
+        """Queue an analysis; raises QueueFullError when max_pending jobs are outstanding"""
+        if self.pending() >= self.max_pending:
+            raise QueueFullError(f"{self.max_pending} analysis jobs already pending")
+        job = AnalysisJob(id=uuid.uuid4().hex, session_id=session_id, cleanup=cleanup,
+                          created_at=datetime.now(timezone.utc))
+        with SQLSession(self.engine) as db:
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+        with self._lock:
+            self._status[job.id] = "queued"
+            self._done[job.id] = threading.Event()
+        runner, _ = self._executors()
+        runner.submit(self._run, job.id)
+        print(f"🔍 [ANALYSIS JOB] Queued {job.id} for session {session_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with SQLSession(self.engine) as db:
+            return db.get(AnalysisJob, job_id)
+
+    def status(self, job_id: str) -> Optional[str]:
+        """Current status without a database read for jobs started by this process"""
+        with self._lock:
+            if job_id in self._status:
+                return self._status[job_id]
+        job = self.get(job_id)
+        return job.status if job else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until a job of this process finishes; False on timeout"""
+        with self._lock:
+            done = self._done.get(job_id)
+        return done.wait(timeout) if done else True
+
+    def _update(self, job_id: str, **fields):
+        with SQLSession(self.engine) as db:
+            job = db.get(AnalysisJob, job_id)
+            for name, value in fields.items():
+                setattr(job, name, value)
+            db.add(job)
+            db.commit()
+        if "status" in fields:
+            with self._lock:
+                if fields["status"] in TERMINAL_STATUSES:
+                    # Finished jobs are read back from the table
+                    self._status.pop(job_id, None)
+                    self._done.pop(job_id).set()
+                else:
+                    self._status[job_id] = fields["status"]
+
+    def _analyze(self, job_id: str, session_id: int, cleanup: bool) -> SessionAnalysisResponse:
+        with SQLSession(self.engine) as db:
+            session = db.get(SessionDB, session_id)
+            if not session:
+                raise ValueError("Session not found")
+            if not session.end_ts:
+                raise ValueError("Session must be ended before analysis can be performed")
+            analysis_result = self.provider().analyze_session_posture(session_id, session.exercise, db)
+            if analysis_result["status"] == "error":
+                raise RuntimeError(analysis_result["message"])
+            response = analysis_response(session_id, session.exercise, analysis_result)
+            # A call that overran its timeout must not delete data behind a failed job
+            if cleanup and self.status(job_id) == "running":
+                from app.db.session_data import purge_session
+                deleted = purge_session(db, session_id)
+                print(f"🔍 [ANALYSIS JOB] Session {session_id}: cleaned up {deleted['keyframes']} keyframes")
+            return response
+
+    def _claim(self, job_id: str, status: str) -> bool:
+        """Move a job that is still queued to `status`; False once it has left the queue"""
+        with self._lock:
+            if self._status.get(job_id) != "queued":
+                return False
+            self._status[job_id] = status
+            return True
+
+    def _run(self, job_id: str):
+        job = self.get(job_id)
+        _, calls = self._executors()
+        started = threading.Event()
+
+        def call():
+            # The job stays "queued" until a call thread picks it up, unless
+            # its runner has given up on it meanwhile
+            if not self._claim(job_id, "running"):
+                return None
+            self._update(job_id, status="running", started_at=datetime.now(timezone.utc))
+            started.set()
+            return self._analyze(job_id, job.session_id, job.cleanup)
+
+        future = calls.submit(call)
+        deadline = time.monotonic() + self.queue_timeout_sec
+        try:
+            # The timeout runs from when the call starts: time queued behind
+            # abandoned (timed-out) calls is not charged to it, but is capped
+            while not started.wait(CALL_START_POLL_SEC) and not future.done():
+                if time.monotonic() >= deadline and self._claim(job_id, "timeout"):
+                    future.cancel()
+                    self._update(job_id, status="timeout",
+                                 error=f"Analysis did not start within {self.queue_timeout_sec:.0f}s",
+                                 finished_at=datetime.now(timezone.utc))
+                    print(f"❌ [ANALYSIS JOB] {job_id} timed out in the queue")
+                    return
+            response = future.result(timeout=self.timeout_sec)
+            self._update(job_id, status="succeeded", result_json=response.model_dump_json(),
+                         finished_at=datetime.now(timezone.utc))
+            print(f"✅ [ANALYSIS JOB] {job_id} succeeded")
+        except FutureTimeoutError:
+            future.cancel()
+            self._update(job_id, status="timeout", error=f"Analysis exceeded {self.timeout_sec:.0f}s",
+                         finished_at=datetime.now(timezone.utc))
+            print(f"❌ [ANALYSIS JOB] {job_id} timed out")
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+            print(f"❌ [ANALYSIS JOB] {job_id} failed: {e}")
+
+    def recover(self):
+        """Mark jobs left queued/running by a previous process as failed"""
+        with SQLSession(self.engine) as db:
+            stale = db.exec(select(AnalysisJob).where(AnalysisJob.status.in_(["queued", "running"]))).all()
+            for job in stale:
+                if job.id in self._status:
+                    continue
+                job.status = "failed"
+                job.error = "Interrupted by server restart"
+                job.finished_at = datetime.now(timezone.utc)
+                db.add(job)
+            db.commit()
+
+    def shutdown(self):
+        if self._runner is not None:
+            self._runner.shutdown(wait=False, cancel_futures=True)
+            self._calls.shutdown(wait=False, cancel_futures=True)
+            self._runner = self._calls = None
+
+
+# Global instance
+analysis_job_queue = AnalysisJobQueue(
+    workers=settings.ANALYSIS_WORKERS,
+    timeout_sec=settings.ANALYSIS_JOB_TIMEOUT_SEC,
+    max_pending=settings.ANALYSIS_MAX_PENDING,
+    queue_timeout_sec=settings.ANALYSIS_JOB_QUEUE_TIMEOUT_SEC,
+)
@@ -0,0 +1,98 @@
+"""
+Streaming delivery of posture analysis (GET /analysis/stream/{session_id}).
+
+Events, in order:
+
+* preview  - the local landmark-based analysis, available in milliseconds
+* delta    - raw model text as it arrives ({"text": ...})
+* section  - each top-level field of the suggestions JSON ({"name", "value"})
+             as soon as it has fully arrived
+* fallback - the model failed; the sections that follow are the local ones
+* result   - the SessionAnalysisResponse, exactly as POST /analysis/analyze
+* error    - analysis failed ({"detail": ...})
+
+Providers without stream_session_posture (e.g. "local") emit all their
+sections at once, then the result.
+"""
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+from sqlmodel import Session as SQLSession
+
+Event = Tuple[str, Dict]
+
+
+class JsonSectionParser:
+    """
+    Incremental parser for the top-level members of a JSON object arriving
+    in chunks (text before the opening brace, e.g. a ```json fence, is
+    skipped). feed() returns the members completed by each chunk.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self._buffer += text
+        members = []
+        while self._pos < len(self._buffer) and not self.done:
+            ch = self._buffer[self._pos]
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._member_start = self._pos + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    members += self._member(self._pos)
+                    self.done = True
+            elif ch == ',' and self._depth == 1:
+                members += self._member(self._pos)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return members
+
+    def _member(self, end: int) -> List[Tuple[str, Any]]:
+        text = self._buffer[self._member_start:end].strip()
+        if not text:
+            return []
+        try:
+            return list(json.loads("{" + text + "}").items())
+        except ValueError:
+            return []
+
+
+def section_events(suggestions: Dict) -> Iterator[Event]:
+    for name, value in suggestions.items():
+        yield "section", {"name": name, "value": value}
+
+
+def stream_analysis(provider, session_id: int, exercise: str, db: SQLSession) -> Iterator[Event]:
+    """(event, data) pairs for one analysis; the last is 'result' with the provider's result dict"""
+    if hasattr(provider, "stream_session_posture"):
+        yield from provider.stream_session_posture(session_id, exercise, db)
+        return
+    result = provider.analyze_session_posture(session_id, exercise, db)
+    if result.get("status") == "success":
+        yield from section_events(result.get("suggestions") or {})
+    yield "result", result
+
+
+def sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
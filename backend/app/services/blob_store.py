@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable
+from sqlmodel import Session as SQLSession, select, func
+from app.core.config import settings
+from app.db.models import AnnotatedFrame
+
+
+class BlobStore:
+    """
+    Content-addressed on-disk store for keyframe images.
+
+    Blobs are named by their SHA-256 and sharded two levels deep
+    (ab/cd/abcd...), so identical images are stored once and a row only needs
+    the hash. Deletion is reference counted against AnnotatedFrame.frame_ref.
+
+    Unreferenced blobs younger than `release_grace_sec` are left for the next
+    compaction pass, so cleaning up a session that just ended frees its
+    images' disk space only when compaction next runs.
+    """
+
+    def __init__(self, root: str, release_grace_sec: float = 60.0):
+        self.root = Path(root)
+        # Blobs written this recently are never unlinked, so a put() whose row
+        # is not committed yet cannot lose its file; the compaction job sweeps them later
+        self.release_grace_sec = release_grace_sec
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their content hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        with self._lock:
+            if path.exists():
+                os.utime(path)  # Refresh the grace window for the new reference
+                return digest
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        with open(self.path_for(digest), 'rb') as f:
+            return f.read()
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def size(self, digest: str) -> int:
+        return self.path_for(digest).stat().st_size
+
+    def iter_digests(self):
+        """Digests of every stored blob (in-flight .tmp files excluded)"""
+        if not self.root.exists():
+            return
+        for path in self.root.glob("*/*/*"):
+            if path.is_file() and not path.name.endswith(".tmp"):
+                yield path.name
+
+    def release(self, db: SQLSession, digests: Iterable[str]) -> int:
+        """
+        Delete blobs no AnnotatedFrame row references any more.
+        Call after the deleting transaction has committed. Returns blobs removed;
+        blobs written within release_grace_sec are skipped (compaction sweeps them).
+        """
+        removed = 0
+        now = time.time()
+        for digest in set(d for d in digests if d):
+            refs = db.exec(
+                select(func.count()).select_from(AnnotatedFrame).where(AnnotatedFrame.frame_ref == digest)
+            ).one()
+            if refs:
+                continue
+            path = self.path_for(digest)
+            with self._lock:
+                try:
+                    if now - path.stat().st_mtime < self.release_grace_sec:
+                        continue
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+# Global instance
+blob_store = BlobStore(settings.BLOB_STORE_DIR)
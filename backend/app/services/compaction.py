@@ -0,0 +1,234 @@
+"""
+Retention and compaction for keyframe storage.
+
+Sessions that never reach /analysis/cleanup would otherwise keep every
+keyframe image forever. Each pass:
+
+1. deletes keyframes, metrics and rollups whose session row is gone, and
+   expired cached analyses,
+2. replaces images older than RETENTION_FULL_IMAGE_DAYS with thumbnails,
+3. drops images older than RETENTION_IMAGE_DAYS (landmarks are kept),
+4. removes blob store files no row references,
+5. returns freed SQLite pages with incremental VACUUM.
+
+It runs every COMPACTION_INTERVAL_SEC in a background thread, on demand via
+POST /keyframes/compact, or from the command line:
+
+    python -m app.services.compaction [--full-image-days N] [--image-days N]
+"""
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import delete, text
+from sqlmodel import Session as SQLSession, select
+from app.core.config import settings
+from app.db.models import AnnotatedFrame, SessionDB, SessionMetric, SessionRollup
+from app.services import blob_store as blob_store_module
+from app.services.analysis_cache import purge_expired
+from app.services.keyframe_storage import load_frame_bytes, make_thumbnail, store_image
+
+
+def _db_file_bytes(conn) -> int:
+    page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return conn.execute(text("PRAGMA page_count")).scalar() * page_size
+
+
+def delete_orphans(db: SQLSession) -> Dict:
+    """Delete rows whose session no longer exists; returns counts and blob refs to release"""
+    live = select(SessionDB.id)
+    frame_refs = db.exec(
+        select(AnnotatedFrame.frame_ref).distinct()
+        .where(AnnotatedFrame.session_id.not_in(live))
+        .where(AnnotatedFrame.frame_ref.is_not(None))
+    ).all()
+    keyframes = db.exec(
+        delete(AnnotatedFrame).where(AnnotatedFrame.session_id.not_in(live))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    metrics = db.exec(
+        delete(SessionMetric).where(SessionMetric.session_id.not_in(live))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.exec(
+        delete(SessionRollup).where(SessionRollup.session_id.not_in(live))
+        .execution_options(synchronize_session=False)
+    )
+    return {'orphan_keyframes': keyframes, 'orphan_metrics': metrics, 'frame_refs': frame_refs}
+
+
+def _has_image():
+    return (AnnotatedFrame.frame_ref.is_not(None)) | (AnnotatedFrame.frame_bytes.is_not(None)) | (AnnotatedFrame.frame_data != "")
+
+
+def downsample_images(db: SQLSession, cutoff: datetime, batch_size: int = 200) -> Dict:
+    """Replace full-size images older than cutoff with thumbnails, one committed batch at a time"""
+    downsampled, failed = 0, 0
+    released: List[str] = []
+    last_id = 0
+    while True:
+        rows = db.exec(
+            select(AnnotatedFrame)
+            .where(AnnotatedFrame.id > last_id)
+            .where(AnnotatedFrame.timestamp < cutoff)
+            .where(AnnotatedFrame.image_variant.is_(None))
+            .where(_has_image())
+            .order_by(AnnotatedFrame.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            try:
+                thumb = make_thumbnail(load_frame_bytes(row), settings.KEYFRAME_THUMB_SIZE)
+            except (ValueError, FileNotFoundError, TypeError) as e:
+                print(f"⚠️ [COMPACTION] Keyframe {row.id}: cannot downsample ({e}); keeping landmarks only")
+                thumb = None
+                failed += 1
+            if row.frame_ref:
+                released.append(row.frame_ref)
+            if thumb is None:
+                row.frame_ref, row.frame_bytes, row.image_variant = None, None, 'none'
+            else:
+                row.frame_ref, row.frame_bytes = store_image(thumb)
+                row.image_variant = 'thumb'
+            row.frame_data = ""
+            db.add(row)
+            downsampled += 1
+        db.commit()
+        db.expunge_all()  # Keep memory flat across batches
+    return {'downsampled': downsampled - failed, 'undecodable': failed, 'frame_refs': released}
+
+
+def drop_images(db: SQLSession, cutoff: datetime) -> Dict:
+    """Drop images older than cutoff, keeping the keyframe rows and their landmarks"""
+    old = (AnnotatedFrame.timestamp < cutoff) & _has_image()
+    frame_refs = db.exec(
+        select(AnnotatedFrame.frame_ref).distinct().where(old).where(AnnotatedFrame.frame_ref.is_not(None))
+    ).all()
+    dropped = db.exec(
+        AnnotatedFrame.__table__.update().where(old)
+        .values(frame_ref=None, frame_bytes=None, frame_data="", image_variant='none')
+    ).rowcount
+    return {'images_dropped': dropped, 'frame_refs': frame_refs}
+
+
+def _release(db: SQLSession, digests) -> Dict:
+    """BlobStore.release, also reporting how many bytes it freed"""
+    store = blob_store_module.blob_store
+    sizes = {}
+    for digest in set(digests):
+        try:
+            sizes[digest] = store.size(digest)
+        except FileNotFoundError:
+            pass
+    store.release(db, sizes)
+    removed = [digest for digest in sizes if not store.exists(digest)]
+    return {'blobs_removed': len(removed), 'blob_bytes_reclaimed': sum(sizes[d] for d in removed)}
+
+
+def sweep_blobs(db: SQLSession) -> Dict:
+    """Remove blob files no keyframe references (writes newer than the grace window are kept)"""
+    referenced = set(db.exec(
+        select(AnnotatedFrame.frame_ref).distinct().where(AnnotatedFrame.frame_ref.is_not(None))
+    ).all())
+    return _release(db, [d for d in blob_store_module.blob_store.iter_digests() if d not in referenced])
+
+
+def vacuum(engine) -> Dict:
+    """Incremental VACUUM; converts the database to auto_vacuum=INCREMENTAL on first run"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name != "sqlite":
+            return {'db_bytes_before': 0, 'db_bytes_after': 0}
+        before = _db_file_bytes(conn)
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            # A full VACUUM is the only way to switch modes; it is needed once per database
+            print("🔍 [COMPACTION] Converting database to auto_vacuum=INCREMENTAL")
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        else:
+            conn.execute(text("PRAGMA incremental_vacuum"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        return {'db_bytes_before': before, 'db_bytes_after': _db_file_bytes(conn)}
+
+
+def compact(engine=None, full_image_days: Optional[int] = None, image_days: Optional[int] = None,
+            now: Optional[datetime] = None) -> Dict:
+    """Run one retention/compaction pass and report what was reclaimed"""
+    if engine is None:
+        from app.db.session import engine
+    full_image_days = settings.RETENTION_FULL_IMAGE_DAYS if full_image_days is None else full_image_days
+    image_days = settings.RETENTION_IMAGE_DAYS if image_days is None else image_days
+    now = now or datetime.now()
+
+    report = {}
+    with SQLSession(engine) as db:
+        orphans = delete_orphans(db)
+        orphans['expired_analyses'] = purge_expired(db)
+        db.commit()
+        # Drop before downsampling so images past both cutoffs are not thumbnailed first
+        dropped = drop_images(db, now - timedelta(days=image_days))
+        db.commit()
+        downsampled = downsample_images(db, now - timedelta(days=full_image_days))
+        released = _release(db, orphans.pop('frame_refs') + dropped.pop('frame_refs') + downsampled.pop('frame_refs'))
+        swept = sweep_blobs(db)
+        report.update(orphans, **dropped, **downsampled)
+        report['blobs_removed'] = released['blobs_removed'] + swept['blobs_removed']
+        report['blob_bytes_reclaimed'] = released['blob_bytes_reclaimed'] + swept['blob_bytes_reclaimed']
+    report.update(vacuum(engine))
+    report['db_bytes_reclaimed'] = max(0, report['db_bytes_before'] - report['db_bytes_after'])
+    report['bytes_reclaimed'] = report['db_bytes_reclaimed'] + report['blob_bytes_reclaimed']
+    print(f"🔍 [COMPACTION] {report}")
+    return report
+
+
+class CompactionScheduler:
+    """Runs compact() every `interval_sec` on a daemon thread"""
+
+    def __init__(self, interval_sec: int):
+        self.interval_sec = interval_sec
+        self.last_report: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()  # One pass at a time (scheduled or on demand)
+
+    def run_once(self, **kwargs) -> Dict:
+        with self._run_lock:
+            self.last_report = compact(**kwargs)
+            return self.last_report
+
+    def start(self):
+        if self.interval_sec <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="compaction", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_sec):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ [COMPACTION] Scheduled pass failed: {e}")
+
+
+# Global instance
+compaction_scheduler = CompactionScheduler(settings.COMPACTION_INTERVAL_SEC)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Apply keyframe retention and compact storage")
+    parser.add_argument("--full-image-days", type=int, default=None, help="downsample images older than this")
+    parser.add_argument("--image-days", type=int, default=None, help="drop images older than this")
+    args = parser.parse_args(argv)
+    from app.db.session import init_db
+    init_db()
+    return compaction_scheduler.run_once(full_image_days=args.full_image_days, image_days=args.image_days)
+
+
+if __name__ == "__main__":
+    main()
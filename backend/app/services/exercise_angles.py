@@ -0,0 +1,20 @@
+"""
+Shared description of exercise_angles.csv, the labelled joint-angle dataset
+used both for reference ranges (local_analyzer) and offline evaluation
+(keyframe_eval).
+"""
+from pathlib import Path
+
+DEFAULT_CSV_PATH = Path(__file__).resolve().parents[3] / "exercise_angles.csv"
+
+# exercise_angles.csv labels -> detector exercise names
+CSV_EXERCISES = {
+    "Squats": "squat",
+    "Push Ups": "pushup",
+}
+
+# Angle that drives the rep cycle for each exercise
+DRIVING_ANGLE = {
+    "squat": "Knee_Angle",
+    "pushup": "Elbow_Angle",
+}
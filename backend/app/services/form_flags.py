@@ -0,0 +1,259 @@
+import json
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.plank_analyzer import body_line_deviation
+
+# Landmarks used for form checks, in array order
+LANDMARK_NAMES = [
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER',
+    'LEFT_ELBOW', 'RIGHT_ELBOW',
+    'LEFT_WRIST', 'RIGHT_WRIST',
+    'LEFT_HIP', 'RIGHT_HIP',
+    'LEFT_KNEE', 'RIGHT_KNEE',
+    'LEFT_ANKLE', 'RIGHT_ANKLE',
+]
+LANDMARK_INDEX = {name: i for i, name in enumerate(LANDMARK_NAMES)}
+
+# Joint angles as (a, vertex, c) triples, computed in one vectorized pass
+ANGLE_NAMES = ['left_knee', 'right_knee', 'left_elbow', 'right_elbow', 'left_hip', 'right_hip']
+_ANGLE_TRIPLES = np.array([
+    [LANDMARK_INDEX[a], LANDMARK_INDEX[b], LANDMARK_INDEX[c]]
+    for a, b, c in [
+        ('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'),
+        ('RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE'),
+        ('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'),
+        ('RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST'),
+        ('LEFT_SHOULDER', 'LEFT_HIP', 'LEFT_KNEE'),
+        ('RIGHT_SHOULDER', 'RIGHT_HIP', 'RIGHT_KNEE'),
+    ]
+])
+
+# Thresholds (degrees unless noted)
+KNEE_BENT = 150.0  # knee angle below which squat form checks apply
+KNEES_IN_RATIO = 0.75  # knee spacing / ankle spacing
+TORSO_LEAN_MAX = 55.0  # shoulder-hip line from vertical
+HIP_SAG_DEVIATION = 12.0  # shoulder-hip-ankle deviation
+SQUAT_DEPTH_MAX = 100.0  # minimum knee angle a rep must reach
+PUSHUP_RANGE_MAX = 110.0  # minimum elbow angle a rep must reach
+
+# Flags counted once per rep rather than per frame
+REP_FLAGS = {'shallow_depth', 'short_range'}
+
+
+def landmarks_to_array(landmarks: List[Dict]) -> np.ndarray:
+    """(len(LANDMARK_NAMES), 2) array of x, y; NaN where a landmark is missing"""
+    points = np.full((len(LANDMARK_NAMES), 2), np.nan)
+    for landmark in landmarks:
+        i = LANDMARK_INDEX.get(landmark.get('name'))
+        if i is not None:
+            points[i] = (landmark['x'], landmark['y'])
+    return points
+
+
+def joint_angles(points: np.ndarray) -> np.ndarray:
+    """All joint angles in ANGLE_NAMES order; NaN if a landmark is missing"""
+    a = points[_ANGLE_TRIPLES[:, 0]] - points[_ANGLE_TRIPLES[:, 1]]
+    c = points[_ANGLE_TRIPLES[:, 2]] - points[_ANGLE_TRIPLES[:, 1]]
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(c, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos = np.clip(np.einsum('ij,ij->i', a, c) / norms, -1.0, 1.0)
+    return np.degrees(np.arccos(cos))
+
+
+def _nanmin(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.min()) if values.size else float('nan')
+
+
+def frame_flags(exercise: str, landmarks: List[Dict]) -> Dict:
+    """
+    Per-frame form flags plus the angles the per-rep checks need.
+    Returns {'flags': [...], 'knee': min knee angle, 'elbow': min elbow angle}
+    """
+    points = landmarks_to_array(landmarks)
+    angles = joint_angles(points)
+    knee = _nanmin(angles[0:2])
+    elbow = _nanmin(angles[2:4])
+    flags = []
+
+    if exercise in ('squat', 'lunges') and knee < KNEE_BENT:
+        knees = points[[LANDMARK_INDEX['LEFT_KNEE'], LANDMARK_INDEX['RIGHT_KNEE']], 0]
+        ankles = points[[LANDMARK_INDEX['LEFT_ANKLE'], LANDMARK_INDEX['RIGHT_ANKLE']], 0]
+        knee_width, ankle_width = abs(knees[0] - knees[1]), abs(ankles[0] - ankles[1])
+        if exercise == 'squat' and ankle_width > 0 and knee_width / ankle_width < KNEES_IN_RATIO:
+            flags.append('knees_in')
+
+        torso = points[LANDMARK_INDEX['LEFT_SHOULDER']] - points[LANDMARK_INDEX['LEFT_HIP']]
+        if not np.isnan(torso).any() and np.linalg.norm(torso) > 0:
+            lean = np.degrees(np.arccos(min(1.0, -torso[1] / np.linalg.norm(torso))))
+            if lean > TORSO_LEAN_MAX:
+                flags.append('back_round')
+
+    if exercise in ('pushup', 'plank'):
+        deviation = body_line_deviation(landmarks)
+        if deviation is not None and deviation > HIP_SAG_DEVIATION:
+            flags.append('hip_sag')
+
+    return {'flags': flags, 'knee': knee, 'elbow': elbow}
+
+
+class FormFlagDetector:
+    """
+    Per-session form-flag counters, updated on every frame.
+
+    Counts are kept in memory; `interval_aggregate` hands the counts since
+    the last stored metric to SessionMetric.flags_json, and `clear_aggregate`
+    drops them once that metric is committed, so tips and summaries read cheap
+    precomputed counts.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.session_locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _session_lock(self, session_id: int) -> threading.Lock:
+        lock = self.session_locks.get(session_id)
+        if lock is None:
+            with self._locks_guard:
+                lock = self.session_locks.setdefault(session_id, threading.Lock())
+        return lock
+
+    def _new_state(self) -> Dict:
+        return {
+            'total': {'frames': 0, 'reps': 0, 'counts': {}},
+            'interval': {'frames': 0, 'reps': 0, 'counts': {}},
+            'rep_min_knee': float('nan'),
+            'rep_min_elbow': float('nan'),
+        }
+
+    def update(
+        self,
+        session_id: int,
+        exercise: str,
+        landmarks: List[Dict],
+        rep_completed: bool = False
+    ) -> List[str]:
+        """Count this frame's flags; on a completed rep also check its range. Returns the flags raised."""
+        if not landmarks:
+            return []
+
+        result = frame_flags(exercise, landmarks)
+        flags = list(result['flags'])
+
+        with self._session_lock(session_id):
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = self.sessions[session_id] = self._new_state()
+
+            state['rep_min_knee'] = np.fmin(state['rep_min_knee'], result['knee'])
+            state['rep_min_elbow'] = np.fmin(state['rep_min_elbow'], result['elbow'])
+
+            if rep_completed:
+                if exercise in ('squat', 'lunges') and state['rep_min_knee'] > SQUAT_DEPTH_MAX:
+                    flags.append('shallow_depth')
+                if exercise == 'pushup' and state['rep_min_elbow'] > PUSHUP_RANGE_MAX:
+                    flags.append('short_range')
+                state['rep_min_knee'] = float('nan')
+                state['rep_min_elbow'] = float('nan')
+
+            for bucket in (state['total'], state['interval']):
+                bucket['frames'] += 1
+                bucket['reps'] += int(rep_completed)
+                for flag in flags:
+                    bucket['counts'][flag] = bucket['counts'].get(flag, 0) + 1
+
+        return flags
+
+    def get_counts(self, session_id: int) -> Dict:
+        """Cumulative counts for a session"""
+        with self._session_lock(session_id):
+            state = self.sessions.get(session_id)
+            if state is None:
+                return {'frames': 0, 'reps': 0, 'counts': {}}
+            total = state['total']
+            return {'frames': total['frames'], 'reps': total['reps'], 'counts': dict(total['counts'])}
+
+    def active_flags(self, session_id: int, min_ratio: float = 0.2) -> List[str]:
+        """Flags seen in at least `min_ratio` of frames (or reps, for per-rep flags), most frequent first"""
+        return flags_from_counts(self.get_counts(session_id), min_ratio)
+
+    def interval_aggregate(self, session_id: int) -> Dict:
+        """Copy of the counts since the last clear, for SessionMetric.flags_json"""
+        with self._session_lock(session_id):
+            state = self.sessions.get(session_id)
+            if state is None:
+                return {'frames': 0, 'reps': 0, 'counts': {}}
+            interval = state['interval']
+            return {'frames': interval['frames'], 'reps': interval['reps'], 'counts': dict(interval['counts'])}
+
+    def clear_aggregate(self, session_id: int, aggregate: Dict):
+        """
+        Subtract an interval_aggregate snapshot once it is stored; frames
+        counted after the snapshot stay for the next one.
+        """
+        with self._session_lock(session_id):
+            state = self.sessions.get(session_id)
+            if state is None:
+                return
+            interval = state['interval']
+            interval['frames'] = max(0, interval['frames'] - aggregate['frames'])
+            interval['reps'] = max(0, interval['reps'] - aggregate['reps'])
+            for flag, n in aggregate['counts'].items():
+                left = interval['counts'].get(flag, 0) - n
+                if left > 0:
+                    interval['counts'][flag] = left
+                else:
+                    interval['counts'].pop(flag, None)
+
+    def flush_aggregate(self, session_id: int) -> str:
+        """Compact JSON of the counts since the last flush, cleared at once"""
+        aggregate = self.interval_aggregate(session_id)
+        self.clear_aggregate(session_id, aggregate)
+        return json.dumps(aggregate, separators=(',', ':'))
+
+    def reset_session(self, session_id: int):
+        """Drop a session's counters (on stop or cleanup)"""
+        with self._session_lock(session_id):
+            self.sessions.pop(session_id, None)
+            with self._locks_guard:
+                self.session_locks.pop(session_id, None)
+
+
+def parse_flags_json(flags_json: Optional[str]) -> Dict:
+    """Read SessionMetric.flags_json (aggregate object or legacy flag list) as counts"""
+    try:
+        data = json.loads(flags_json) if flags_json else {}
+    except ValueError:
+        return {'frames': 0, 'reps': 0, 'counts': {}}
+    if isinstance(data, list):
+        return {'frames': 0, 'reps': 0, 'counts': {flag: 1 for flag in data}}
+    return {
+        'frames': data.get('frames', 0),
+        'reps': data.get('reps', 0),
+        'counts': dict(data.get('counts', {})),
+    }
+
+
+def merge_counts(aggregates: List[Dict]) -> Dict:
+    merged = {'frames': 0, 'reps': 0, 'counts': {}}
+    for agg in aggregates:
+        merged['frames'] += agg['frames']
+        merged['reps'] += agg['reps']
+        for flag, n in agg['counts'].items():
+            merged['counts'][flag] = merged['counts'].get(flag, 0) + n
+    return merged
+
+
+def flags_from_counts(aggregate: Dict, min_ratio: float = 0.2) -> List[str]:
+    """Turn counts into a ranked flag list for rule_based_tips"""
+    ratios = {}
+    for flag, n in aggregate['counts'].items():
+        denominator = aggregate['reps'] if flag in REP_FLAGS else aggregate['frames']
+        ratios[flag] = n / denominator if denominator else 1.0
+    return [f for f, r in sorted(ratios.items(), key=lambda kv: -kv[1]) if r >= min_ratio]
+
+
+# Global instance
+form_flag_detector = FormFlagDetector()
@@ -1,9 +1,11 @@
+import base64
 import cv2
 import math as m
 import mediapipe as mp
 import json
 from datetime import datetime
 from app.services.keyframe_detector import keyframe_detector
+from app.services.form_flags import form_flag_detector
 
 # Calculate distance
 def findDistance(x1, y1, x2, y2):
@@ -115,80 +117,105 @@ def annotate_image(image, landmark_coordinates, w, h):
         cv2.putText(image, 'No pose detected - Position yourself in frame', (10, 30), font, 0.9, red, 2)
     return image
 
-def process_frame(image, session_id=None, exercise='squat'):
+def extract_pose(image, session_id=None):
     """
-    Process a single frame for pose detection and analysis
-    Returns pose landmarks and analysis results
+    Run pose detection on a frame and annotate it.
+    Returns (landmarks, normalized landmarks list, annotated JPEG bytes)
     """
-    print(f"🔍 [FRAME PROCESS START] Session {session_id}: Processing frame")
-    try:
-        # Get image dimensions
-        h, w = image.shape[:2]
-        print(f"🔍 [FRAME PROCESS] Session {session_id}: Image dimensions {w}x{h}")
-        
-        # Convert BGR to RGB for MediaPipe
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Process the image with MediaPipe
-        results = pose.process(rgb_image)
-        print(f"🔍 [MEDIAPIPE] Session {session_id}: MediaPipe processed frame")
-        
-        # Get landmark coordinates
-        landmarks = get_landmark_coordinates(results, w, h)
-        print(f"🔍 [LANDMARKS] Session {session_id}: Got {len(landmarks) if landmarks else 0} landmarks")
-        
-        # Annotate the image with pose landmarks
-        annotated_image = annotate_image(image.copy(), landmarks, w, h)
-        
-        # Convert annotated image back to base64 for response
-        import base64
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        annotated_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        # Check if this should be saved as a keyframe and if rep was completed
-        keyframe_type = None
-        rep_completed = False
-        if session_id is not None:
-            # Convert landmarks to list format for keyframe detector
-            landmarks_list = []
-            if landmarks:
-                for landmark_name, (x, y) in landmarks.items():
-                    landmarks_list.append({
-                        'name': landmark_name.name,
-                        'x': x / w,  # Normalize coordinates to 0-1 range
-                        'y': y / h   # Normalize coordinates to 0-1 range
-                    })
-            
-            print(f"🔍 [POSE DEBUG] Session {session_id}: {len(landmarks)} landmarks detected")
-            if landmarks_list:
-                print(f"🔍 [POSE DEBUG] Sample landmarks: {landmarks_list[:3]}")
-            
-            keyframe_type, rep_completed = keyframe_detector.should_save_keyframe(
-                session_id, exercise, landmarks_list, datetime.now()
-            )
-            
-            print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: keyframe_type={keyframe_type}, rep_completed={rep_completed}")
-            print(f"🔍 [REP DEBUG] Session {session_id}: current_rep_count={keyframe_detector.get_rep_count(session_id)}")
+    # Get image dimensions
+    h, w = image.shape[:2]
+    print(f"🔍 [FRAME PROCESS] Session {session_id}: Image dimensions {w}x{h}")
+    
+    # Convert BGR to RGB for MediaPipe
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    # Process the image with MediaPipe
+    results = pose.process(rgb_image)
+    print(f"🔍 [MEDIAPIPE] Session {session_id}: MediaPipe processed frame")
+    
+    # Get landmark coordinates
+    landmarks = get_landmark_coordinates(results, w, h)
+    print(f"🔍 [LANDMARKS] Session {session_id}: Got {len(landmarks) if landmarks else 0} landmarks")
+    
+    # Annotate the image with pose landmarks
+    annotated_image = annotate_image(image.copy(), landmarks, w, h)
+    
+    # Encode annotated image as JPEG; base64 only happens at the API edge
+    _, buffer = cv2.imencode('.jpg', annotated_image)
+    annotated_jpeg = buffer.tobytes()
+    
+    # Convert landmarks to list format for keyframe detector
+    landmarks_list = []
+    if landmarks:
+        for landmark_name, (x, y) in landmarks.items():
+            landmarks_list.append({
+                'name': landmark_name.name,
+                'x': x / w,  # Normalize coordinates to 0-1 range
+                'y': y / h   # Normalize coordinates to 0-1 range
+            })
+    
+    return landmarks, landmarks_list, annotated_jpeg
+
+def detect_keyframe(session_id, exercise, landmarks, landmarks_list, annotated_jpeg, timestamp):
+    """
+    Run keyframe/rep detection for one frame and build the frame result.
+    `timestamp` is the frame's capture time.
+    """
+    # Check if this should be saved as a keyframe and if rep was completed
+    keyframe_type = None
+    rep_completed = False
+    form_flags = []
+    if session_id is not None:
+        print(f"🔍 [POSE DEBUG] Session {session_id}: {len(landmarks)} landmarks detected")
+        if landmarks_list:
+            print(f"🔍 [POSE DEBUG] Sample landmarks: {landmarks_list[:3]}")
         
-        # Extract pose analysis data
-        pose_data = {
-            'landmarks': landmarks,
-            'annotated_image': annotated_base64,
-            'keyframe_type': keyframe_type,
-            'should_save_keyframe': keyframe_type is not None,
-            'rep_completed': rep_completed,
-            'current_rep_count': keyframe_detector.get_rep_count(session_id) if session_id else 0
-        }
+        keyframe_type, rep_completed = keyframe_detector.should_save_keyframe(
+            session_id, exercise, landmarks_list, timestamp
+        )
         
-        return pose_data
+        print(f"🔍 [KEYFRAME DEBUG] Session {session_id}: keyframe_type={keyframe_type}, rep_completed={rep_completed}")
         
+        # Count form flags for this frame (and the rep's range if one just completed)
+        form_flags = form_flag_detector.update(session_id, exercise, landmarks_list, rep_completed)
+        print(f"🔍 [REP DEBUG] Session {session_id}: current_rep_count={keyframe_detector.get_rep_count(session_id)}")
+    
+    # Extract pose analysis data
+    return {
+        'landmarks': landmarks,
+        'annotated_jpeg': annotated_jpeg,
+        'keyframe_type': keyframe_type,
+        'should_save_keyframe': keyframe_type is not None,
+        'rep_completed': rep_completed,
+        'current_rep_count': keyframe_detector.get_rep_count(session_id) if session_id else 0,
+        'form_flags': form_flags,
+        'timestamp': timestamp
+    }
+
+def error_result(session_id, e):
+    print(f"❌ [FRAME PROCESS ERROR] Session {session_id}: {str(e)}")
+    return {
+        'error': str(e),
+        'landmarks': None,
+        'keyframe_type': None,
+        'should_save_keyframe': False,
+        'rep_completed': False,
+        'current_rep_count': 0
+    }
+
+def process_frame(image, session_id=None, exercise='squat', timestamp=None):
+    """
+    Process a single frame for pose detection and analysis
+    Returns pose landmarks and analysis results, with the annotated image as base64
+    """
+    print(f"🔍 [FRAME PROCESS START] Session {session_id}: Processing frame")
+    try:
+        landmarks, landmarks_list, annotated_jpeg = extract_pose(image, session_id)
+        result = detect_keyframe(
+            session_id, exercise, landmarks, landmarks_list, annotated_jpeg,
+            timestamp or datetime.now()
+        )
+        result['annotated_image'] = base64.b64encode(annotated_jpeg).decode('utf-8')
+        return result
     except Exception as e:
-        print(f"❌ [FRAME PROCESS ERROR] Session {session_id}: {str(e)}")
-        return {
-            'error': str(e),
-            'landmarks': None,
-            'keyframe_type': None,
-            'should_save_keyframe': False,
-            'rep_completed': False,
-            'current_rep_count': 0
-        }
\ No newline at end of file
+        return error_result(session_id, e)
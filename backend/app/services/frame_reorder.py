@@ -0,0 +1,108 @@
+import heapq
+import threading
+from typing import Any, Callable, Dict
+
+
+class FrameReorderBuffer:
+    """
+    Per-session reorder window in front of KeyframeDetector.
+
+    Clients number frames with a sequence number and send them without waiting
+    for replies, so inference can finish out of order. Frames are held here
+    until every earlier sequence number has been seen (or the window fills,
+    in which case the gap is skipped) and are then handed to the consumer in
+    capture order. Late and duplicate frames are dropped.
+    """
+
+    def __init__(self, window: int = 8, start_seq: int = 0):
+        self.window = window
+        self.start_seq = start_seq
+        self.sessions = {}  # session_id -> {'next_seq', 'pending', 'pending_seqs'}
+        self.session_locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _session_lock(self, session_id: int) -> threading.Lock:
+        lock = self.session_locks.get(session_id)
+        if lock is None:
+            with self._locks_guard:
+                lock = self.session_locks.setdefault(session_id, threading.Lock())
+        return lock
+
+    def _state(self, session_id: int) -> Dict:
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions[session_id] = {
+                'next_seq': self.start_seq,
+                'pending': [],  # heap of (seq, item)
+                'pending_seqs': set(),
+            }
+        return state
+
+    def is_stale(self, session_id: int, seq: int) -> bool:
+        """Cheap pre-check so late or duplicate frames can skip decoding and inference"""
+        state = self.sessions.get(session_id)
+        if state is None:
+            return seq < self.start_seq
+        return seq < state['next_seq'] or seq in state['pending_seqs']
+
+    def submit(self, session_id: int, seq: int, item: Any, consume: Callable[[Any], Any]) -> Dict[int, Any]:
+        """
+        Add a frame and release every frame that is now in order.
+
+        `consume` is called once per released item, in sequence order, while
+        the session lock is held. Returns {seq: consume(item)} for the
+        released frames; empty if this frame was dropped or is still waiting.
+        """
+        with self._session_lock(session_id):
+            state = self._state(session_id)
+            if seq < state['next_seq'] or seq in state['pending_seqs']:
+                print(f"⏭️ [REORDER] Session {session_id}: dropping late/duplicate frame seq={seq}")
+                return {}
+
+            heapq.heappush(state['pending'], (seq, id(item), item))
+            state['pending_seqs'].add(seq)
+
+            released = {}
+            pending = state['pending']
+            while pending and (pending[0][0] == state['next_seq'] or len(pending) > self.window):
+                next_seq, _, next_item = heapq.heappop(pending)
+                state['pending_seqs'].discard(next_seq)
+                if next_seq != state['next_seq']:
+                    print(f"⚠️ [REORDER] Session {session_id}: skipping missing frames {state['next_seq']}..{next_seq - 1}")
+                state['next_seq'] = next_seq + 1
+                released[next_seq] = consume(next_item)
+            return released
+
+    def drain(self, session_id: int, consume: Callable[[Any], Any]) -> Dict[int, Any]:
+        """
+        Release every frame still held for a session, in sequence order and
+        skipping any gaps, then drop its state (the session has ended).
+        Returns {seq: consume(item)} like submit().
+        """
+        with self._session_lock(session_id):
+            state = self.sessions.get(session_id)
+            released = {}
+            if state is not None:
+                pending = state['pending']
+                if pending:
+                    print(f"🔍 [REORDER] Session {session_id}: releasing {len(pending)} held frame(s) at stop")
+                while pending:
+                    seq, _, item = heapq.heappop(pending)
+                    released[seq] = consume(item)
+            self._forget(session_id)
+            return released
+
+    def reset_session(self, session_id: int):
+        """Drop reorder state for a session"""
+        with self._session_lock(session_id):
+            self._forget(session_id)
+
+    def _forget(self, session_id: int):
+        # Called with the session lock held; a later frame starts a fresh state and lock
+        self.sessions.pop(session_id, None)
+        with self._locks_guard:
+            self.session_locks.pop(session_id, None)
+
+
+# Global instance
+frame_reorder_buffer = FrameReorderBuffer()
@@ -1,13 +1,26 @@
-from google import genai
+from google.genai import types
 import json
 import base64
-from typing import List, Dict, Optional, Tuple
+import re
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import os
 from app.db.models import AnnotatedFrame
+from app.db.session_data import count_keyframes, keyframes_by_id, sample_keyframes
+from app.services.keyframe_storage import load_frame_bytes, keyframe_landmarks
+from app.services.keyframe_selector import select_keyframes
+from app.services.prompt_budget import ImageBudget, ImagePlan, text_tokens
+from app.services.analysis_cache import analysis_cache, analysis_key
+from app.services.analysis_stream import JsonSectionParser, section_events
+from app.services.llm_client import llm_client
+from app.services.local_analyzer import local_suggestions
 from sqlmodel import Session as SQLSession, select
 from app.core.config import settings
 
+GEMINI_ANALYSIS_MODEL = "gemini-2.0-flash"
+# Bump whenever the prompt or response parsing changes, so cached analyses are not reused
+PROMPT_VERSION = "4"
+
 class GeminiPostureAnalyzer:
     def __init__(self):
         # Configure Gemini API
@@ -20,11 +33,19 @@ class GeminiPostureAnalyzer:
         
         try:
             print(f"🔍 [GEMINI INIT] Initializing Gemini client...")
-            self.client = genai.Client(api_key=api_key)
+            # Shared with /tips: one connection pool, deadlines, retries and circuit breaker
+            self.llm = llm_client
+            self.llm.client()
             print(f"🔍 [GEMINI INIT] Gemini client initialized successfully")
         except Exception as e:
             print(f"❌ [GEMINI INIT] Failed to initialize Gemini client: {e}")
             raise ValueError(f"Failed to initialize Gemini client: {str(e)}")
+        
+        self.image_budget = ImageBudget(
+            max_tokens=settings.ANALYSIS_TOKEN_BUDGET,
+            max_bytes=settings.ANALYSIS_IMAGE_BYTES_BUDGET,
+            max_images=settings.ANALYSIS_MAX_IMAGES,
+        )
     
     def analyze_session_posture(
         self, 
@@ -38,65 +59,29 @@ class GeminiPostureAnalyzer:
         print(f"🔍 [GEMINI DEBUG] Starting analysis for session {session_id}, exercise: {exercise}")
         
         try:
-            # Get all keyframes for the session
-            keyframes = db.exec(
-                select(AnnotatedFrame).where(AnnotatedFrame.session_id == session_id)
-            ).all()
-            
-            print(f"🔍 [GEMINI DEBUG] Found {len(keyframes)} keyframes for session {session_id}")
-            
+            keyframes, prompt_keyframes, reasons, cache_key = self._select_request(session_id, exercise, db)
             if not keyframes:
-                print(f"⚠️ [GEMINI DEBUG] No keyframes found for session {session_id}")
-                return {
-                    "status": "success",
-                    "session_id": session_id,
-                    "exercise": exercise,
-                    "total_keyframes": 0,
-                    "analyzed_keyframes": 0,
-                    "suggestions": {
-                        "overall_assessment": "No pose data was captured during this session. Please ensure you are visible in the camera frame during your workout.",
-                        "strengths": ["Session completed successfully"],
-                        "areas_for_improvement": ["Ensure camera visibility", "Check pose detection"],
-                        "specific_suggestions": [
-                            {
-                                "category": "Technical",
-                                "issue": "No pose data captured",
-                                "suggestion": "Make sure you are fully visible in the camera frame and well-lit during your workout",
-                                "priority": "High"
-                            }
-                        ],
-                        "exercise_specific_tips": [f"Position yourself clearly in view for {exercise} tracking"],
-                        "next_session_focus": "Ensure proper camera positioning and lighting"
-                    },
-                    "analysis_timestamp": datetime.now().isoformat()
-                }
-            
-            # Log keyframe details
-            for i, kf in enumerate(keyframes):
-                print(f"🔍 [GEMINI DEBUG] Keyframe {i+1}: type={kf.keyframe_type}, exercise={kf.exercise}, timestamp={kf.timestamp}")
+                return self._no_keyframes_result(session_id, exercise)
             
-            # Sample keyframes if too many (>150)
-            sampled_keyframes = self._sample_keyframes(keyframes)
-            print(f"🔍 [GEMINI DEBUG] Sampled to {len(sampled_keyframes)} keyframes")
+            def analyze():
+                # Prepare data for Gemini analysis
+                analysis_data = self._prepare_analysis_data(prompt_keyframes, exercise, reasons)
+                print(f"🔍 [GEMINI DEBUG] Prepared analysis data with {len(analysis_data)} entries")
+                return self._request_suggestions(analysis_data, exercise)
             
-            # Prepare data for Gemini analysis
-            analysis_data = self._prepare_analysis_data(sampled_keyframes, exercise)
-            print(f"🔍 [GEMINI DEBUG] Prepared analysis data with {len(analysis_data)} entries")
-            
-            # Generate posture analysis using Gemini
+            # Generate posture analysis using Gemini (cached, and shared with concurrent duplicates)
             print(f"🔍 [GEMINI DEBUG] Calling Gemini API...")
-            suggestions = self._generate_posture_suggestions(analysis_data, exercise)
-            print(f"🔍 [GEMINI DEBUG] Gemini analysis completed")
+            try:
+                suggestions = analysis_cache.get_or_compute(cache_key, analyze, session_id, exercise, PROMPT_VERSION)
+                print(f"🔍 [GEMINI DEBUG] Gemini analysis completed")
+            except Exception as e:
+                print(f"❌ [GEMINI DEBUG] Error calling Gemini API: {e}")
+                print(f"❌ [GEMINI DEBUG] Exception type: {type(e)}")
+                import traceback
+                print(f"❌ [GEMINI DEBUG] Traceback: {traceback.format_exc()}")
+                suggestions = self._fallback_suggestions(keyframes, exercise)
             
-            return {
-                "status": "success",
-                "session_id": session_id,
-                "exercise": exercise,
-                "total_keyframes": len(keyframes),
-                "analyzed_keyframes": len(sampled_keyframes),
-                "suggestions": suggestions,
-                "analysis_timestamp": datetime.now().isoformat()
-            }
+            return self._success_result(session_id, exercise, count_keyframes(db, session_id), prompt_keyframes, suggestions)
             
         except Exception as e:
             print(f"❌ [GEMINI DEBUG] Error in analyze_session_posture: {e}")
@@ -108,36 +93,137 @@ class GeminiPostureAnalyzer:
                 "message": f"Analysis failed: {str(e)}"
             }
     
-    def _sample_keyframes(self, keyframes: List[AnnotatedFrame]) -> List[AnnotatedFrame]:
+    def stream_session_posture(
+        self, 
+        session_id: int, 
+        exercise: str, 
+        db: SQLSession
+    ) -> Iterator[Tuple[str, Dict]]:
         """
-        Sample keyframes evenly if there are more than 150
+        Analysis as (event, data) pairs for analysis_stream: the local
+        preview, model text deltas, each suggestions section as it parses,
+        then the same result dict as analyze_session_posture
         """
-        if len(keyframes) <= 150:
-            return keyframes
+        print(f"🔍 [GEMINI DEBUG] Starting streamed analysis for session {session_id}, exercise: {exercise}")
+        keyframes, prompt_keyframes, reasons, cache_key = self._select_request(session_id, exercise, db)
+        if not keyframes:
+            result = self._no_keyframes_result(session_id, exercise)
+            yield from section_events(result["suggestions"])
+            yield "result", result
+            return
+        
+        # Landmark-based feedback while the model works
+        yield "preview", local_suggestions(keyframes, exercise)
         
-        # Sort by timestamp to ensure chronological order
-        sorted_keyframes = sorted(keyframes, key=lambda k: k.timestamp)
+        suggestions = analysis_cache.get(cache_key)
+        if suggestions is not None:
+            print(f"🔍 [GEMINI DEBUG] Streaming cached analysis")
+            yield from section_events(suggestions)
+        else:
+            try:
+                analysis_data = self._prepare_analysis_data(prompt_keyframes, exercise, reasons)
+                contents = self._request_contents(analysis_data, exercise)
+                parser = JsonSectionParser()
+                chunks = []
+                for chunk in self.llm.generate_stream(contents, model=GEMINI_ANALYSIS_MODEL):
+                    chunks.append(chunk)
+                    yield "delta", {"text": chunk}
+                    for name, value in parser.feed(chunk):
+                        yield "section", {"name": name, "value": value}
+                suggestions = self._parse_suggestions("".join(chunks), exercise)
+                if not parser.done:
+                    # Only parsable as a whole: send the sections the parser missed
+                    yield from section_events(suggestions)
+                analysis_cache.put(cache_key, suggestions, session_id, exercise, PROMPT_VERSION)
+            except Exception as e:
+                print(f"❌ [GEMINI DEBUG] Streamed Gemini call failed: {e}")
+                suggestions = self._fallback_suggestions(keyframes, exercise)
+                yield "fallback", {"detail": str(e)}
+                yield from section_events(suggestions)
+        
+        yield "result", self._success_result(session_id, exercise, count_keyframes(db, session_id), prompt_keyframes, suggestions)
+    
+    def _select_request(self, session_id: int, exercise: str, db: SQLSession):
+        """
+        (candidate keyframes, prompt keyframes with images, selection reasons, cache key);
+        empty lists when the session has no keyframes
+        """
+        # At most ANALYSIS_MAX_CANDIDATES keyframes, without their images, however long the session
+        keyframes = list(sample_keyframes(db, session_id, settings.ANALYSIS_MAX_CANDIDATES))
         
-        # Calculate sampling interval
-        total_count = len(sorted_keyframes)
-        sample_count = 150
-        interval = total_count / sample_count
+        print(f"🔍 [GEMINI DEBUG] Sampled {len(keyframes)} keyframes for session {session_id}")
         
-        sampled = []
-        for i in range(sample_count):
-            index = int(i * interval)
-            if index < total_count:
-                sampled.append(sorted_keyframes[index])
+        if not keyframes:
+            print(f"⚠️ [GEMINI DEBUG] No keyframes found for session {session_id}")
+            return [], [], {}, None
         
-        return sampled
+        # Log keyframe details
+        for i, kf in enumerate(keyframes):
+            print(f"🔍 [GEMINI DEBUG] Keyframe {i+1}: type={kf.keyframe_type}, exercise={kf.exercise}, timestamp={kf.timestamp}")
+        
+        # Pick the most informative keyframes from their landmarks
+        selected = select_keyframes(keyframes, exercise, self.image_budget.max_images)
+        reasons = {s.keyframe.id: s.reason for s in selected}
+        for s in selected:
+            print(f"🔍 [GEMINI DEBUG] Selected keyframe {s.keyframe.id} ({s.keyframe.keyframe_type}): {s.reason}")
+        
+        # Only the selected keyframes are read with their images
+        prompt_keyframes = keyframes_by_id(db, list(reasons))
+        
+        # The same keyframes, exercise and prompt give the same analysis
+        budget = self.image_budget
+        cache_key = analysis_key(
+            exercise, prompt_keyframes, PROMPT_VERSION, GEMINI_ANALYSIS_MODEL,
+            f"{budget.max_tokens}/{budget.max_bytes}/{budget.max_images}/{budget.sides}"
+        )
+        return keyframes, prompt_keyframes, reasons, cache_key
+    
+    def _success_result(self, session_id: int, exercise: str, total_keyframes: int,
+                        prompt_keyframes: List[AnnotatedFrame], suggestions: Dict[str, any]) -> Dict[str, any]:
+        return {
+            "status": "success",
+            "session_id": session_id,
+            "exercise": exercise,
+            "total_keyframes": total_keyframes,
+            "analyzed_keyframes": len(prompt_keyframes),
+            "suggestions": suggestions,
+            "analysis_timestamp": datetime.now().isoformat()
+        }
+    
+    def _no_keyframes_result(self, session_id: int, exercise: str) -> Dict[str, any]:
+        return {
+            "status": "success",
+            "session_id": session_id,
+            "exercise": exercise,
+            "total_keyframes": 0,
+            "analyzed_keyframes": 0,
+            "suggestions": {
+                "overall_assessment": "No pose data was captured during this session. Please ensure you are visible in the camera frame during your workout.",
+                "strengths": ["Session completed successfully"],
+                "areas_for_improvement": ["Ensure camera visibility", "Check pose detection"],
+                "specific_suggestions": [
+                    {
+                        "category": "Technical",
+                        "issue": "No pose data captured",
+                        "suggestion": "Make sure you are fully visible in the camera frame and well-lit during your workout",
+                        "priority": "High"
+                    }
+                ],
+                "exercise_specific_tips": [f"Position yourself clearly in view for {exercise} tracking"],
+                "next_session_focus": "Ensure proper camera positioning and lighting"
+            },
+            "analysis_timestamp": datetime.now().isoformat()
+        }
     
     def _prepare_analysis_data(
         self, 
         keyframes: List[AnnotatedFrame], 
-        exercise: str
+        exercise: str,
+        reasons: Optional[Dict[int, str]] = None
     ) -> Dict[str, any]:
         """
-        Prepare keyframe data for Gemini analysis
+        Prepare keyframe data for Gemini analysis; `reasons` maps keyframe
+        id to why the selector picked it
         """
         print(f"🔍 [GEMINI DEBUG] Preparing analysis data for {len(keyframes)} keyframes")
         
@@ -148,83 +234,112 @@ class GeminiPostureAnalyzer:
         }
         
         for i, keyframe in enumerate(keyframes):
-            # Parse landmarks
-            try:
-                landmarks = json.loads(keyframe.pose_landmarks) if keyframe.pose_landmarks else []
-                print(f"🔍 [GEMINI DEBUG] Keyframe {i+1}: parsed {len(landmarks)} landmarks")
-            except Exception as e:
-                landmarks = []
-                print(f"⚠️ [GEMINI DEBUG] Keyframe {i+1}: error parsing landmarks: {e}")
+            # Unpack landmarks (packed binary, or JSON for legacy rows)
+            landmarks = keyframe_landmarks(keyframe)
+            print(f"🔍 [GEMINI DEBUG] Keyframe {i+1}: unpacked {len(landmarks)} landmarks")
             
             keyframe_data = {
                 "keyframe_type": keyframe.keyframe_type,
                 "timestamp": keyframe.timestamp.isoformat(),
                 "landmarks": landmarks,
-                "frame_data": keyframe.frame_data  # Include full image data
+                "image": load_frame_bytes(keyframe),  # Full-size JPEG; downscaled when the request is built
+                "selected_as": (reasons or {}).get(keyframe.id)
             }
             
             analysis_data["keyframes"].append(keyframe_data)
         
         return analysis_data
     
-    def _generate_posture_suggestions(
+    def _request_suggestions(
         self, 
         analysis_data: Dict[str, any], 
         exercise: str
     ) -> Dict[str, any]:
         """
-        Use Gemini to analyze posture and generate suggestions
+        Use Gemini to analyze posture and generate suggestions; raises on API
+        errors and on responses without a suggestions object
+        """
+        contents = self._request_contents(analysis_data, exercise)
+        
+        print(f"🔍 [GEMINI DEBUG] Calling Gemini API with model {GEMINI_ANALYSIS_MODEL}")
+        suggestions_text = self.llm.generate(contents, model=GEMINI_ANALYSIS_MODEL)
+        print(f"🔍 [GEMINI DEBUG] Gemini API response received")
+        
+        print(f"🔍 [GEMINI DEBUG] Received response length: {len(suggestions_text)} characters")
+        print(f"🔍 [GEMINI DEBUG] Response text preview: {suggestions_text[:200]}...")
+        
+        # Parse the response into structured suggestions
+        suggestions = self._parse_suggestions(suggestions_text, exercise)
+        print(f"🔍 [GEMINI DEBUG] Parsed suggestions successfully")
+        
+        return suggestions
+    
+    def _request_contents(self, analysis_data: Dict[str, any], exercise: str) -> List:
+        """
+        Prompt text plus the downscaled images that fit the request budget
         """
         prompt = self._create_analysis_prompt(analysis_data, exercise)
         print(f"🔍 [GEMINI DEBUG] Prompt length: {len(prompt)} characters")
         
+        # Fit downscaled images into what is left of the budget after the text
+        plan = self.image_budget.plan(
+            [keyframe.get('image') for keyframe in analysis_data['keyframes']],
+            reserved_tokens=text_tokens(prompt)
+        )
+        print(f"🔍 [GEMINI DEBUG] Attaching {len(plan.images)} images at {plan.side}px "
+              f"({plan.bytes} bytes, ~{plan.tokens + text_tokens(prompt)} tokens)")
+        return self._build_contents(analysis_data, exercise, plan)
+    
+    def _fallback_suggestions(self, keyframes: List[AnnotatedFrame], exercise: str) -> Dict[str, any]:
+        """
+        Local landmark-based suggestions when Gemini cannot be reached, or
+        generic ones if that fails too (never cached)
+        """
         try:
-            print(f"🔍 [GEMINI DEBUG] Calling Gemini API with model gemini-1.5-pro")
-            print(f"🔍 [GEMINI DEBUG] About to call self.client.models.generate_content")
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt
-            )
-            print(f"🔍 [GEMINI DEBUG] Gemini API response received")
-            print(f"🔍 [GEMINI DEBUG] Response type: {type(response)}")
-            
-            suggestions_text = response.text
-            print(f"🔍 [GEMINI DEBUG] Received response length: {len(suggestions_text)} characters")
-            print(f"🔍 [GEMINI DEBUG] Response text preview: {suggestions_text[:200]}...")
-            
-            # Parse the response into structured suggestions
-            suggestions = self._parse_suggestions(suggestions_text, exercise)
-            print(f"🔍 [GEMINI DEBUG] Parsed suggestions successfully")
-            
-            return suggestions
-            
+            return local_suggestions(keyframes, exercise)
         except Exception as e:
-            print(f"❌ [GEMINI DEBUG] Error calling Gemini API: {e}")
-            print(f"❌ [GEMINI DEBUG] Exception type: {type(e)}")
-            import traceback
-            print(f"❌ [GEMINI DEBUG] Traceback: {traceback.format_exc()}")
-            # Return fallback suggestions
-            return {
-                "overall_assessment": f"Unable to analyze {exercise} form at this time. Please consult with a fitness professional for personalized feedback.",
-                "strengths": ["Completed workout session"],
-                "areas_for_improvement": ["AI analysis temporarily unavailable"],
-                "specific_suggestions": [
-                    {
-                        "category": "Technical",
-                        "issue": "Analysis service error",
-                        "suggestion": "Please try again later or consult with a fitness professional",
-                        "priority": "Medium"
-                    }
-                ],
-                "exercise_specific_tips": [f"Focus on maintaining proper {exercise} form"],
-                "next_session_focus": "Continue practicing with attention to form"
-            }
+            print(f"❌ [GEMINI DEBUG] Local fallback analysis failed: {e}")
+        return {
+            "overall_assessment": f"Unable to analyze {exercise} form at this time. Please consult with a fitness professional for personalized feedback.",
+            "strengths": ["Completed workout session"],
+            "areas_for_improvement": ["AI analysis temporarily unavailable"],
+            "specific_suggestions": [
+                {
+                    "category": "Technical",
+                    "issue": "Analysis service error",
+                    "suggestion": "Please try again later or consult with a fitness professional",
+                    "priority": "Medium"
+                }
+            ],
+            "exercise_specific_tips": [f"Focus on maintaining proper {exercise} form"],
+            "next_session_focus": "Continue practicing with attention to form"
+        }
     
     def _create_analysis_prompt(self, analysis_data: Dict[str, any], exercise: str) -> str:
         """
-        Create a detailed prompt for Gemini analysis
+        Create the text of the analysis prompt (images are attached by _build_contents)
         """
-        prompt = f"""
+        prompt = self._prompt_header(analysis_data, exercise)
+        for i, keyframe in enumerate(analysis_data['keyframes']):
+            prompt += self._keyframe_text(i, keyframe)
+        return prompt + self._prompt_instructions(exercise)
+    
+    def _build_contents(self, analysis_data: Dict[str, any], exercise: str, plan: ImagePlan) -> List:
+        """
+        Request parts: the prompt text with each planned image as an inline
+        JPEG part right after its keyframe's landmarks
+        """
+        images = dict(zip(plan.indices, plan.images))
+        contents = [self._prompt_header(analysis_data, exercise)]
+        for i, keyframe in enumerate(analysis_data['keyframes']):
+            contents.append(self._keyframe_text(i, keyframe))
+            if i in images:
+                contents.append(types.Part.from_bytes(data=images[i], mime_type="image/jpeg"))
+        contents.append(self._prompt_instructions(exercise))
+        return contents
+    
+    def _prompt_header(self, analysis_data: Dict[str, any], exercise: str) -> str:
+        return f"""
 You are a professional fitness trainer and posture expert. Analyze the following workout session data for a {exercise} exercise and provide detailed posture improvement suggestions.
 
 EXERCISE: {exercise}
@@ -232,27 +347,25 @@ TOTAL KEYFRAMES ANALYZED: {analysis_data['total_keyframes']}
 
 KEYFRAME DATA:
 """
-        
-        # Add keyframe information with images
-        for i, keyframe in enumerate(analysis_data['keyframes'][:5]):  # Limit to first 5 for prompt length and cost
-            prompt += f"""
+    
+    def _keyframe_text(self, i: int, keyframe: Dict[str, any]) -> str:
+        text = f"""
 Keyframe {i+1} ({keyframe['keyframe_type']} position):
 - Timestamp: {keyframe['timestamp']}
 - Landmarks: {len(keyframe['landmarks'])} detected points
 """
-            
-            # Add key landmark positions for analysis
-            if keyframe['landmarks']:
-                key_landmarks = ['LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_SHOULDER', 'RIGHT_SHOULDER']
-                for landmark in keyframe['landmarks']:
-                    if landmark.get('name') in key_landmarks:
-                        prompt += f"  - {landmark['name']}: ({landmark.get('x', 'N/A')}, {landmark.get('y', 'N/A')})\n"
-            
-            # Add the image
-            if keyframe.get('frame_data'):
-                prompt += f"\nImage of {keyframe['keyframe_type']} position:\n{keyframe['frame_data']}\n"
-        
-        prompt += f"""
+        if keyframe.get('selected_as'):
+            text += f"- Selected as: {keyframe['selected_as']}\n"
+        # Add key landmark positions for analysis
+        if keyframe['landmarks']:
+            key_landmarks = ['LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_SHOULDER', 'RIGHT_SHOULDER']
+            for landmark in keyframe['landmarks']:
+                if landmark.get('name') in key_landmarks:
+                    text += f"  - {landmark['name']}: ({landmark.get('x', 'N/A')}, {landmark.get('y', 'N/A')})\n"
+        return text
+    
+    def _prompt_instructions(self, exercise: str) -> str:
+        return f"""
 
 Please analyze the workout session by examining both the landmark coordinates and the visual images provided. Focus on:
 
@@ -280,58 +393,20 @@ Please provide your analysis in the following JSON format:
     "next_session_focus": "What to focus on in the next workout session based on current form"
 }}
 """
-        
-        return prompt
     
     def _parse_suggestions(self, suggestions_text: str, exercise: str) -> Dict[str, any]:
         """
-        Parse Gemini response into structured suggestions
+        Parse Gemini response into structured suggestions; raises ValueError
+        when it holds no JSON object, so the text is never cached as an analysis
         """
-        try:
-            # Try to extract JSON from the response
-            import re
-            
-            # Look for JSON block in the response
-            json_match = re.search(r'\{.*\}', suggestions_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                suggestions = json.loads(json_str)
-                return suggestions
-            else:
-                # If no JSON found, create a structured response from text
-                return {
-                    "overall_assessment": "Analysis completed",
-                    "strengths": ["Session completed successfully"],
-                    "areas_for_improvement": ["Continue practicing form"],
-                    "specific_suggestions": [
-                        {
-                            "category": "General",
-                            "issue": "Form refinement needed",
-                            "suggestion": suggestions_text[:200] + "...",
-                            "priority": "Medium"
-                        }
-                    ],
-                    "exercise_specific_tips": [f"Focus on proper {exercise} technique"],
-                    "next_session_focus": "Continue building consistency"
-                }
-                
-        except Exception as e:
-            return {
-                "overall_assessment": "Analysis completed with limitations",
-                "strengths": ["Session data processed"],
-                "areas_for_improvement": ["Form analysis needed"],
-                "specific_suggestions": [
-                    {
-                        "category": "General",
-                        "issue": "Analysis parsing error",
-                        "suggestion": "Please review your form with a trainer",
-                        "priority": "Medium"
-                    }
-                ],
-                "exercise_specific_tips": [f"Focus on proper {exercise} technique"],
-                "next_session_focus": "Continue practicing",
-                "raw_response": suggestions_text
-            }
+        # Look for JSON block in the response
+        json_match = re.search(r'\{.*\}', suggestions_text, re.DOTALL)
+        if not json_match:
+            raise ValueError(f"No JSON object in Gemini response: {suggestions_text[:200]!r}")
+        suggestions = json.loads(json_match.group(0))  # JSONDecodeError is a ValueError
+        if not isinstance(suggestions, dict):
+            raise ValueError(f"Gemini response JSON is not an object: {suggestions_text[:200]!r}")
+        return suggestions
 
 # Global instance - will be initialized when first used
 gemini_analyzer = None
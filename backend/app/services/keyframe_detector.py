@@ -1,15 +1,27 @@
 import json
+import threading
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import numpy as np
+from app.services.plank_analyzer import PlankAnalyzer
 
 class KeyframeDetector:
     def __init__(self):
-        self.last_keyframe_time = {}  # Track last keyframe time per session
+        self.plank_analyzer = PlankAnalyzer()  # Continuous plank-hold analysis per session
         self.motion_state = {}  # Track motion state per session
         self.last_landmarks = {}  # Track previous landmarks for motion detection
         self.rep_counters = {}  # Track rep counting per session
-        
+        self.session_locks = {}  # One lock per session; frames of different sessions run in parallel
+        self._locks_guard = threading.Lock()  # Only held while creating or dropping a session lock
+        
+    def _session_lock(self, session_id: int) -> threading.Lock:
+        """Get (or create) the lock that serializes frames of one session"""
+        lock = self.session_locks.get(session_id)
+        if lock is None:
+            with self._locks_guard:
+                lock = self.session_locks.setdefault(session_id, threading.Lock())
+        return lock
+    
     def should_save_keyframe(
         self, 
         session_id: int, 
@@ -20,26 +32,25 @@ class KeyframeDetector:
         """
         Determine if current frame should be saved as a keyframe and if a rep was completed.
         Returns (keyframe_type, rep_completed)
+        
+        Calls for the same session are serialized so concurrent frames cannot
+        interleave on its motion state and rep counter.
         """
-        if exercise == 'plank':
-            keyframe_type = self._check_plank_keyframe(session_id, timestamp)
-            return keyframe_type, False  # Planks don't count reps
-        else:
-            return self._check_motion_keyframe(session_id, exercise, landmarks, timestamp)
+        with self._session_lock(session_id):
+            if exercise == 'plank':
+                keyframe_type = self._check_plank_keyframe(session_id, landmarks, timestamp)
+                return keyframe_type, False  # Planks don't count reps
+            else:
+                return self._check_motion_keyframe(session_id, exercise, landmarks, timestamp)
     
-    def _check_plank_keyframe(self, session_id: int, timestamp: datetime) -> Optional[str]:
-        """Check if plank interval keyframe should be saved (every 30 seconds)"""
-        if session_id not in self.last_keyframe_time:
-            self.last_keyframe_time[session_id] = timestamp
-            return 'plank_interval'
-        
-        time_diff = timestamp - self.last_keyframe_time[session_id]
-        if time_diff >= timedelta(seconds=10):
-            self.last_keyframe_time[session_id] = timestamp
-            print(f"🔍 [PLANK KEYFRAME] Session {session_id}: 10-second interval keyframe detected")
-            return 'plank_interval'
-        
-        return None
+    def _check_plank_keyframe(
+        self,
+        session_id: int,
+        landmarks: List[Dict],
+        timestamp: datetime
+    ) -> Optional[str]:
+        """Check if plank hold quality changed (good/sag/pike) and a keyframe should be saved"""
+        return self.plank_analyzer.update(session_id, landmarks or [], timestamp)
     
     def _check_motion_keyframe(
         self, 
@@ -203,14 +214,21 @@ class KeyframeDetector:
             return self.rep_counters[session_id]['total_reps']
         return 0
     
+    def get_plank_stats(self, session_id: int) -> Dict:
+        """Get current plank hold statistics for a session"""
+        with self._session_lock(session_id):
+            return self.plank_analyzer.get_stats(session_id)
+    
     def reset_session(self, session_id: int):
-        """Reset tracking state for a session"""
-        if session_id in self.motion_state:
-            del self.motion_state[session_id]
-        if session_id in self.last_keyframe_time:
-            del self.last_keyframe_time[session_id]
-        if session_id in self.rep_counters:
-            del self.rep_counters[session_id]
+        """Reset tracking state for a session, its lock included"""
+        with self._session_lock(session_id):
+            if session_id in self.motion_state:
+                del self.motion_state[session_id]
+            self.plank_analyzer.reset_session(session_id)
+            if session_id in self.rep_counters:
+                del self.rep_counters[session_id]
+            with self._locks_guard:
+                self.session_locks.pop(session_id, None)
 
 # Global instance
 keyframe_detector = KeyframeDetector()
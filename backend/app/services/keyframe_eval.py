@@ -0,0 +1,261 @@
+"""
+Offline evaluation harness for KeyframeDetector.
+
+Replays labelled landmark sequences through `should_save_keyframe` as fast as
+possible and reports rep count error, keyframe count and frames/sec per
+exercise. Sequences come from `exercise_angles.csv` (angles turned into 2D
+landmarks) or from recorded session files.
+
+Usage:
+    python -m app.services.keyframe_eval [--csv PATH] [--recording FILE ...]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.services.exercise_angles import CSV_EXERCISES, DEFAULT_CSV_PATH, DRIVING_ANGLE
+from app.services.keyframe_detector import KeyframeDetector
+
+# Frame interval of the frontend capture loop
+FRAME_INTERVAL = timedelta(milliseconds=100)
+
+
+@dataclass
+class LabelledSequence:
+    name: str
+    exercise: str
+    expected_reps: int
+    frames: List[List[Dict]]
+
+
+@dataclass
+class EvalResult:
+    name: str
+    exercise: str
+    frames: int
+    expected_reps: int
+    counted_reps: int
+    keyframes: int
+    keyframe_types: Dict[str, int] = field(default_factory=dict)
+    elapsed_sec: float = 0.0
+
+    @property
+    def rep_error(self) -> int:
+        return self.counted_reps - self.expected_reps
+
+    @property
+    def frames_per_sec(self) -> float:
+        return self.frames / self.elapsed_sec if self.elapsed_sec > 0 else float("inf")
+
+
+def _point(origin, length, angle_from_vertical_deg):
+    """Move `length` from `origin` at an angle from straight up (image coords, y down)"""
+    a = math.radians(angle_from_vertical_deg)
+    return (origin[0] + length * math.sin(a), origin[1] - length * math.cos(a))
+
+
+def _landmark_list(points: Dict[str, tuple]) -> List[Dict]:
+    return [{"name": name, "x": x, "y": y} for name, (x, y) in points.items()]
+
+
+def squat_landmarks(knee_angle: float, hip_angle: float) -> List[Dict]:
+    """Side-view squat pose from knee and hip angles (180 = straight)"""
+    knee_flex = 180.0 - knee_angle
+    ankle = (0.5, 0.9)
+    shank_lean = 0.4 * knee_flex
+    knee = _point(ankle, 0.2, shank_lean)
+    thigh = shank_lean - knee_flex
+    hip = _point(knee, 0.2, thigh)
+    shoulder = _point(hip, 0.3, thigh + (180.0 - hip_angle))
+    return _landmark_list({
+        "LEFT_ANKLE": ankle,
+        "LEFT_KNEE": knee,
+        "LEFT_HIP": hip,
+        "LEFT_SHOULDER": shoulder,
+    })
+
+
+def pushup_landmarks(elbow_angle: float, shoulder_angle: float) -> List[Dict]:
+    """Side-view push-up pose from elbow and shoulder angles (forearm vertical)"""
+    wrist = (0.3, 0.85)
+    elbow = _point(wrist, 0.15, 0.0)
+    upper_arm = 180.0 - elbow_angle
+    shoulder = _point(elbow, 0.15, upper_arm)
+    hip = _point(shoulder, 0.3, upper_arm + 90.0 - shoulder_angle)
+    return _landmark_list({
+        "LEFT_WRIST": wrist,
+        "LEFT_ELBOW": elbow,
+        "LEFT_SHOULDER": shoulder,
+        "LEFT_HIP": hip,
+    })
+
+
+POSE_BUILDERS: Dict[str, Callable[[Dict[str, float]], List[Dict]]] = {
+    "squat": lambda row: squat_landmarks(row["Knee_Angle"], row["Hip_Angle"]),
+    "pushup": lambda row: pushup_landmarks(row["Elbow_Angle"], row["Shoulder_Angle"]),
+}
+
+
+def count_cycles(values: List[float], low: float, high: float) -> int:
+    """Count low->high excursions with hysteresis (ground-truth reps)"""
+    reps = 0
+    went_low = False
+    for v in values:
+        if v <= low:
+            went_low = True
+        elif v >= high and went_low:
+            reps += 1
+            went_low = False
+    return reps
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def load_csv_sequences(
+    path: Path = DEFAULT_CSV_PATH,
+    chunk_size: int = 600,
+) -> List[LabelledSequence]:
+    """
+    Build labelled sequences from exercise_angles.csv.
+
+    Rows are consecutive video frames; each label is split into chunks of
+    `chunk_size` frames. Expected reps come from a hysteresis count on the
+    driving angle between its 20th and 80th percentile.
+    """
+    rows_by_exercise: Dict[str, List[Dict[str, float]]] = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            exercise = CSV_EXERCISES.get(row["Label"])
+            if exercise is None:
+                continue
+            rows_by_exercise.setdefault(exercise, []).append(
+                {k: float(v) for k, v in row.items() if k not in ("Side", "Label")}
+            )
+
+    sequences = []
+    for exercise, rows in rows_by_exercise.items():
+        angle = DRIVING_ANGLE[exercise]
+        ordered = sorted(r[angle] for r in rows)
+        low, high = _percentile(ordered, 0.2), _percentile(ordered, 0.8)
+        builder = POSE_BUILDERS[exercise]
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            sequences.append(LabelledSequence(
+                name=f"csv:{exercise}:{start}",
+                exercise=exercise,
+                expected_reps=count_cycles([r[angle] for r in chunk], low, high),
+                frames=[builder(r) for r in chunk],
+            ))
+    return sequences
+
+
+def load_recording(path: Path) -> LabelledSequence:
+    """
+    Load a recorded session file:
+    {"exercise": "squat", "expected_reps": 5, "frames": [[{"name", "x", "y"}, ...], ...]}
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return LabelledSequence(
+        name=f"recording:{Path(path).name}",
+        exercise=data["exercise"],
+        expected_reps=int(data["expected_reps"]),
+        frames=data["frames"],
+    )
+
+
+def evaluate_sequence(
+    sequence: LabelledSequence,
+    detector_factory: Callable[[], KeyframeDetector] = KeyframeDetector,
+    quiet: bool = True,
+) -> EvalResult:
+    """Replay one sequence through a fresh detector and score it"""
+    detector = detector_factory()
+    session_id = 1
+    start_ts = datetime(2024, 1, 1)
+    keyframe_types: Dict[str, int] = {}
+
+    sink = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        started = time.perf_counter()
+        for i, landmarks in enumerate(sequence.frames):
+            keyframe_type, _ = detector.should_save_keyframe(
+                session_id, sequence.exercise, landmarks, start_ts + i * FRAME_INTERVAL
+            )
+            if keyframe_type:
+                keyframe_types[keyframe_type] = keyframe_types.get(keyframe_type, 0) + 1
+            if quiet and sink.tell() > 1 << 20:
+                sink.seek(0)
+                sink.truncate()
+        elapsed = time.perf_counter() - started
+
+    return EvalResult(
+        name=sequence.name,
+        exercise=sequence.exercise,
+        frames=len(sequence.frames),
+        expected_reps=sequence.expected_reps,
+        counted_reps=detector.get_rep_count(session_id),
+        keyframes=sum(keyframe_types.values()),
+        keyframe_types=keyframe_types,
+        elapsed_sec=elapsed,
+    )
+
+
+def summarize(results: Iterable[EvalResult]) -> Dict[str, Dict[str, float]]:
+    """Aggregate results per exercise"""
+    summary: Dict[str, Dict[str, float]] = {}
+    for r in results:
+        s = summary.setdefault(r.exercise, {
+            "sequences": 0, "frames": 0, "expected_reps": 0, "counted_reps": 0,
+            "abs_rep_error": 0, "keyframes": 0, "elapsed_sec": 0.0,
+        })
+        s["sequences"] += 1
+        s["frames"] += r.frames
+        s["expected_reps"] += r.expected_reps
+        s["counted_reps"] += r.counted_reps
+        s["abs_rep_error"] += abs(r.rep_error)
+        s["keyframes"] += r.keyframes
+        s["elapsed_sec"] += r.elapsed_sec
+    for s in summary.values():
+        s["frames_per_sec"] = s["frames"] / s["elapsed_sec"] if s["elapsed_sec"] > 0 else float("inf")
+        s["mean_abs_rep_error"] = s["abs_rep_error"] / s["sequences"]
+    return summary
+
+
+def run(sequences: List[LabelledSequence], quiet: bool = True) -> Dict[str, Dict[str, float]]:
+    return summarize(evaluate_sequence(seq, quiet=quiet) for seq in sequences)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Evaluate KeyframeDetector accuracy and throughput")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV_PATH, help="exercise_angles.csv path")
+    parser.add_argument("--no-csv", action="store_true", help="skip CSV-derived sequences")
+    parser.add_argument("--chunk-size", type=int, default=600, help="frames per CSV sequence")
+    parser.add_argument("--recording", type=Path, action="append", default=[], help="recorded session JSON")
+    args = parser.parse_args(argv)
+
+    sequences = [] if args.no_csv else load_csv_sequences(args.csv, args.chunk_size)
+    sequences += [load_recording(p) for p in args.recording]
+
+    summary = run(sequences)
+    print(f"{'exercise':<10} {'seqs':>5} {'frames':>8} {'expected':>9} {'counted':>8} "
+          f"{'mae':>6} {'keyframes':>10} {'frames/s':>10}")
+    for exercise, s in sorted(summary.items()):
+        print(f"{exercise:<10} {s['sequences']:>5} {s['frames']:>8} {s['expected_reps']:>9} "
+              f"{s['counted_reps']:>8} {s['mean_abs_rep_error']:>6.2f} {s['keyframes']:>10} "
+              f"{s['frames_per_sec']:>10.0f}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Pick the few keyframes worth sending to the analyzer.
+
+Instead of the first frames in time (usually warm-up), the selector
+scores every keyframe from its landmarks and takes, in order:
+
+1. the deepest bottom (smallest driving joint angle; for planks the
+   largest body line deviation),
+2. a representative top (driving angle closest to the median top),
+3. the frames with the most form flags,
+4. the deepest frame of reps spread across the session,
+5. frames evenly spaced in time, if slots remain.
+
+Only landmarks are read, so it runs on rows loaded without their images.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from app.db.models import AnnotatedFrame
+from app.services.form_flags import frame_flags, joint_angles, landmarks_to_array
+from app.services.keyframe_storage import keyframe_landmarks
+from app.services.plank_analyzer import body_line_deviation
+from app.services.prompt_budget import evenly_spaced
+
+# Frames picked for bad form, at most
+WORST_FORM_FRAMES = 2
+
+
+@dataclass
+class KeyframeFeatures:
+    keyframe: AnnotatedFrame
+    rep: int  # Reps completed before this keyframe (a rep ends at its top)
+    angle: float  # Driving joint angle in degrees, or body line deviation for planks; NaN if unknown
+    flags: List[str] = field(default_factory=list)
+    angles: Optional[np.ndarray] = None  # form_flags.joint_angles (ANGLE_NAMES order); None without landmarks
+
+
+@dataclass
+class SelectedKeyframe:
+    keyframe: AnnotatedFrame
+    reason: str
+    features: KeyframeFeatures
+
+
+def _driving_angle(exercise: str, landmarks: List[Dict], result: Dict) -> float:
+    if exercise == 'plank':
+        deviation = body_line_deviation(landmarks)
+        return abs(deviation) if deviation is not None else float('nan')
+    return result['elbow'] if exercise == 'pushup' else result['knee']
+
+
+def keyframe_features(keyframes: List[AnnotatedFrame], exercise: str) -> List[KeyframeFeatures]:
+    """Features of keyframes in time order"""
+    features = []
+    rep = 0
+    for keyframe in sorted(keyframes, key=lambda k: k.timestamp):
+        landmarks = keyframe_landmarks(keyframe)
+        result = frame_flags(exercise, landmarks) if landmarks else {'flags': [], 'knee': np.nan, 'elbow': np.nan}
+        features.append(KeyframeFeatures(
+            keyframe, rep, _driving_angle(exercise, landmarks, result), result['flags'],
+            joint_angles(landmarks_to_array(landmarks)) if landmarks else None,
+        ))
+        if keyframe.keyframe_type == 'top':
+            rep += 1
+    return features
+
+
+def select_keyframes(keyframes: List[AnnotatedFrame], exercise: str, count: int) -> List[SelectedKeyframe]:
+    """Up to `count` informative, mutually distinct keyframes, returned in time order"""
+    features = keyframe_features(keyframes, exercise)
+    chosen: Dict[int, SelectedKeyframe] = {}
+
+    def take(feature: Optional[KeyframeFeatures], reason: str):
+        if feature is not None and len(chosen) < count and feature.keyframe.id not in chosen:
+            chosen[feature.keyframe.id] = SelectedKeyframe(feature.keyframe, reason, feature)
+
+    def deepest(candidates: List[KeyframeFeatures]) -> Optional[KeyframeFeatures]:
+        measured = [f for f in candidates if not np.isnan(f.angle)]
+        if not measured:
+            return None
+        # Planks hold a position: the worst body line deviation is the most telling
+        return max(measured, key=lambda f: f.angle) if exercise == 'plank' else min(measured, key=lambda f: f.angle)
+
+    if exercise == 'plank':
+        take(deepest(features), 'largest body line deviation')
+    else:
+        bottoms = [f for f in features if f.keyframe.keyframe_type == 'bottom']
+        take(deepest(bottoms or features), 'deepest bottom position')
+
+    tops = [f for f in features if f.keyframe.keyframe_type == 'top' and not np.isnan(f.angle)]
+    if tops:
+        median = float(np.median([f.angle for f in tops]))
+        take(min(tops, key=lambda f: abs(f.angle - median)), 'representative top position')
+
+    flagged = sorted((f for f in features if f.flags), key=lambda f: -len(f.flags))
+    for feature in flagged[:WORST_FORM_FRAMES]:
+        take(feature, f"form issues: {', '.join(feature.flags)}")
+
+    reps = sorted({f.rep for f in features})
+    for i in evenly_spaced(count - len(chosen), len(reps)):
+        rep = reps[i]
+        take(deepest([f for f in features if f.rep == rep]), f"deepest point of rep {rep + 1}")
+
+    remaining = [f for f in features if f.keyframe.id not in chosen]
+    for i in evenly_spaced(count - len(chosen), len(remaining)):
+        take(remaining[i], 'spread across the session')
+
+    return sorted(chosen.values(), key=lambda s: s.keyframe.timestamp)
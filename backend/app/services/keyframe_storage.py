@@ -0,0 +1,193 @@
+"""
+Binary encoding of keyframe images and landmarks.
+
+Images are stored as raw JPEG bytes (blob store or LargeBinary column) and
+landmarks as a packed array indexed by MediaPipe pose landmark id. Base64
+and JSON only appear at the API edge.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.core.config import settings
+from app.db.models import AnnotatedFrame
+from app.services import blob_store as blob_store_module
+
+# MediaPipe pose landmark names, in landmark id order
+POSE_LANDMARK_NAMES = [
+    'NOSE', 'LEFT_EYE_INNER', 'LEFT_EYE', 'LEFT_EYE_OUTER', 'RIGHT_EYE_INNER', 'RIGHT_EYE',
+    'RIGHT_EYE_OUTER', 'LEFT_EAR', 'RIGHT_EAR', 'MOUTH_LEFT', 'MOUTH_RIGHT',
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW', 'LEFT_WRIST', 'RIGHT_WRIST',
+    'LEFT_PINKY', 'RIGHT_PINKY', 'LEFT_INDEX', 'RIGHT_INDEX', 'LEFT_THUMB', 'RIGHT_THUMB',
+    'LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE',
+    'LEFT_HEEL', 'RIGHT_HEEL', 'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX',
+]
+_NAME_TO_ID = {name: i for i, name in enumerate(POSE_LANDMARK_NAMES)}
+
+# First byte of a packed landmark blob identifies its dtype
+_DTYPES = {1: np.float32, 2: np.float16}
+_DTYPE_CODES = {np.dtype(v): k for k, v in _DTYPES.items()}
+
+
+def _landmark_id(name) -> Optional[int]:
+    """Accept landmark names ('LEFT_HIP') or MediaPipe enum/int ids"""
+    if isinstance(name, str):
+        return _NAME_TO_ID.get(name)
+    try:
+        i = int(name)
+    except (TypeError, ValueError):
+        return None
+    return i if 0 <= i < len(POSE_LANDMARK_NAMES) else None
+
+
+def pack_landmarks(landmarks: List[Dict], dtype=np.float32) -> Optional[bytes]:
+    """Pack [{'name', 'x', 'y'}] into a dtype-tagged (33, 2) array; None if empty"""
+    if not landmarks:
+        return None
+    points = np.full((len(POSE_LANDMARK_NAMES), 2), np.nan, dtype=dtype)
+    for landmark in landmarks:
+        i = _landmark_id(landmark.get('name'))
+        if i is not None:
+            points[i] = (landmark.get('x', np.nan), landmark.get('y', np.nan))
+    return bytes([_DTYPE_CODES[np.dtype(dtype)]]) + points.tobytes()
+
+
+def unpack_landmarks_array(blob: bytes) -> np.ndarray:
+    dtype = _DTYPES[blob[0]]
+    return np.frombuffer(blob, dtype=dtype, offset=1).reshape(len(POSE_LANDMARK_NAMES), 2)
+
+
+def unpack_landmarks(blob: Optional[bytes]) -> List[Dict]:
+    """Inverse of pack_landmarks; missing landmarks are omitted"""
+    if not blob:
+        return []
+    points = unpack_landmarks_array(blob)
+    return [
+        {'name': POSE_LANDMARK_NAMES[i], 'x': float(x), 'y': float(y)}
+        for i, (x, y) in enumerate(points)
+        if not (math.isnan(x) or math.isnan(y))
+    ]
+
+
+def keyframe_landmarks(keyframe: AnnotatedFrame) -> List[Dict]:
+    """Landmarks of a keyframe from the packed column, or legacy JSON"""
+    if keyframe.landmarks_packed:
+        return unpack_landmarks(keyframe.landmarks_packed)
+    try:
+        landmarks = json.loads(keyframe.pose_landmarks) if keyframe.pose_landmarks else []
+    except ValueError:
+        return []
+    # Legacy rows may carry MediaPipe ids as names
+    for landmark in landmarks:
+        i = _landmark_id(landmark.get('name'))
+        if i is not None and not isinstance(landmark.get('name'), str):
+            landmark['name'] = POSE_LANDMARK_NAMES[i]
+    return landmarks
+
+
+def decode_b64_image(frame_b64: str) -> Optional[bytes]:
+    """Raw bytes of a base64 (optionally data URL) image; None if not valid base64"""
+    if frame_b64.startswith('data:image'):
+        frame_b64 = frame_b64.split(',', 1)[1]
+    try:
+        return base64.b64decode(frame_b64, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def store_image(data: bytes) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Store JPEG bytes per KEYFRAME_IMAGE_STORAGE.
+    Returns (frame_ref, frame_bytes) for the AnnotatedFrame row.
+    """
+    if settings.KEYFRAME_IMAGE_STORAGE == "db":
+        return None, data
+    return blob_store_module.blob_store.put(data), None
+
+
+def image_fields(image: bytes | str) -> Dict:
+    """AnnotatedFrame image columns for raw JPEG bytes or a base64 payload"""
+    if isinstance(image, str):
+        data = decode_b64_image(image)
+        if data is None:
+            return {'frame_data': image}  # Not base64: keep as given
+    else:
+        data = image
+    frame_ref, frame_bytes = store_image(data)
+    return {'frame_ref': frame_ref, 'frame_bytes': frame_bytes, 'frame_data': ""}
+
+
+def load_frame_bytes(keyframe: AnnotatedFrame) -> Optional[bytes]:
+    """Raw image bytes of a keyframe wherever it is stored"""
+    if keyframe.frame_ref:
+        return blob_store_module.blob_store.read(keyframe.frame_ref)
+    if keyframe.frame_bytes:
+        return bytes(keyframe.frame_bytes)
+    if keyframe.frame_data:
+        return decode_b64_image(keyframe.frame_data)
+    return None
+
+
+def blob_path(keyframe: AnnotatedFrame) -> Optional[Path]:
+    """File holding a blob-stored keyframe image (None for images stored in the row)"""
+    if keyframe.frame_ref:
+        return blob_store_module.blob_store.path_for(keyframe.frame_ref)
+    return None
+
+
+def image_etag(keyframe: AnnotatedFrame) -> Optional[str]:
+    """Strong ETag of a keyframe image: its content hash"""
+    if keyframe.frame_ref:
+        return keyframe.frame_ref  # Already the SHA-256 of the bytes
+    data = load_frame_bytes(keyframe)
+    return hashlib.sha256(data).hexdigest() if data else None
+
+
+_thumb_cache: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+_thumb_cache_lock = threading.Lock()
+THUMB_CACHE_SIZE = 256
+
+
+def make_thumbnail(jpeg: bytes, max_side: int) -> bytes:
+    """Downscale a JPEG so its longest side is at most max_side"""
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Keyframe image is not a decodable JPEG")
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ok:
+        raise ValueError("Failed to encode thumbnail")
+    return encoded.tobytes()
+
+
+def thumbnail_for(digest: str, jpeg: bytes, max_side: int) -> bytes:
+    """make_thumbnail with a small LRU keyed by the source image hash"""
+    key = (digest, max_side)
+    with _thumb_cache_lock:
+        if key in _thumb_cache:
+            _thumb_cache.move_to_end(key)
+            return _thumb_cache[key]
+    thumb = make_thumbnail(jpeg, max_side)
+    with _thumb_cache_lock:
+        _thumb_cache[key] = thumb
+        if len(_thumb_cache) > THUMB_CACHE_SIZE:
+            _thumb_cache.popitem(last=False)
+    return thumb
+
+
+def load_frame_b64(keyframe: AnnotatedFrame) -> str:
+    """Base64 image of a keyframe, for clients and prompts that need text"""
+    if not keyframe.frame_ref and not keyframe.frame_bytes:
+        return keyframe.frame_data
+    return base64.b64encode(load_frame_bytes(keyframe)).decode('utf-8')
@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlmodel import Session as SQLSession
+from app.core.config import settings
+from app.db.models import AnnotatedFrame
+from app.services.keyframe_storage import image_fields, pack_landmarks
+
+
+class KeyframeWriter:
+    """
+    Write-behind persistence for detected keyframes.
+
+    The frame route queues keyframes and returns immediately; a background
+    thread stores the images and inserts the rows of every session in one
+    transaction once `max_batch` rows are queued or `flush_interval_ms` has
+    passed since the oldest one. flush() blocks until a session's queued
+    keyframes are committed (session stop, cleanup) and stop() drains the
+    queue at shutdown.
+    """
+
+    def __init__(self, engine=None, flush_interval_ms: int = 250, max_batch: int = 64):
+        self._engine = engine
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: List[Dict] = []
+        self._oldest = 0.0  # monotonic time the oldest queued keyframe arrived
+        self._pending = defaultdict(int)  # session_id -> keyframes queued or being written
+        self._flush_requested = False
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'written': 0, 'failed': 0, 'batches': 0}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="keyframe-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, session_id: int, exercise: str, keyframe_type: str, timestamp: Optional[datetime],
+               landmarks: Optional[Dict], annotated_jpeg: bytes):
+        """Queue a keyframe for the next batch"""
+        item = {
+            'session_id': session_id,
+            'exercise': exercise,
+            'keyframe_type': keyframe_type,
+            'timestamp': timestamp or datetime.now(),
+            'landmarks': landmarks or {},
+            'annotated_jpeg': annotated_jpeg,
+        }
+        with self._cond:
+            self._ensure_thread()
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.append(item)
+            self._pending[session_id] += 1
+            self._cond.notify_all()
+
+    def pending(self, session_id: Optional[int] = None) -> int:
+        with self._cond:
+            return self._pending_count(session_id)
+
+    def _pending_count(self, session_id: Optional[int]) -> int:
+        if session_id is None:
+            return sum(self._pending.values())
+        return self._pending.get(session_id, 0)
+
+    def flush(self, session_id: Optional[int] = None, timeout: float = 10.0) -> bool:
+        """
+        Write queued keyframes now and wait until those of `session_id`
+        (or all sessions) are committed. Returns False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending_count(session_id):
+                self._ensure_thread()
+                self._flush_requested = True
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ [KEYFRAME WRITER] Flush timed out with {self._pending_count(session_id)} keyframes pending")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Drain the queue and stop the writer thread (app shutdown)"""
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        print(f"🔍 [KEYFRAME WRITER] Stopped: {self.stats}")
+
+    def _next_batch(self) -> Optional[List[Dict]]:
+        """Wait until a batch is due; None once stopping with nothing queued"""
+        with self._cond:
+            while True:
+                if self._queue:
+                    due = self._oldest + self.flush_interval
+                    if (self._flush_requested or self._stopping or len(self._queue) >= self.max_batch
+                            or time.monotonic() >= due):
+                        batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                        self._oldest = time.monotonic()
+                        if not self._queue:
+                            self._flush_requested = False
+                        return batch
+                    self._cond.wait(due - time.monotonic())
+                elif self._stopping:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    for item in batch:
+                        self._pending[item['session_id']] -= 1
+                        if self._pending[item['session_id']] <= 0:
+                            del self._pending[item['session_id']]
+                    self._cond.notify_all()
+
+    def _to_row(self, item: Dict) -> AnnotatedFrame:
+        # JPEG bytes go to the blob store (or a binary column); landmarks are packed
+        return AnnotatedFrame(
+            session_id=item['session_id'],
+            keyframe_type=item['keyframe_type'],
+            timestamp=item['timestamp'],
+            exercise=item['exercise'],
+            landmarks_packed=pack_landmarks([
+                {"name": name, "x": coords[0], "y": coords[1]}
+                for name, coords in item['landmarks'].items()
+            ]),
+            **image_fields(item['annotated_jpeg'])
+        )
+
+    def _write(self, batch: List[Dict]):
+        """Insert a batch in one transaction; on failure retry row by row so one bad keyframe is dropped alone"""
+        try:
+            with SQLSession(self.engine) as db:
+                db.add_all([self._to_row(item) for item in batch])
+                db.commit()
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+            print(f"💾 [KEYFRAME WRITER] Committed {len(batch)} keyframes")
+            return
+        except Exception as e:
+            print(f"❌ [KEYFRAME WRITER] Batch of {len(batch)} failed, retrying individually: {e}")
+
+        for item in batch:
+            try:
+                with SQLSession(self.engine) as db:
+                    db.add(self._to_row(item))
+                    db.commit()
+                self.stats['written'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"❌ [KEYFRAME WRITER] Session {item['session_id']}: Dropping {item['keyframe_type']} keyframe - {e}")
+
+
+# Global instance
+keyframe_writer = KeyframeWriter(
+    flush_interval_ms=settings.KEYFRAME_FLUSH_INTERVAL_MS,
+    max_batch=settings.KEYFRAME_FLUSH_MAX_ROWS,
+)
@@ -0,0 +1,243 @@
+"""
+Shared client for Gemini calls (tips and posture analysis).
+
+One genai.Client is created lazily and reused, so its HTTP connections are
+pooled across requests. Every call gets a deadline: each attempt's HTTP
+timeout is whatever is left of it, and transient failures (timeouts,
+connection errors, 429 and 5xx) are retried with full-jitter exponential
+backoff while time remains.
+
+Two guards keep a slow or failing upstream from holding our worker threads:
+
+* at most `max_concurrency` calls are in flight; extra callers are refused
+  at once rather than queued,
+* a circuit breaker opens after `breaker_failures` consecutive failed calls
+  and refuses calls for `breaker_reset_sec`, then lets one probe through.
+
+Refused calls raise LLMUnavailableError so callers can use their fallback
+(rule_based_tips, generic suggestions) immediately.
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+from app.core.config import settings
+
+try:
+    import httpx
+    from google import genai
+    from google.genai import errors as genai_errors, types as genai_types
+except Exception:
+    genai = None
+
+# HTTP status codes worth retrying
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMUnavailableError(LLMError):
+    """Not configured, circuit open, or too many calls in flight"""
+
+
+def is_transient(error: Exception) -> bool:
+    if genai is None:
+        return False
+    if isinstance(error, genai_errors.APIError):
+        return error.code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe) -> closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_sec: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._clock() - self._opened_at >= self.reset_sec else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.reset_sec or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def cancel(self):
+        """The caller gave up on a call without learning anything about upstream"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                print(f"⚠️ [LLM] Circuit open after {self._failures} consecutive failures")
+                self._opened_at = self._clock()
+            self._probing = False
+
+
+class LLMClient:
+    """Deadline-bounded, retrying, circuit-broken generate_content"""
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-2.0-flash", timeout_sec: float = 20.0,
+                 max_retries: int = 2, backoff_base_sec: float = 0.5, backoff_max_sec: float = 4.0,
+                 breaker_failures: int = 5, breaker_reset_sec: float = 30.0, max_concurrency: int = 4,
+                 client_factory: Optional[Callable[[], Any]] = None):
+        self.api_key = api_key
+        self.model = model
+        self.timeout_sec = timeout_sec
+        self.max_retries = max_retries
+        self.backoff_base_sec = backoff_base_sec
+        self.backoff_max_sec = backoff_max_sec
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_sec)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return self._client_factory is not None or (bool(self.api_key) and genai is not None)
+
+    def client(self):
+        """The shared genai.Client (created on first use)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if not self.configured:
+                        raise LLMUnavailableError("GEMINI_API_KEY not configured")
+                    self._client = (self._client_factory or (lambda: genai.Client(api_key=self.api_key)))()
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max_sec, self.backoff_base_sec * 2 ** attempt))
+
+    def _call(self, contents, model: str, timeout_sec: float):
+        config = None
+        if genai is not None:
+            config = genai_types.GenerateContentConfig(
+                http_options=genai_types.HttpOptions(timeout=max(1, int(timeout_sec * 1000)))
+            )
+        return self.client().models.generate_content(model=model, contents=contents, config=config)
+
+    def _call_stream(self, contents, model: str, timeout_sec: float):
+        config = None
+        if genai is not None:
+            config = genai_types.GenerateContentConfig(
+                http_options=genai_types.HttpOptions(timeout=max(1, int(timeout_sec * 1000)))
+            )
+        return self.client().models.generate_content_stream(model=model, contents=contents, config=config)
+
+    def _acquire(self):
+        if not self.configured:
+            raise LLMUnavailableError("GEMINI_API_KEY not configured")
+        if not self._slots.acquire(blocking=False):
+            raise LLMUnavailableError("Too many LLM calls in flight")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise LLMUnavailableError("Circuit open: upstream failing")
+
+    def generate(self, contents, model: Optional[str] = None, timeout_sec: Optional[float] = None) -> str:
+        """
+        Response text for `contents`. Retries transient errors until the
+        deadline (`timeout_sec`, default self.timeout_sec) passes.
+        Raises LLMUnavailableError without calling upstream when refused,
+        LLMError once retries or time run out.
+        """
+        self._acquire()
+        model = model or self.model
+        deadline = time.monotonic() + (timeout_sec or self.timeout_sec)
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    response = self._call(contents, model, remaining)
+                    self.breaker.record_success()
+                    return (getattr(response, "text", None) or "").strip()
+                except Exception as e:
+                    delay = self._backoff(attempt)
+                    if not is_transient(e) or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        self.breaker.record_failure()
+                        print(f"❌ [LLM] {model} failed after {attempt + 1} attempt(s): {e}")
+                        raise LLMError(str(e)) from e
+                    print(f"⚠️ [LLM] {model} attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            self._slots.release()
+
+    def generate_stream(self, contents, model: Optional[str] = None,
+                        timeout_sec: Optional[float] = None) -> Iterator[str]:
+        """
+        Response text chunks as the model produces them. Like generate(),
+        but a failure after the first chunk is raised rather than retried.
+        """
+        self._acquire()
+        model = model or self.model
+        deadline = time.monotonic() + (timeout_sec or self.timeout_sec)
+        finished = False
+        try:
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    for chunk in self._call_stream(contents, model, deadline - time.monotonic()):
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            started = True
+                            yield text
+                    self.breaker.record_success()
+                    finished = True
+                    return
+                except Exception as e:
+                    delay = self._backoff(attempt)
+                    if (started or not is_transient(e) or attempt >= self.max_retries
+                            or time.monotonic() + delay >= deadline):
+                        self.breaker.record_failure()
+                        finished = True
+                        print(f"❌ [LLM] {model} stream failed after {attempt + 1} attempt(s): {e}")
+                        raise LLMError(str(e)) from e
+                    print(f"⚠️ [LLM] {model} stream attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            if not finished:
+                # The consumer stopped reading (client disconnected)
+                self.breaker.cancel()
+            self._slots.release()
+
+
+# Global instance
+llm_client = LLMClient(
+    api_key=settings.GEMINI_API_KEY,
+    timeout_sec=settings.LLM_TIMEOUT_SEC,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base_sec=settings.LLM_BACKOFF_BASE_SEC,
+    backoff_max_sec=settings.LLM_BACKOFF_MAX_SEC,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_reset_sec=settings.LLM_BREAKER_RESET_SEC,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+)
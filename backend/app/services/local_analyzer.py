@@ -0,0 +1,298 @@
+"""
+Deterministic posture analysis from stored landmarks.
+
+LocalPostureAnalyzer produces the same suggestions schema as the Gemini
+analyzer in milliseconds, without images or network calls. Per keyframe it
+takes the joint angles and form flags (form_flags vocabulary), groups them
+into reps and compares depth, lockout and hip angle with reference ranges
+taken from exercise_angles.csv (percentiles of the labelled frames). Tips
+come from rule_based_tips.
+
+It is the "local" analysis provider, the fallback when Gemini fails, and
+the fast half of HedgedPostureAnalyzer ("hedged" provider), which returns
+the local result when the LLM misses its latency budget; the LLM answer
+still lands in the analysis cache for the next request.
+"""
+import csv
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sqlmodel import Session as SQLSession
+from app.core.config import settings
+from app.db.models import AnnotatedFrame
+from app.db.session_data import count_keyframes, sample_keyframes
+from app.services.exercise_angles import CSV_EXERCISES, DEFAULT_CSV_PATH, DRIVING_ANGLE
+from app.services.form_flags import ANGLE_NAMES
+from app.services.keyframe_selector import KeyframeFeatures, keyframe_features
+from app.services.tips import FLAG_TIPS, rule_based_tips
+
+# Driving angle of each exercise in form_flags.ANGLE_NAMES, and how the UI names it
+ANGLE_COLUMNS = {"Knee_Angle": ("knee", "knee angle"), "Elbow_Angle": ("elbow", "elbow angle")}
+
+# Reps whose depth varies more than this (std, degrees) are inconsistent
+DEPTH_SPREAD_MAX = 15.0
+
+# Flags raised in at least this share of keyframes (or reps) are reported, with their priority
+PRIORITY_RATIOS = [(0.5, "High"), (0.25, "Medium"), (0.1, "Low")]
+
+ISSUES = {
+    "shallow_depth": ("Range of Motion", "Reps stopped short of the reference depth"),
+    "short_range": ("Range of Motion", "Reps stopped short of the reference range"),
+    "knees_in": ("Posture/Form", "Knees caving inward during the descent"),
+    "back_round": ("Posture/Form", "Excessive forward lean or rounding at the bottom"),
+    "hip_sag": ("Posture/Form", "Hips sagging out of the shoulder-ankle line"),
+    "lockout": ("Range of Motion", "Incomplete lockout at the top"),
+}
+LOCKOUT_TIP = "Finish every rep by fully extending at the top before starting the next."
+# Issues measured per rep rather than per keyframe
+REP_ISSUES = {"shallow_depth", "short_range", "lockout"}
+
+# Strengths reported when an exercise's per-frame flag never appears
+CLEAN_FORM_STRENGTHS = {
+    "squat": {"knees_in": "Knees tracked in line with the toes", "back_round": "Chest stayed up through the bottom"},
+    "lunges": {"back_round": "Torso stayed upright"},
+    "pushup": {"hip_sag": "Body held a straight line from shoulders to ankles"},
+    "plank": {"hip_sag": "Hips held in line with shoulders and ankles"},
+}
+
+
+@dataclass
+class ReferenceRanges:
+    """Degrees; percentiles of the labelled frames of one exercise"""
+    bottom: Tuple[float, float]  # Driving angle, p5-p25
+    top: Tuple[float, float]  # Driving angle, p75-p95
+    bottom_hip: Tuple[float, float]  # Hip angle of frames in the bottom range, p10-p90
+
+
+# Used when exercise_angles.csv is not deployed (values computed from it)
+DEFAULT_REFERENCES = {
+    "squat": ReferenceRanges(bottom=(25.3, 83.8), top=(176.6, 179.6), bottom_hip=(26.0, 80.9)),
+    "pushup": ReferenceRanges(bottom=(38.6, 83.2), top=(168.7, 178.1), bottom_hip=(31.9, 177.8)),
+}
+
+# The labelled push-up hip angles are too noisy to judge hips by; hip_sag flags cover them
+HIP_CHECK_EXERCISES = {"squat"}
+
+
+@lru_cache(maxsize=None)
+def reference_ranges(path: Path = DEFAULT_CSV_PATH) -> Dict[str, ReferenceRanges]:
+    """Reference ranges per exercise from exercise_angles.csv (read once)"""
+    try:
+        columns: Dict[str, Dict[str, List[float]]] = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                exercise = CSV_EXERCISES.get(row["Label"])
+                if exercise is None:
+                    continue
+                data = columns.setdefault(exercise, {"driving": [], "hip": []})
+                data["driving"].append(float(row[DRIVING_ANGLE[exercise]]))
+                data["hip"].append(float(row["Hip_Angle"]))
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠️ [LOCAL ANALYZER] Using built-in reference ranges ({e})")
+        return dict(DEFAULT_REFERENCES)
+
+    references = dict(DEFAULT_REFERENCES)
+    for exercise, data in columns.items():
+        driving, hip = np.array(data["driving"]), np.array(data["hip"])
+        p5, p25, p75, p95 = np.percentile(driving, [5, 25, 75, 95])
+        hip_lo, hip_hi = np.percentile(hip[driving <= p25], [10, 90])
+        references[exercise] = ReferenceRanges((float(p5), float(p25)), (float(p75), float(p95)),
+                                               (float(hip_lo), float(hip_hi)))
+    return references
+
+
+def _min_angle(feature: KeyframeFeatures, name: str) -> float:
+    """Smaller of the left/right joint angle, NaN if neither is known"""
+    if feature.angles is None:
+        return float("nan")
+    values = feature.angles[[ANGLE_NAMES.index(f"left_{name}"), ANGLE_NAMES.index(f"right_{name}")]]
+    values = values[~np.isnan(values)]
+    return float(values.min()) if values.size else float("nan")
+
+
+def _priority(ratio: float) -> Optional[str]:
+    for threshold, priority in PRIORITY_RATIOS:
+        if ratio >= threshold:
+            return priority
+    return None
+
+
+def local_suggestions(keyframes: List[AnnotatedFrame], exercise: str) -> Dict:
+    """PostureAnalysis-shaped suggestions from keyframe landmarks (no images needed)"""
+    exercise = exercise.lower()
+    features = [f for f in keyframe_features(keyframes, exercise) if f.angles is not None]
+    if not features:
+        return {
+            "overall_assessment": f"No pose landmarks were stored for this {exercise} session, so form could not be measured.",
+            "strengths": ["Session completed successfully"],
+            "areas_for_improvement": ["Ensure camera visibility"],
+            "specific_suggestions": [{
+                "category": "Technical",
+                "issue": "No pose data captured",
+                "suggestion": "Make sure you are fully visible in the camera frame and well-lit during your workout",
+                "priority": "High",
+            }],
+            "exercise_specific_tips": rule_based_tips(exercise, [], "beginner"),
+            "next_session_focus": "Ensure proper camera positioning and lighting",
+        }
+
+    # Share of keyframes (or reps) showing each issue
+    ratios: Dict[str, float] = {}
+    for flag in {flag for f in features for flag in f.flags}:
+        ratios[flag] = sum(flag in f.flags for f in features) / len(features)
+    strengths: List[str] = []
+    summary: List[str] = []
+
+    reference = reference_ranges().get(exercise)
+    column = DRIVING_ANGLE.get(exercise)
+    if reference is not None and column in ANGLE_COLUMNS:
+        joint, label = ANGLE_COLUMNS[column]
+        # The detector stores a keyframe only when the phase changes: its
+        # "bottom" and "top" are the frames where the threshold was crossed,
+        # not the extremes, and nothing is stored while the lifter stands.
+        # A rep is a stretch between tops that went down (the first keyframe
+        # is the detector's initial "middle"); it reached depth if the detector
+        # saw a bottom or its deepest stored frame is in the reference range,
+        # and it was finished if it came back up to a top.
+        reps: Dict[int, List[KeyframeFeatures]] = {}
+        for f in features:
+            reps.setdefault(f.rep, []).append(f)
+        depths, deep_enough, finished = [], 0, 0
+        for group in reps.values():
+            types = {f.keyframe.keyframe_type for f in group if f is not features[0]}
+            if not types & {"bottom", "middle"}:
+                continue
+            angles = [_min_angle(f, joint) for f in group]
+            angles = [angle for angle in angles if not np.isnan(angle)]
+            if not angles:
+                continue
+            depths.append(min(angles))
+            deep_enough += "bottom" in types or min(angles) <= reference.bottom[1]
+            finished += "top" in types
+        depths = np.array(depths)
+        if depths.size:
+            summary.append(
+                f"{deep_enough} of {depths.size} reps reached the reference depth "
+                f"({label} {reference.bottom[0]:.0f}-{reference.bottom[1]:.0f}°; your deepest was {depths.min():.0f}°, "
+                f"average {depths.mean():.0f}°)."
+            )
+            range_flag = "short_range" if exercise == "pushup" else "shallow_depth"
+            if deep_enough == depths.size:
+                strengths.append("Every rep reached the reference depth")
+                ratios.pop(range_flag, None)
+            else:
+                ratios[range_flag] = max(ratios.get(range_flag, 0.0), 1 - deep_enough / depths.size)
+            if depths.size > 1 and depths.std() <= DEPTH_SPREAD_MAX:
+                strengths.append(f"Consistent depth across reps (±{depths.std():.0f}°)")
+            if finished == depths.size:
+                strengths.append("Came back up to the top after every rep")
+            else:
+                ratios["lockout"] = 1 - finished / depths.size
+
+        if exercise in HIP_CHECK_EXERCISES:
+            bottoms = [_min_angle(f, "hip") for f in features if _min_angle(f, joint) <= reference.bottom[1]]
+            bottoms = [angle for angle in bottoms if not np.isnan(angle)]
+            if bottoms:
+                folded = sum(angle < reference.bottom_hip[0] for angle in bottoms) / len(bottoms)
+                ratios["back_round"] = max(ratios.get("back_round", 0.0), folded)
+
+    if exercise == "plank":
+        deviations = [f.angle for f in features if not np.isnan(f.angle)]
+        if deviations:
+            summary.append(f"Average body line deviation was {np.mean(deviations):.0f}° over {len(deviations)} keyframes.")
+
+    issues = sorted(
+        ((flag, ratio, _priority(ratio)) for flag, ratio in ratios.items() if _priority(ratio)),
+        key=lambda issue: -issue[1]
+    )
+    for flag, strength in CLEAN_FORM_STRENGTHS.get(exercise, {}).items():
+        if flag not in ratios:
+            strengths.append(strength)
+
+    specific = []
+    for flag, ratio, priority in issues:
+        category, title = ISSUES.get(flag, ("Posture/Form", flag.replace("_", " ")))
+        specific.append({
+            "category": category,
+            "issue": f"{title} ({ratio:.0%} of {'reps' if flag in REP_ISSUES else 'keyframes'})",
+            "suggestion": FLAG_TIPS.get(flag, LOCKOUT_TIP),
+            "priority": priority,
+        })
+    flags = [flag for flag, _, _ in issues]
+    overall = " ".join([f"Measured {len(features)} keyframes of your {exercise}."] + summary)
+    if not issues:
+        overall += " No form issues stood out."
+
+    return {
+        "overall_assessment": overall,
+        "strengths": strengths[:3] or ["Completed workout session"],
+        "areas_for_improvement": [suggestion["issue"] for suggestion in specific[:3]],
+        "specific_suggestions": specific,
+        "exercise_specific_tips": rule_based_tips(exercise, flags, "beginner"),
+        "next_session_focus": specific[0]["suggestion"] if specific else "Keep the same depth and control while adding reps",
+    }
+
+
+class LocalPostureAnalyzer:
+    """Analysis provider with the GeminiPostureAnalyzer interface, computed locally"""
+
+    def analyze_session_posture(self, session_id: int, exercise: str, db: SQLSession) -> Dict:
+        keyframes = list(sample_keyframes(db, session_id, settings.ANALYSIS_MAX_CANDIDATES))
+        return {
+            "status": "success",
+            "session_id": session_id,
+            "exercise": exercise,
+            "total_keyframes": count_keyframes(db, session_id),
+            "analyzed_keyframes": len(keyframes),
+            "suggestions": local_suggestions(keyframes, exercise),
+            "analysis_timestamp": datetime.now().isoformat(),
+        }
+
+
+class HedgedPostureAnalyzer:
+    """
+    Local analysis first, then the primary (LLM) analyzer within `budget_sec`.
+    Returns the primary's result if it is in time, else the local one; a
+    late primary call keeps running so its result is cached for next time.
+    """
+
+    def __init__(self, primary_factory: Callable, budget_sec: float, workers: int = 2):
+        self._primary_factory = primary_factory
+        self.budget_sec = budget_sec
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="analysis-hedge")
+        self.local = LocalPostureAnalyzer()
+
+    def _primary(self, session_id: int, exercise: str, engine) -> Dict:
+        # Sessions are not thread-safe; the primary gets its own
+        with SQLSession(engine) as db:
+            return self._primary_factory().analyze_session_posture(session_id, exercise, db)
+
+    def analyze_session_posture(self, session_id: int, exercise: str, db: SQLSession) -> Dict:
+        local = self.local.analyze_session_posture(session_id, exercise, db)
+        if not local["total_keyframes"]:
+            return local
+        future = self._executor.submit(self._primary, session_id, exercise, db.get_bind())
+        try:
+            result = future.result(timeout=self.budget_sec)
+        except FutureTimeoutError:
+            print(f"⚠️ [LOCAL ANALYZER] Session {session_id}: LLM missed its {self.budget_sec:.1f}s budget; using local analysis")
+            return local
+        except Exception as e:
+            print(f"❌ [LOCAL ANALYZER] Session {session_id}: LLM analysis failed ({e}); using local analysis")
+            return local
+        return result if result.get("status") == "success" else local
+
+
+# Global instance - will be initialized when first used
+hedged_analyzer = None
+
+def get_hedged_analyzer() -> HedgedPostureAnalyzer:
+    global hedged_analyzer
+    if hedged_analyzer is None:
+        from app.services.gemini_service import get_gemini_analyzer
+        hedged_analyzer = HedgedPostureAnalyzer(get_gemini_analyzer, settings.ANALYSIS_LLM_BUDGET_SEC)
+    return hedged_analyzer
@@ -0,0 +1,165 @@
+import math
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import numpy as np
+
+# Body-line deviation (degrees from a straight shoulder-hip-ankle line) limits.
+# Positive deviation = hips below the line (sag), negative = hips above (pike).
+SAG_THRESHOLD = 12.0
+PIKE_THRESHOLD = -15.0
+
+
+class PlankAnalyzer:
+    """
+    Continuous plank-hold analysis.
+
+    Keeps a fixed-size ring buffer of downsampled body-line deviations per
+    session, so memory stays constant however long the hold lasts. Quality is
+    judged on the median of the most recent samples and a keyframe type is
+    returned only when that quality changes.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 120,
+        sample_interval: timedelta = timedelta(milliseconds=500),
+        quality_window: int = 4,
+        max_gap: timedelta = timedelta(seconds=2),
+    ):
+        self.capacity = capacity
+        self.sample_interval = sample_interval
+        self.quality_window = quality_window
+        self.max_gap = max_gap
+        self.sessions = {}  # Per-session ring buffer and hold state
+
+    def _new_state(self) -> Dict:
+        return {
+            'buffer': np.zeros(self.capacity, dtype=np.float32),
+            'next_index': 0,
+            'samples': 0,
+            'last_sample_time': None,
+            'last_frame_time': None,
+            'hold_seconds': 0.0,
+            'quality': None,
+            'sag_events': 0,
+            'pike_events': 0,
+        }
+
+    def update(self, session_id: int, landmarks: List[Dict], timestamp: datetime) -> Optional[str]:
+        """
+        Feed one frame. Returns 'plank_<quality>' when hold quality changes,
+        otherwise None.
+        """
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions[session_id] = self._new_state()
+
+        deviation = body_line_deviation(landmarks) if landmarks else None
+        if deviation is None:
+            # Out of frame: pause the hold clock without touching quality
+            state['last_frame_time'] = None
+            return None
+
+        last_frame = state['last_frame_time']
+        if last_frame is not None and timedelta(0) < timestamp - last_frame <= self.max_gap:
+            state['hold_seconds'] += (timestamp - last_frame).total_seconds()
+        state['last_frame_time'] = timestamp
+
+        last_sample = state['last_sample_time']
+        if last_sample is not None and timestamp - last_sample < self.sample_interval:
+            return None
+
+        state['buffer'][state['next_index']] = deviation
+        state['next_index'] = (state['next_index'] + 1) % self.capacity
+        state['samples'] = min(state['samples'] + 1, self.capacity)
+        state['last_sample_time'] = timestamp
+
+        quality = classify_deviation(float(np.median(self._recent(state, self.quality_window))))
+        if quality == state['quality']:
+            return None
+
+        if quality == 'sag':
+            state['sag_events'] += 1
+        elif quality == 'pike':
+            state['pike_events'] += 1
+        print(f"🔍 [PLANK KEYFRAME] Session {session_id}: quality changed from {state['quality']} to {quality}")
+        state['quality'] = quality
+        return f'plank_{quality}'
+
+    def _recent(self, state: Dict, n: int) -> np.ndarray:
+        """Last `n` samples in the ring buffer (oldest first)"""
+        n = min(n, state['samples'])
+        idx = (state['next_index'] - n + np.arange(n)) % self.capacity
+        return state['buffer'][idx]
+
+    def get_stats(self, session_id: int) -> Dict:
+        """Current hold statistics for a session"""
+        state = self.sessions.get(session_id)
+        if state is None or state['samples'] == 0:
+            return {
+                'hold_seconds': state['hold_seconds'] if state else 0.0,
+                'quality': None,
+                'sag_events': state['sag_events'] if state else 0,
+                'pike_events': state['pike_events'] if state else 0,
+                'mean_deviation': None,
+                'good_ratio': None,
+            }
+        window = self._recent(state, state['samples'])
+        good = (window <= SAG_THRESHOLD) & (window >= PIKE_THRESHOLD)
+        return {
+            'hold_seconds': round(state['hold_seconds'], 1),
+            'quality': state['quality'],
+            'sag_events': state['sag_events'],
+            'pike_events': state['pike_events'],
+            'mean_deviation': round(float(window.mean()), 1),
+            'good_ratio': round(float(good.mean()), 2),
+        }
+
+    def reset_session(self, session_id: int):
+        """Drop plank state for a session"""
+        self.sessions.pop(session_id, None)
+
+
+def classify_deviation(deviation: float) -> str:
+    if deviation > SAG_THRESHOLD:
+        return 'sag'
+    if deviation < PIKE_THRESHOLD:
+        return 'pike'
+    return 'good'
+
+
+def _find(landmarks: List[Dict], name: str) -> Optional[Dict]:
+    for landmark in landmarks:
+        if landmark.get('name') == name:
+            return landmark
+    return None
+
+
+def body_line_deviation(landmarks: List[Dict]) -> Optional[float]:
+    """
+    Signed deviation of the shoulder-hip-ankle angle from a straight line, in
+    degrees. Uses the left side and falls back to the right.
+    """
+    for side in ('LEFT', 'RIGHT'):
+        shoulder = _find(landmarks, f'{side}_SHOULDER')
+        hip = _find(landmarks, f'{side}_HIP')
+        ankle = _find(landmarks, f'{side}_ANKLE')
+        if shoulder and hip and ankle:
+            break
+    else:
+        return None
+
+    ax, ay = shoulder['x'] - hip['x'], shoulder['y'] - hip['y']
+    bx, by = ankle['x'] - hip['x'], ankle['y'] - hip['y']
+    norm = math.hypot(ax, ay) * math.hypot(bx, by)
+    if norm == 0:
+        return None
+    cos_angle = max(-1.0, min(1.0, (ax * bx + ay * by) / norm))
+    deviation = 180.0 - math.degrees(math.acos(cos_angle))
+
+    # Image y grows downward: hip below the shoulder-ankle line means sag
+    dx = ankle['x'] - shoulder['x']
+    if dx == 0:
+        return deviation
+    line_y = shoulder['y'] + (hip['x'] - shoulder['x']) * (ankle['y'] - shoulder['y']) / dx
+    return deviation if hip['y'] >= line_y else -deviation
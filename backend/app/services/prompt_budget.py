@@ -0,0 +1,99 @@
+"""
+Image budget for analysis requests.
+
+Keyframe images are sent to the model as downscaled JPEG parts rather than
+base64 text. ImageBudget decides how many keyframes get an image and at
+what resolution so one request stays within a token and byte budget:
+it starts at the largest side in `sides` and steps down until the images
+fit, and only drops images once the smallest side still does not fit.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+from app.services.keyframe_storage import make_thumbnail
+
+# Gemini bills an image whose sides are both <= 384px as one 258-token tile;
+# larger images are split into 768x768 tiles of 258 tokens each
+IMAGE_TILE_TOKENS = 258
+SMALL_IMAGE_SIDE = 384
+TILE_SIDE = 768
+
+
+def image_tokens(width: int, height: int) -> int:
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return IMAGE_TILE_TOKENS
+    return math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE) * IMAGE_TILE_TOKENS
+
+
+def text_tokens(text: str) -> int:
+    """Rough token count for English/JSON text (about 4 characters per token)"""
+    return math.ceil(len(text) / 4)
+
+
+def evenly_spaced(count: int, total: int) -> List[int]:
+    """`count` indices spread across range(total), first and last included"""
+    if count >= total:
+        return list(range(total))
+    if count <= 0:
+        return []
+    if count == 1:
+        return [total // 2]
+    return [round(i * (total - 1) / (count - 1)) for i in range(count)]
+
+
+@dataclass
+class ImagePlan:
+    side: int  # Longest side the images were downscaled to
+    indices: List[int] = field(default_factory=list)  # Positions in the input that got an image
+    images: List[bytes] = field(default_factory=list)
+    tokens: int = 0
+    bytes: int = 0
+
+
+class ImageBudget:
+    """Fits keyframe images into a per-request token and byte budget"""
+
+    def __init__(self, max_tokens: int, max_bytes: int, max_images: int, sides: Sequence[int] = (384, 256, 192)):
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        self.sides = sorted(sides, reverse=True)
+
+    def image_count(self, available: int, side: int, reserved_tokens: int = 0) -> int:
+        """Images of at most `side` pixels that fit next to `reserved_tokens` of text"""
+        per_image = image_tokens(side, side)
+        return max(0, min(available, self.max_images, (self.max_tokens - reserved_tokens) // per_image))
+
+    def plan(self, jpegs: Sequence[Optional[bytes]], reserved_tokens: int = 0) -> ImagePlan:
+        """
+        Choose and downscale images from `jpegs` (in time order; None or
+        undecodable entries are skipped). `reserved_tokens` is the prompt
+        text the images must share the token budget with.
+        """
+        usable = [i for i, jpeg in enumerate(jpegs) if jpeg]
+        plan = ImagePlan(side=self.sides[-1])
+        for side in self.sides:
+            count = self.image_count(len(usable), side, reserved_tokens)
+            chosen = [usable[i] for i in evenly_spaced(count, len(usable))]
+            encoded = self._downscale(jpegs, chosen, side)
+            plan = ImagePlan(side=side, indices=[i for i, _ in encoded], images=[img for _, img in encoded])
+            if sum(map(len, plan.images)) <= self.max_bytes:
+                break
+        # Even the smallest side is over the byte budget: thin the images out evenly
+        while plan.images and sum(map(len, plan.images)) > self.max_bytes:
+            keep = evenly_spaced(len(plan.images) - 1, len(plan.images))
+            plan.indices = [plan.indices[i] for i in keep]
+            plan.images = [plan.images[i] for i in keep]
+        plan.bytes = sum(map(len, plan.images))
+        plan.tokens = len(plan.images) * image_tokens(plan.side, plan.side)
+        return plan
+
+    @staticmethod
+    def _downscale(jpegs: Sequence[Optional[bytes]], chosen: List[int], side: int) -> List[Tuple[int, bytes]]:
+        encoded = []
+        for i in chosen:
+            try:
+                encoded.append((i, make_thumbnail(jpegs[i], side)))
+            except ValueError as e:
+                print(f"⚠️ [PROMPT BUDGET] Skipping image {i}: {e}")
+        return encoded
@@ -1,10 +1,21 @@
-from typing import List
-from app.core.config import settings
+"""
+Coaching tips for /tips: Gemini cues with rule-based tips as the fallback.
 
-try:
-    from google import genai
-except Exception:
-    genai = None
+Requests repeat a small set of (exercise, flags, level) combinations, so
+answers are kept in a bounded LRU (TipsCache) keyed by the normalized
+combination. A fresh entry is served directly; a stale one is served too
+while a background thread fetches a replacement (stale-while-revalidate).
+Rule-based answers given while Gemini is unavailable go stale quickly so
+Gemini cues replace them once it recovers. warm_tips_cache precomputes the
+common combinations at startup when TIPS_WARMUP is set.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.services.llm_client import LLMError, llm_client
 
 DEFAULT_TIPS = {
     "squat": {
@@ -23,37 +34,181 @@ DEFAULT_TIPS = {
     }
 }
 
+FLAG_TIPS = {
+    "knees_in": "Drive knees out in line with your toes during the descent.",
+    "shallow_depth": "Descend until hips reach knee level for a full rep.",
+    "back_round": "Brace your core and keep chest up to avoid rounding.",
+    "hip_sag": "Squeeze glutes and keep core tight to prevent hip sag.",
+    "short_range": "Aim for full range each rep for consistency."
+}
+
+# Flags each exercise can raise (see form_flags.frame_flags), for cache warm-up
+EXERCISE_FLAGS = {
+    "squat": ["knees_in", "shallow_depth", "back_round"],
+    "pushup": ["hip_sag", "short_range"],
+}
+
 def rule_based_tips(exercise: str, flags: List[str], level: str) -> List[str]:
     ex = exercise.lower()
     bank = DEFAULT_TIPS.get(ex, {})
-    tips = bank.get(level, []) or bank.get("beginner", [])
-    flag_map = {
-        "knees_in": "Drive knees out in line with your toes during the descent.",
-        "shallow_depth": "Descend until hips reach knee level for a full rep.",
-        "back_round": "Brace your core and keep chest up to avoid rounding.",
-        "hip_sag": "Squeeze glutes and keep core tight to prevent hip sag.",
-        "short_range": "Aim for full range each rep for consistency."
-    }
+    # Copy: appending to the bank itself would grow it on every call
+    tips = list(bank.get(level, []) or bank.get("beginner", []))
     for f in flags:
-        if f in flag_map and flag_map[f] not in tips:
-            tips.append(flag_map[f])
+        if f in FLAG_TIPS and FLAG_TIPS[f] not in tips:
+            tips.append(FLAG_TIPS[f])
     return tips[:5]
 
 def gemini_tips(exercise: str, flags: List[str], level: str) -> List[str]:
-    if not settings.GEMINI_API_KEY or genai is None:
+    """Gemini coaching cues, or [] (use rule_based_tips) when it is unavailable, slow or failing"""
+    if not llm_client.configured:
         return []
+    prompt = (
+        f"Give concise (<=5 bullets) coaching cues for a {exercise} at {level} level. "
+        f"Flags: {', '.join(flags) if flags else 'none'}. "
+        "Be actionable, short, and safe; no medical advice."
+    )
     try:
-        client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        prompt = (
-            f"Give concise (<=5 bullets) coaching cues for a {exercise} at {level} level. "
-            f"Flags: {', '.join(flags) if flags else 'none'}. "
-            "Be actionable, short, and safe; no medical advice."
-        )
-        resp = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt)
-        text = (getattr(resp, "text", None) or "").strip()
-        lines = [l.strip("-• ").strip() for l in text.splitlines() if l.strip()][:5]
-        return lines or ([text] if text else [])
-    except Exception:
+        text = llm_client.generate(prompt, model="gemini-2.0-flash", timeout_sec=settings.LLM_TIPS_TIMEOUT_SEC)
+    except LLMError:
         return []
+    lines = [l.strip("-• ").strip() for l in text.splitlines() if l.strip()][:5]
+    return lines or ([text] if text else [])
+
+def tips_key(exercise: str, flags: Iterable[str], level: str) -> Tuple[str, Tuple[str, ...], str]:
+    """Cache key: flag order and duplicates, and exercise/level case, do not change the answer"""
+    return exercise.strip().lower(), tuple(sorted(set(flags))), level.strip().lower()
+
+def fetch_tips(exercise: str, flags: List[str], level: str) -> Tuple[List[str], str]:
+    """(tips, source) straight from Gemini, or the rule-based fallback"""
+    tips = gemini_tips(exercise, flags, level)
+    if tips:
+        return tips, "gemini"
+    return rule_based_tips(exercise, flags, level), "rule-based"
+
+class TipsCache:
+    """
+    Bounded LRU of tips with TTL and stale-while-revalidate.
+
+    Entries are fresh for `ttl_sec` (`fallback_ttl_sec` for rule-based
+    answers), then served stale for up to `stale_sec` more while one
+    background refresh per key runs.
+    """
+
+    def __init__(self, fetch: Callable[[str, List[str], str], Tuple[List[str], str]] = fetch_tips,
+                 max_entries: int = 256, ttl_sec: float = 3600.0, stale_sec: float = 86400.0,
+                 fallback_ttl_sec: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self._fetch = fetch
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.stale_sec = stale_sec
+        self.fallback_ttl_sec = fallback_ttl_sec
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[List[str], str, float]]" = OrderedDict()  # key -> (tips, source, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher: Optional[ThreadPoolExecutor] = None
+        self.stats = {'hits': 0, 'stale': 0, 'misses': 0}
+
+    def _ttl(self, source: str) -> float:
+        return self.ttl_sec if source == "gemini" else self.fallback_ttl_sec
+
+    def _store(self, key: Tuple, tips: List[str], source: str):
+        with self._lock:
+            self._entries[key] = (tips, source, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key: Tuple, flags: List[str]):
+        try:
+            tips, source = self._fetch(key[0], flags, key[2])
+            self._store(key, tips, source)
+        except Exception as e:
+            print(f"❌ [TIPS CACHE] Refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key: Tuple, flags: List[str]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(2, thread_name_prefix="tips-refresh")
+            refresher = self._refresher
+        refresher.submit(self._refresh, key, flags)
+
+    def get(self, exercise: str, flags: List[str], level: str) -> Tuple[List[str], str]:
+        """(tips, source), from the cache when possible"""
+        key = tips_key(exercise, flags, level)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            tips, source, fetched_at = entry
+            age = self._clock() - fetched_at
+            if age < self._ttl(source):
+                self.stats['hits'] += 1
+                return list(tips), source
+            if age < self._ttl(source) + self.stale_sec:
+                self.stats['stale'] += 1
+                self._refresh_in_background(key, list(key[1]))
+                return list(tips), source
+
+        self.stats['misses'] += 1
+        tips, source = self._fetch(key[0], list(key[1]), key[2])
+        self._store(key, tips, source)
+        return list(tips), source
+
+    def warm(self, combinations: Iterable[Tuple[str, List[str], str]]) -> int:
+        """Fetch each (exercise, flags, level) not already cached; returns how many were fetched"""
+        fetched = 0
+        for exercise, flags, level in combinations:
+            key = tips_key(exercise, flags, level)
+            with self._lock:
+                if key in self._entries:
+                    continue
+            tips, source = self._fetch(key[0], list(key[1]), key[2])
+            self._store(key, tips, source)
+            fetched += 1
+        return fetched
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def shutdown(self):
+        with self._lock:
+            refresher, self._refresher = self._refresher, None
+        if refresher is not None:
+            refresher.shutdown(wait=False, cancel_futures=True)
+
+def common_combinations(level: str = "beginner") -> List[Tuple[str, List[str], str]]:
+    """Each exercise with no flags and with each single flag it can raise"""
+    return [
+        (exercise, combo, level)
+        for exercise, flags in EXERCISE_FLAGS.items()
+        for combo in [[]] + [[flag] for flag in flags]
+    ]
+
+def warm_tips_cache(cache: Optional["TipsCache"] = None) -> threading.Thread:
+    """Precompute common combinations on a daemon thread (startup must not wait on Gemini)"""
+    cache = cache or tips_cache
+
+    def run():
+        fetched = cache.warm(common_combinations())
+        print(f"🔍 [TIPS CACHE] Warmed {fetched} combinations")
+
+    thread = threading.Thread(target=run, name="tips-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# Global instance
+tips_cache = TipsCache(
+    max_entries=settings.TIPS_CACHE_SIZE,
+    ttl_sec=settings.TIPS_CACHE_TTL_SEC,
+    stale_sec=settings.TIPS_CACHE_STALE_SEC,
+    fallback_ttl_sec=settings.TIPS_CACHE_FALLBACK_TTL_SEC,
+)
@@ -0,0 +1,128 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import cv2
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, select
+from app.db.models import AnalysisCacheEntry, AnnotatedFrame
+from app.db.session import make_engine
+from app.services import gemini_service
+from app.services.analysis_cache import AnalysisCache, analysis_key, purge_expired
+from app.services.gemini_service import GeminiPostureAnalyzer
+from app.services.keyframe_eval import squat_landmarks
+from app.services.keyframe_storage import pack_landmarks
+from app.services.prompt_budget import ImageBudget
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _keyframe(i, knee=90.0, seed=0):
+    image = np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    return AnnotatedFrame(
+        id=i + 1, session_id=1, exercise="squat", keyframe_type="bottom" if i % 2 else "top",
+        timestamp=START + timedelta(seconds=i), landmarks_packed=pack_landmarks(squat_landmarks(knee, 160.0)),
+        frame_bytes=cv2.imencode('.jpg', image)[1].tobytes(),
+    )
+
+
+class TestAnalysisCache:
+    """Test suite for the persistent analysis result cache"""
+
+    def test_key_depends_on_content(self):
+        keyframes = [_keyframe(i) for i in range(3)]
+        key = analysis_key("squat", keyframes, "v1")
+        assert key == analysis_key("squat", list(reversed(keyframes)), "v1")
+        assert key != analysis_key("pushup", keyframes, "v1")
+        assert key != analysis_key("squat", keyframes, "v2")
+        assert key != analysis_key("squat", keyframes[:2] + [_keyframe(2, seed=1)], "v1")
+        assert key != analysis_key("squat", keyframes[:2] + [_keyframe(2, knee=120.0)], "v1")
+
+    def test_put_get_and_expiry(self, engine):
+        cache = AnalysisCache(engine=engine, ttl_sec=60)
+        cache.put("k", {"overall_assessment": "ok"}, 1, "squat", "v1")
+        assert cache.get("k") == {"overall_assessment": "ok"}
+        assert cache.get("missing") is None
+
+        with Session(engine) as db:
+            entry = db.get(AnalysisCacheEntry, "k")
+            entry.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            db.add(entry)
+            db.commit()
+        assert cache.get("k") is None
+        with Session(engine) as db:
+            assert purge_expired(db) == 1
+            db.commit()
+            assert db.exec(select(AnalysisCacheEntry)).all() == []
+
+    def test_concurrent_duplicates_share_one_call(self, engine):
+        cache = AnalysisCache(engine=engine, ttl_sec=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"overall_assessment": "once"}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute, 1, "squat", "v1")))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{"overall_assessment": "once"}] * 5
+        assert cache.get_or_compute("k", compute, 1, "squat", "v1") == {"overall_assessment": "once"}
+        assert len(calls) == 1 and cache.stats['hits'] == 1
+
+    def test_failures_are_not_cached(self, engine):
+        cache = AnalysisCache(engine=engine, ttl_sec=60)
+
+        def fail():
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute("k", fail, 1, "squat", "v1")
+        assert cache.get("k") is None
+        assert cache.get_or_compute("k", lambda: {"ok": True}, 1, "squat", "v1") == {"ok": True}
+
+    def test_disabled_with_zero_ttl(self, engine):
+        cache = AnalysisCache(engine=engine, ttl_sec=0)
+        cache.put("k", {"ok": True}, 1, "squat", "v1")
+        assert cache.get("k") is None
+
+
+class TestAnalyzerUsesCache:
+    """Repeat analyses of the same keyframes skip the Gemini call"""
+
+    def test_repeat_analysis_hits_cache(self, engine, monkeypatch):
+        monkeypatch.setattr(gemini_service, "analysis_cache", AnalysisCache(engine=engine, ttl_sec=60))
+        calls = []
+
+        def generate(contents, model=None, timeout_sec=None):
+            calls.append(contents)
+            return '{"overall_assessment": "Good depth", "strengths": []}'
+
+        analyzer = GeminiPostureAnalyzer.__new__(GeminiPostureAnalyzer)  # No API key needed
+        analyzer.llm = SimpleNamespace(generate=generate)
+        analyzer.image_budget = ImageBudget(max_tokens=8000, max_bytes=512 * 1024, max_images=4)
+
+        with Session(engine) as db:
+            db.add_all([_keyframe(i, knee=100.0 - i, seed=i) for i in range(6)])
+            db.commit()
+            first = analyzer.analyze_session_posture(1, "squat", db)
+            second = analyzer.analyze_session_posture(1, "squat", db)
+
+        assert len(calls) == 1
+        assert first["suggestions"] == second["suggestions"] == {"overall_assessment": "Good depth", "strengths": []}
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import datetime
+import pytest
+from sqlmodel import Session, SQLModel, select
+from app.db.models import AnalysisJob, AnnotatedFrame, SessionDB
+from app.db.session import make_engine
+from app.services.analysis_jobs import AnalysisJobQueue, QueueFullError
+
+
+class StubAnalyzer:
+    """Local stand-in for GeminiPostureAnalyzer"""
+
+    def __init__(self, delay: float = 0.0, release: threading.Event = None, status: str = "success"):
+        self.delay = delay
+        self.release = release
+        self.status = status
+
+    def analyze_session_posture(self, session_id, exercise, db):
+        if self.release is not None:
+            self.release.wait(5)
+        if self.status == "error":
+            return {"status": "error", "message": "provider exploded"}
+        return {
+            "status": "success",
+            "total_keyframes": 3,
+            "analyzed_keyframes": 3,
+            "suggestions": {
+                "overall_assessment": f"Solid {exercise}",
+                "strengths": ["depth"], "areas_for_improvement": [],
+                "specific_suggestions": [], "exercise_specific_tips": [], "next_session_focus": "tempo",
+            },
+            "analysis_timestamp": datetime.now().isoformat(),
+        }
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now(), end_ts=datetime.now()))
+        db.add(SessionDB(id=2, exercise="squat", start_ts=datetime.now()))  # Not ended
+        db.add(AnnotatedFrame(session_id=1, keyframe_type="top", timestamp=datetime.now(), exercise="squat"))
+        db.commit()
+    return engine
+
+
+def _queue(engine, analyzer, **kwargs):
+    return AnalysisJobQueue(provider_factory=lambda: analyzer, engine=engine, **kwargs)
+
+
+class TestAnalysisJobQueue:
+    """Test suite for background posture-analysis jobs"""
+
+    def test_job_succeeds_and_result_is_saved(self, engine):
+        queue = _queue(engine, StubAnalyzer())
+        job = queue.submit(1)
+        assert job.status == "queued"
+        assert queue.wait(job.id, 5)
+
+        saved = queue.get(job.id)
+        assert saved.status == "succeeded"
+        assert saved.started_at and saved.finished_at
+        assert '"overall_assessment":"Solid squat"' in saved.result_json
+        assert queue.status(job.id) == "succeeded"
+        queue.shutdown()
+
+    def test_cleanup_after_success(self, engine):
+        queue = _queue(engine, StubAnalyzer())
+        job = queue.submit(1, cleanup=True)
+        queue.wait(job.id, 5)
+        assert queue.get(job.id).status == "succeeded"
+        with Session(engine) as db:
+            assert db.get(SessionDB, 1) is None
+            assert db.exec(select(AnnotatedFrame)).all() == []
+        queue.shutdown()
+
+    def test_provider_error_and_unended_session_fail(self, engine):
+        queue = _queue(engine, StubAnalyzer(status="error"))
+        failed = queue.submit(1)
+        unended = queue.submit(2)
+        queue.wait(failed.id, 5)
+        queue.wait(unended.id, 5)
+        assert queue.get(failed.id).error == "provider exploded"
+        assert "must be ended" in queue.get(unended.id).error
+        queue.shutdown()
+
+    def test_timeout_skips_cleanup(self, engine):
+        release = threading.Event()
+        queue = _queue(engine, StubAnalyzer(release=release), timeout_sec=0.2)
+        job = queue.submit(1, cleanup=True)
+        assert queue.wait(job.id, 5)
+        assert queue.get(job.id).status == "timeout"
+
+        release.set()  # The abandoned call finishes later...
+        queue.shutdown()
+        with Session(engine) as db:
+            assert db.get(SessionDB, 1) is not None  # ...without deleting the session
+
+    def test_abandoned_call_does_not_time_out_the_next_job(self, engine):
+        """Waiting for a call thread held by a timed-out call does not count against the next job"""
+        release = threading.Event()
+        analyzers = iter([StubAnalyzer(release=release), StubAnalyzer()])
+        queue = AnalysisJobQueue(provider_factory=lambda: next(analyzers), engine=engine,
+                                 workers=2, call_workers=1, timeout_sec=0.3, queue_timeout_sec=5)
+        slow = queue.submit(1)
+        assert queue.wait(slow.id, 5)
+        fast = queue.submit(1)
+        time.sleep(0.5)  # Longer than the timeout, still queued behind the slow call
+        release.set()
+        assert queue.wait(fast.id, 5)
+        assert queue.get(slow.id).status == "timeout"
+        assert queue.get(fast.id).status == "succeeded"
+        queue.shutdown()
+
+    def test_job_waiting_for_a_call_stays_queued_then_times_out(self, engine):
+        release = threading.Event()
+        analyzers = iter([StubAnalyzer(release=release), StubAnalyzer()])
+        queue = AnalysisJobQueue(provider_factory=lambda: next(analyzers), engine=engine,
+                                 workers=2, call_workers=1, timeout_sec=0.3, queue_timeout_sec=0.6)
+        slow = queue.submit(1)
+        assert queue.wait(slow.id, 5)
+        stuck = queue.submit(1)
+        time.sleep(0.3)
+        assert queue.status(stuck.id) == "queued"  # Its call has not started
+        assert queue.wait(stuck.id, 5)
+        saved = queue.get(stuck.id)
+        assert saved.status == "timeout" and saved.started_at is None
+        assert "did not start" in saved.error
+
+        release.set()  # The freed call thread must not revive the abandoned job
+        queue.shutdown()
+        time.sleep(0.2)
+        assert queue.get(stuck.id).status == "timeout"
+
+    def test_bounded_pending(self, engine):
+        release = threading.Event()
+        queue = _queue(engine, StubAnalyzer(release=release), workers=1, max_pending=2)
+        queue.submit(1)
+        queue.submit(1)
+        with pytest.raises(QueueFullError):
+            queue.submit(1)
+        release.set()
+        queue.shutdown()
+
+    def test_recover_marks_interrupted_jobs(self, engine):
+        with Session(engine) as db:
+            db.add(AnalysisJob(id="stale", session_id=1, status="running", created_at=datetime.now()))
+            db.commit()
+        queue = _queue(engine, StubAnalyzer())
+        queue.recover()
+        assert queue.get("stale").status == "failed"
@@ -0,0 +1,280 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from google.genai import errors as genai_errors
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+from app.db.models import AnnotatedFrame, SessionDB
+from app.core.config import settings
+from app.db.session import get_session, make_engine
+from app.main import app
+from app.services import gemini_service
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_jobs import analysis_job_queue
+from app.services.analysis_stream import JsonSectionParser, stream_analysis
+from app.services.gemini_service import GeminiPostureAnalyzer
+from app.services.keyframe_eval import squat_landmarks
+from app.services.keyframe_storage import pack_landmarks
+from app.services.llm_client import LLMClient, LLMError
+from app.services.prompt_budget import ImageBudget
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+ANSWER = (
+    '```json\n{"overall_assessment": "Good depth, \\"solid\\" {tempo}", '
+    '"strengths": ["depth", "balance"], '
+    '"specific_suggestions": [{"category": "Form", "issue": "knees", "suggestion": "push out", "priority": "High"}], '
+    '"next_session_focus": "tempo"}\n```'
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'stream.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def client(engine):
+    with Session(engine) as db:
+        db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now(), end_ts=datetime.now()))
+        db.add(SessionDB(id=2, exercise="squat", start_ts=datetime.now()))  # Not ended
+        db.commit()
+
+    def override():
+        with Session(engine) as db:
+            yield db
+
+    app.dependency_overrides[get_session] = override
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_session, None)
+    analysis_job_queue.set_provider(None)
+
+
+def _keyframe(i):
+    return AnnotatedFrame(
+        id=i + 1, session_id=1, exercise="squat", keyframe_type="bottom" if i % 2 else "top",
+        timestamp=START + timedelta(seconds=i), landmarks_packed=pack_landmarks(squat_landmarks(100.0 - i, 160.0)),
+    )
+
+
+def _client(models, **kwargs):
+    options = dict(backoff_base_sec=0.0, client_factory=lambda: SimpleNamespace(models=models)) | kwargs
+    return LLMClient(**options)
+
+
+def _server_error(code=503):
+    return genai_errors.ServerError(code, {"error": {"code": code, "message": "unavailable", "status": "UNAVAILABLE"}})
+
+
+class StubAnalyzer:
+    """Provider without stream_session_posture"""
+
+    def __init__(self, status: str = "success"):
+        self.status = status
+
+    def analyze_session_posture(self, session_id, exercise, db):
+        if self.status == "error":
+            return {"status": "error", "message": "provider exploded"}
+        return {
+            "status": "success",
+            "total_keyframes": 3,
+            "analyzed_keyframes": 3,
+            "suggestions": {
+                "overall_assessment": f"Solid {exercise}",
+                "strengths": ["depth"], "areas_for_improvement": [],
+                "specific_suggestions": [], "exercise_specific_tips": [], "next_session_focus": "tempo",
+            },
+            "analysis_timestamp": datetime.now().isoformat(),
+        }
+
+
+def _chunks(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _analyzer(generate_stream):
+    analyzer = GeminiPostureAnalyzer.__new__(GeminiPostureAnalyzer)  # No API key needed
+    analyzer.llm = SimpleNamespace(generate_stream=generate_stream)
+    analyzer.image_budget = ImageBudget(max_tokens=8000, max_bytes=512 * 1024, max_images=4)
+    return analyzer
+
+
+class TestJsonSectionParser:
+    """Test suite for the incremental suggestions parser"""
+
+    def test_sections_complete_in_order_across_chunks(self):
+        parser = JsonSectionParser()
+        sections = []
+        for chunk in _chunks(ANSWER, 3):
+            sections += parser.feed(chunk)
+        assert parser.done
+        assert sections == list(json.loads(ANSWER.strip('`json\n')).items())
+
+    def test_member_is_only_emitted_once_complete(self):
+        parser = JsonSectionParser()
+        assert parser.feed('{"strengths": ["depth", ') == []
+        assert parser.feed('"balance"], "next') == [("strengths", ["depth", "balance"])]
+        assert parser.feed('_session_focus": "tempo"}') == [("next_session_focus", "tempo")]
+        assert parser.feed(' trailing {"ignored": 1}') == []
+
+    def test_no_object(self):
+        parser = JsonSectionParser()
+        assert parser.feed("Sorry, I cannot help with that.") == []
+        assert not parser.done
+
+
+class TestGenerateStream:
+    """Test suite for LLMClient.generate_stream"""
+
+    def test_yields_chunks_and_retries_before_first(self):
+        outcomes = [_server_error(), ["Hel", "", "lo"]]
+
+        def generate_content_stream(model, contents, config=None):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return (SimpleNamespace(text=text) for text in outcome)
+
+        client = _client(SimpleNamespace(generate_content_stream=generate_content_stream))
+        assert list(client.generate_stream("prompt")) == ["Hel", "lo"]
+        assert client.breaker.state == "closed"
+
+    def test_failure_after_first_chunk_is_not_retried(self):
+        calls = []
+
+        def generate_content_stream(model, contents, config=None):
+            calls.append(1)
+            yield SimpleNamespace(text="partial")
+            raise _server_error()
+
+        client = _client(SimpleNamespace(generate_content_stream=generate_content_stream))
+        stream = client.generate_stream("prompt")
+        assert next(stream) == "partial"
+        with pytest.raises(LLMError):
+            next(stream)
+        assert len(calls) == 1
+
+    def test_disconnect_releases_slot(self):
+        def generate_content_stream(model, contents, config=None):
+            return (SimpleNamespace(text=str(i)) for i in range(10))
+
+        client = _client(SimpleNamespace(generate_content_stream=generate_content_stream), max_concurrency=1)
+        stream = client.generate_stream("prompt")
+        assert next(stream) == "0"
+        stream.close()
+        assert list(client.generate_stream("prompt"))[-1] == "9"
+
+
+class TestAnalyzerStream:
+    """Streamed Gemini analysis: preview, sections as they parse, then the result"""
+
+    def test_event_order_and_result_is_cached(self, engine, monkeypatch):
+        cache = AnalysisCache(engine=engine, ttl_sec=60)
+        monkeypatch.setattr(gemini_service, "analysis_cache", cache)
+        analyzer = _analyzer(lambda contents, model=None, timeout_sec=None: iter(_chunks(ANSWER)))
+
+        with Session(engine) as db:
+            db.add_all([_keyframe(i) for i in range(6)])
+            db.commit()
+            events = list(stream_analysis(analyzer, 1, "squat", db))
+            replay = list(stream_analysis(analyzer, 1, "squat", db))
+
+        names = [event for event, _ in events]
+        assert names[0] == "preview" and names[-1] == "result"
+        assert "".join(data["text"] for event, data in events if event == "delta") == ANSWER
+        sections = [data["name"] for event, data in events if event == "section"]
+        assert sections == ["overall_assessment", "strengths", "specific_suggestions", "next_session_focus"]
+        # The first section arrives before the model has finished
+        assert names.index("section") < len(names) - 2 - names[::-1].index("delta")
+
+        result = events[-1][1]
+        assert result["status"] == "success" and result["total_keyframes"] == 6
+        assert result["suggestions"]["strengths"] == ["depth", "balance"]
+        # The replay is served from the cache without deltas
+        assert [event for event, _ in replay if event == "delta"] == []
+        assert replay[-1][1]["suggestions"] == result["suggestions"]
+
+    def test_failure_falls_back_to_local_sections(self, engine, monkeypatch):
+        monkeypatch.setattr(gemini_service, "analysis_cache", AnalysisCache(engine=engine, ttl_sec=60))
+
+        def generate_stream(contents, model=None, timeout_sec=None):
+            yield '{"overall_assessment": "Goo'
+            raise LLMError("connection reset")
+
+        with Session(engine) as db:
+            db.add_all([_keyframe(i) for i in range(6)])
+            db.commit()
+            events = list(stream_analysis(_analyzer(generate_stream), 1, "squat", db))
+
+        names = [event for event, _ in events]
+        assert names[:3] == ["preview", "delta", "fallback"]
+        assert "section" in names and names[-1] == "result"
+        assert events[-1][1]["suggestions"] == events[0][1]
+
+
+    def test_unparsable_answer_is_not_cached(self, engine, monkeypatch):
+        cache = AnalysisCache(engine=engine, ttl_sec=60)
+        monkeypatch.setattr(gemini_service, "analysis_cache", cache)
+        calls = []
+
+        def generate(contents, model=None, timeout_sec=None):
+            calls.append(1)
+            return "Sorry, I cannot analyze these images."
+
+        analyzer = _analyzer(lambda contents, model=None, timeout_sec=None: iter([generate(contents)]))
+        analyzer.llm.generate = generate
+        with Session(engine) as db:
+            db.add_all([_keyframe(i) for i in range(6)])
+            db.commit()
+            events = list(stream_analysis(analyzer, 1, "squat", db))
+            result = analyzer.analyze_session_posture(1, "squat", db)
+            analyzer.analyze_session_posture(1, "squat", db)
+
+        assert "fallback" in [event for event, _ in events]
+        assert events[-1][1]["suggestions"] == events[0][1]  # The local preview
+        assert result["suggestions"]["overall_assessment"].startswith("Measured")
+        # Every request asked the model again: nothing was cached
+        assert len(calls) == 3 and cache.stats["hits"] == 0
+
+class TestStreamRoute:
+    """Test suite for GET /analysis/stream/{session_id}"""
+
+    def _events(self, response):
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    def test_streams_sections_then_result(self, client):
+        analysis_job_queue.set_provider(StubAnalyzer)
+        response = client.get("/analysis/stream/1")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self._events(response)
+        assert [event for event, _ in events][-1] == "result"
+        assert ("section", {"name": "overall_assessment", "value": "Solid squat"}) in events
+        assert events[-1][1]["suggestions"]["next_session_focus"] == "tempo"
+
+    def test_provider_error_is_an_error_event(self, client):
+        analysis_job_queue.set_provider(lambda: StubAnalyzer(status="error"))
+        assert self._events(client.get("/analysis/stream/1")) == [("error", {"detail": "provider exploded"})]
+
+    def test_missing_and_unended_sessions(self, client):
+        assert client.get("/analysis/stream/99").status_code == 404
+        assert client.get("/analysis/stream/2").status_code == 400
+
+
+class TestKeyframeCountRoute:
+    """GET /analysis/{session_id}/keyframes/count reflects the analyzers' sampling"""
+
+    def test_keyframe_count_reports_sampling(self, client, engine, monkeypatch):
+        monkeypatch.setattr(settings, "ANALYSIS_MAX_CANDIDATES", 4)
+        with Session(engine) as db:
+            db.add_all([_keyframe(i) for i in range(6)])
+            db.commit()
+        data = client.get("/analysis/1/keyframes/count").json()
+        assert data == {"session_id": 1, "keyframe_count": 6, "will_sample": True, "sample_size": 4}
+        assert client.get("/analysis/2/keyframes/count").json()["will_sample"] is False
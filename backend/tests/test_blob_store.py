@@ -0,0 +1,75 @@
+import base64
+import hashlib
+from datetime import datetime
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+from app.db.models import AnnotatedFrame, SessionDB
+from app.services import blob_store as blob_store_module
+from app.services.blob_store import BlobStore
+from app.services.keyframe_storage import image_fields, load_frame_b64
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"), release_grace_sec=0)
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    return store
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now()))
+        session.commit()
+        yield session
+
+
+def _frame(ref):
+    return AnnotatedFrame(session_id=1, frame_ref=ref, keyframe_type="bottom", timestamp=datetime.now(), exercise="squat")
+
+
+class TestBlobStore:
+    """Test suite for the content-addressed keyframe blob store"""
+
+    def test_put_is_content_addressed_and_sharded(self, store):
+        digest = store.put(b"jpeg-bytes")
+        assert digest == hashlib.sha256(b"jpeg-bytes").hexdigest()
+        assert store.path_for(digest).relative_to(store.root).parts == (digest[:2], digest[2:4], digest)
+        assert store.read(digest) == b"jpeg-bytes"
+        assert store.put(b"jpeg-bytes") == digest  # Deduplicated
+
+    def test_b64_image_round_trip(self, store):
+        encoded = base64.b64encode(b"\xff\xd8image").decode()
+        digest = image_fields(encoded)["frame_ref"]
+        assert store.read(digest) == b"\xff\xd8image"
+        assert load_frame_b64(_frame(digest)) == encoded
+        assert image_fields("data:image/jpeg;base64," + encoded)["frame_ref"] == digest
+
+    def test_invalid_base64_stays_inline(self, store):
+        assert image_fields("not_base64!") == {"frame_data": "not_base64!"}
+        frame = AnnotatedFrame(session_id=1, frame_data="inline", keyframe_type="top", timestamp=datetime.now(), exercise="squat")
+        assert load_frame_b64(frame) == "inline"
+
+    def test_release_is_reference_counted(self, store, db):
+        shared = store.put(b"shared")
+        single = store.put(b"single")
+        frames = [_frame(shared), _frame(shared), _frame(single)]
+        db.add_all(frames)
+        db.commit()
+
+        db.delete(frames[0])
+        db.delete(frames[2])
+        db.commit()
+
+        assert store.release(db, [shared, single]) == 1
+        assert store.exists(shared)
+        assert not store.exists(single)
+
+    def test_release_skips_recent_blobs(self, tmp_path, db):
+        store = BlobStore(str(tmp_path / "blobs"), release_grace_sec=3600)
+        digest = store.put(b"fresh")
+        assert store.release(db, [digest]) == 0
+        assert store.exists(digest)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, select
+from app.core.config import settings
+from app.db.models import AnnotatedFrame, SessionDB, SessionMetric
+from app.db.session import make_engine
+from app.services import blob_store as blob_store_module
+from app.services.blob_store import BlobStore
+from app.services.compaction import compact
+from app.services.keyframe_storage import image_etag, keyframe_landmarks, load_frame_bytes, pack_landmarks
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"), release_grace_sec=0)
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    return store
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'compact.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _jpeg(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    ok, data = cv2.imencode('.jpg', rng.integers(0, 255, (480, 640, 3), dtype=np.uint8))
+    return data.tobytes()
+
+
+def _frame(store, session_id, age_days, seed):
+    return AnnotatedFrame(
+        session_id=session_id, keyframe_type="bottom", exercise="squat",
+        timestamp=datetime.now() - timedelta(days=age_days),
+        frame_ref=store.put(_jpeg(seed)),
+        landmarks_packed=pack_landmarks([{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}]),
+    )
+
+
+class TestCompaction:
+    """Test suite for keyframe retention and storage compaction"""
+
+    def test_retention_tiers(self, engine, store, monkeypatch):
+        monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "blob")
+        with Session(engine) as db:
+            db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now()))
+            db.add_all([_frame(store, 1, 1, 1), _frame(store, 1, 10, 2), _frame(store, 1, 40, 3)])
+            db.commit()
+            etags = {kf.id: image_etag(kf) for kf in db.exec(select(AnnotatedFrame)).all()}
+
+        report = compact(engine, full_image_days=7, image_days=30)
+        assert report['downsampled'] == 1
+        assert report['images_dropped'] == 1
+        assert report['blobs_removed'] == 2
+        assert report['blob_bytes_reclaimed'] > 0
+        assert report['bytes_reclaimed'] >= report['blob_bytes_reclaimed']
+
+        with Session(engine) as db:
+            fresh, old, ancient = db.exec(select(AnnotatedFrame).order_by(AnnotatedFrame.timestamp.desc())).all()
+            assert fresh.image_variant is None
+            assert old.image_variant == 'thumb'
+            thumb = cv2.imdecode(np.frombuffer(load_frame_bytes(old), np.uint8), cv2.IMREAD_COLOR)
+            assert max(thumb.shape[:2]) == settings.KEYFRAME_THUMB_SIZE
+            # Served under the same id, so clients must see a new ETag
+            assert image_etag(old) != etags[old.id] and image_etag(fresh) == etags[fresh.id]
+            assert ancient.image_variant == 'none'
+            assert ancient.frame_ref is None
+            assert keyframe_landmarks(ancient) == [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}]
+        assert len(list(store.iter_digests())) == 2  # fresh + thumbnail
+
+        # Idempotent
+        again = compact(engine, full_image_days=7, image_days=30)
+        assert (again['downsampled'], again['images_dropped'], again['blobs_removed']) == (0, 0, 0)
+
+    def test_orphans_and_unreferenced_blobs(self, engine, store):
+        with Session(engine) as db:
+            db.add(_frame(store, 99, 0, 1))  # Session 99 does not exist
+            db.add(SessionMetric(session_id=99, reps=1, avg_score=0.5, duration_sec=1, ts=datetime.now()))
+            db.commit()
+        stray = store.put(b"stray")
+
+        report = compact(engine)
+        assert (report['orphan_keyframes'], report['orphan_metrics']) == (1, 1)
+        assert not store.exists(stray)
+        assert list(store.iter_digests()) == []
+
+    def test_vacuum_reclaims_file_space(self, engine, store, monkeypatch):
+        monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "db")
+        with Session(engine) as db:
+            db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now()))
+            db.add_all([AnnotatedFrame(session_id=1, keyframe_type="top", exercise="squat",
+                                       timestamp=datetime.now() - timedelta(days=60), frame_bytes=_jpeg(i))
+                        for i in range(20)])
+            db.commit()
+
+        report = compact(engine)
+        assert report['images_dropped'] == 20
+        assert report['db_bytes_reclaimed'] > 0
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from sqlalchemy import text
+from app.db import database, session as db_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.session import make_async_engine, make_engine
+
+
+class TestDatabaseEngine:
+    """Test suite for the shared, tuned SQLite engine"""
+
+    def test_single_shared_engine(self):
+        assert database.engine is db_session.engine
+
+    def test_pragmas_applied(self, tmp_path):
+        engine = make_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            assert conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2  # INCREMENTAL on new files
+        assert engine.pool.size() == 8
+
+    def test_reads_do_not_block_on_open_write(self, tmp_path):
+        """Under WAL a reader sees the last commit while a write transaction is open"""
+        engine = make_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (v INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+
+        writer = engine.connect()
+        writer.begin()
+        writer.execute(text("INSERT INTO t VALUES (2)"))  # Holds the write lock, uncommitted
+
+        seen = []
+
+        def read():
+            with engine.connect() as conn:
+                seen.append(conn.execute(text("SELECT count(*) FROM t")).scalar())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(2)
+        assert seen == [1]
+
+        writer.commit()
+        writer.close()
+        engine.dispose()
+
+    def test_async_engine_pragmas_and_concurrency(self, tmp_path):
+        """Many concurrent async sessions share a few pooled aiosqlite connections"""
+        url = f"sqlite:///{tmp_path / 'async.db'}"
+        sync_engine = make_engine(url)
+        with sync_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (v INTEGER)"))
+
+        async def run():
+            engine = make_async_engine(url)
+            async with engine.connect() as conn:
+                assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+
+            async def insert(i):
+                async with AsyncSession(engine) as db:
+                    await db.exec(text("INSERT INTO t VALUES (:v)").bindparams(v=i))
+                    await db.commit()
+
+            await asyncio.gather(*(insert(i) for i in range(50)))
+            async with AsyncSession(engine) as db:
+                count = (await db.exec(text("SELECT count(*) FROM t"))).scalar()
+            await engine.dispose()
+            return count
+
+        assert asyncio.run(run()) == 50
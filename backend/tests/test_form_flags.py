@@ -0,0 +1,104 @@
+import json
+import numpy as np
+from app.services.form_flags import (
+    FormFlagDetector,
+    flags_from_counts,
+    frame_flags,
+    joint_angles,
+    landmarks_to_array,
+    merge_counts,
+    parse_flags_json,
+)
+
+
+def _lm(**points):
+    return [{'name': name, 'x': x, 'y': y} for name, (x, y) in points.items()]
+
+
+# Front view, knees bent and caving inward
+KNEES_IN_SQUAT = _lm(
+    LEFT_SHOULDER=(0.4, 0.3), RIGHT_SHOULDER=(0.6, 0.3),
+    LEFT_HIP=(0.4, 0.55), RIGHT_HIP=(0.6, 0.55),
+    LEFT_KNEE=(0.48, 0.62), RIGHT_KNEE=(0.52, 0.62),
+    LEFT_ANKLE=(0.35, 0.9), RIGHT_ANKLE=(0.65, 0.9),
+)
+
+# Side view squat that stays high (knee ~120 degrees)
+HIGH_SQUAT = _lm(
+    LEFT_SHOULDER=(0.5, 0.3), LEFT_HIP=(0.5, 0.55),
+    LEFT_KNEE=(0.6, 0.7), LEFT_ANKLE=(0.5, 0.9),
+)
+
+SAGGING_PUSHUP = _lm(
+    LEFT_SHOULDER=(0.2, 0.5), LEFT_ELBOW=(0.2, 0.65), LEFT_WRIST=(0.2, 0.8),
+    LEFT_HIP=(0.5, 0.62), LEFT_ANKLE=(0.8, 0.5),
+)
+
+
+class TestFormFlags:
+    """Test suite for per-frame form flag detection"""
+
+    def test_joint_angles_vectorized(self):
+        """Angles are computed for every triple; missing landmarks give NaN"""
+        points = landmarks_to_array(_lm(LEFT_HIP=(0.5, 0.5), LEFT_KNEE=(0.5, 0.7), LEFT_ANKLE=(0.5, 0.9)))
+        angles = joint_angles(points)
+        assert abs(angles[0] - 180.0) < 1e-6
+        assert np.isnan(angles[1:]).all()
+
+    def test_frame_flags_knees_in(self):
+        assert 'knees_in' in frame_flags('squat', KNEES_IN_SQUAT)['flags']
+
+    def test_frame_flags_hip_sag(self):
+        assert frame_flags('pushup', SAGGING_PUSHUP)['flags'] == ['hip_sag']
+        assert frame_flags('squat', SAGGING_PUSHUP)['flags'] == []
+
+    def test_shallow_depth_counted_per_rep(self):
+        """Depth is judged over the whole rep when it completes"""
+        detector = FormFlagDetector()
+        assert 'shallow_depth' not in detector.update(1, 'squat', HIGH_SQUAT)
+        assert 'shallow_depth' in detector.update(1, 'squat', HIGH_SQUAT, rep_completed=True)
+
+        counts = detector.get_counts(1)
+        assert counts['reps'] == 1
+        assert counts['counts']['shallow_depth'] == 1
+
+    def test_flush_aggregate_returns_interval_counts(self):
+        """Each flush carries only the counts since the previous one"""
+        detector = FormFlagDetector()
+        for _ in range(3):
+            detector.update(1, 'pushup', SAGGING_PUSHUP)
+
+        first = json.loads(detector.flush_aggregate(1))
+        assert first == {'frames': 3, 'reps': 0, 'counts': {'hip_sag': 3}}
+        second = json.loads(detector.flush_aggregate(1))
+        assert second == {'frames': 0, 'reps': 0, 'counts': {}}
+        assert detector.get_counts(1)['counts'] == {'hip_sag': 3}
+        assert detector.active_flags(1) == ['hip_sag']
+
+    def test_aggregate_cleared_only_once_stored(self):
+        """A snapshot is subtracted after its metric commits; frames counted meanwhile are kept"""
+        detector = FormFlagDetector()
+        for _ in range(3):
+            detector.update(1, 'pushup', SAGGING_PUSHUP)
+        snapshot = detector.interval_aggregate(1)
+        assert snapshot == {'frames': 3, 'reps': 0, 'counts': {'hip_sag': 3}}
+        # Not cleared yet, e.g. the metrics commit failed
+        assert detector.interval_aggregate(1) == snapshot
+
+        detector.update(1, 'pushup', SAGGING_PUSHUP)
+        detector.clear_aggregate(1, snapshot)
+        assert detector.interval_aggregate(1) == {'frames': 1, 'reps': 0, 'counts': {'hip_sag': 1}}
+
+    def test_reset_session_drops_state(self):
+        detector = FormFlagDetector()
+        detector.update(1, 'pushup', SAGGING_PUSHUP)
+        detector.reset_session(1)
+        assert 1 not in detector.sessions and 1 not in detector.session_locks
+        assert detector.get_counts(1) == {'frames': 0, 'reps': 0, 'counts': {}}
+
+    def test_parse_and_merge_metric_rows(self):
+        """Stored aggregates (and legacy flag lists) merge into session totals"""
+        rows = ['{"frames":10,"reps":2,"counts":{"knees_in":4,"shallow_depth":1}}', '[]', '["back_round"]']
+        merged = merge_counts([parse_flags_json(r) for r in rows])
+        assert merged == {'frames': 10, 'reps': 2, 'counts': {'knees_in': 4, 'shallow_depth': 1, 'back_round': 1}}
+        assert flags_from_counts(merged, min_ratio=0.3) == ['shallow_depth', 'knees_in']
@@ -282,12 +282,12 @@ class TestFrameProcessorIntegration:
         with patch('app.services.frame_processor.get_landmark_coordinates') as mock_get_coords:
             mock_get_coords.return_value = {}
             
-            # First call should return keyframe
+            # No landmarks means no hold quality, so no keyframe
             result1 = process_frame(self.test_image, session_id=1, exercise='plank')
-            assert result1['keyframe_type'] == 'plank_interval'
+            assert result1['keyframe_type'] is None
             assert result1['rep_completed'] == False
             
-            # Second call within 30 seconds should not return keyframe
+            # Plank keyframes are not emitted on a timer
             result2 = process_frame(self.test_image, session_id=1, exercise='plank')
             assert result2['keyframe_type'] is None
             assert result2['rep_completed'] == False
@@ -0,0 +1,69 @@
+from app.services.frame_reorder import FrameReorderBuffer
+
+
+class TestFrameReorderBuffer:
+    """Test suite for the per-session frame reorder window"""
+
+    def setup_method(self):
+        self.buffer = FrameReorderBuffer(window=3)
+        self.seen = []
+
+    def _submit(self, seq, session_id=1):
+        return self.buffer.submit(session_id, seq, f"frame{seq}", lambda item: self.seen.append(item) or item)
+
+    def test_in_order_frames_release_immediately(self):
+        """In-order frames pass straight through"""
+        assert self._submit(0) == {0: "frame0"}
+        assert self._submit(1) == {1: "frame1"}
+        assert self.seen == ["frame0", "frame1"]
+
+    def test_out_of_order_frames_are_reordered(self):
+        """Frames arriving early wait for the missing earlier frame"""
+        assert self._submit(1) == {}
+        assert self._submit(2) == {}
+        assert self._submit(0) == {0: "frame0", 1: "frame1", 2: "frame2"}
+        assert self.seen == ["frame0", "frame1", "frame2"]
+
+    def test_late_and_duplicate_frames_are_dropped(self):
+        """Frames behind the window or already pending are dropped"""
+        self._submit(0)
+        self._submit(2)
+        assert self.buffer.is_stale(1, 0)
+        assert self.buffer.is_stale(1, 2)
+        assert not self.buffer.is_stale(1, 1)
+
+        assert self._submit(0) == {}
+        assert self._submit(2) == {}
+        assert self.seen == ["frame0"]
+
+    def test_full_window_skips_gap(self):
+        """A lost frame does not stall the session once the window fills"""
+        self._submit(0)
+        for seq in (2, 3, 4):
+            assert self._submit(seq) == {}
+        released = self._submit(5)
+        assert list(released) == [2, 3, 4, 5]
+        assert self.buffer.is_stale(1, 1)
+
+    def test_sessions_are_independent(self):
+        """A gap in one session does not hold back another"""
+        assert self._submit(1, session_id=1) == {}
+        assert self._submit(0, session_id=2) == {0: "frame0"}
+
+    def test_reset_session(self):
+        """Reset starts sequence numbering over"""
+        self._submit(0)
+        self.buffer.reset_session(1)
+        assert not self.buffer.is_stale(1, 0)
+        assert self._submit(0) == {0: "frame0"}
+
+    def test_drain_releases_held_frames(self):
+        """Drain hands over everything still pending in order, then forgets the session"""
+        self._submit(0)
+        self._submit(3)
+        self._submit(2)
+        released = self.buffer.drain(1, lambda item: self.seen.append(item) or item)
+        assert released == {2: "frame2", 3: "frame3"}
+        assert self.seen == ["frame0", "frame2", "frame3"]
+        assert 1 not in self.buffer.sessions and 1 not in self.buffer.session_locks
+        assert self.buffer.drain(1, self.seen.append) == {}
@@ -13,24 +13,6 @@ class TestGeminiPostureAnalyzer:
                 with patch('google.generativeai.GenerativeModel'):
                     self.analyzer = GeminiPostureAnalyzer()
     
-    def test_sample_keyframes_small_session(self):
-        """Test that small sessions (<150 keyframes) are not sampled"""
-        keyframes = [MagicMock() for _ in range(50)]
-        sampled = self.analyzer._sample_keyframes(keyframes)
-        assert len(sampled) == 50
-        assert sampled == keyframes
-    
-    def test_sample_keyframes_large_session(self):
-        """Test that large sessions (>150 keyframes) are sampled to 150"""
-        keyframes = [MagicMock() for _ in range(300)]
-        # Add timestamps to make them sortable
-        for i, kf in enumerate(keyframes):
-            kf.timestamp = datetime.now()
-        
-        sampled = self.analyzer._sample_keyframes(keyframes)
-        assert len(sampled) == 150
-        assert len(sampled) < len(keyframes)
-    
     def test_prepare_analysis_data(self):
         """Test preparation of analysis data"""
         mock_keyframe = MagicMock()
@@ -103,8 +85,8 @@ class TestGeminiPostureAnalyzer:
         """Test parsing invalid JSON suggestions"""
         text_response = "This is just plain text without JSON"
         
-        suggestions = self.analyzer._parse_suggestions(text_response, "squat")
-        
-        assert suggestions["overall_assessment"] == "Analysis completed"
-        assert "raw_response" in suggestions
-        assert suggestions["raw_response"] == text_response
+        # Raised so the caller falls back instead of caching the text as an analysis
+        with pytest.raises(ValueError):
+            self.analyzer._parse_suggestions(text_response, "squat")
+        with pytest.raises(ValueError):
+            self.analyzer._parse_suggestions('{"overall_assessment": "Good', "squat")
@@ -7,3 +7,12 @@ def test_health():
     r = client.get("/healthz")
     assert r.status_code == 200
     assert r.json()["status"] == "ok"
+
+def test_startup_and_shutdown_hooks(monkeypatch):
+    from app.core.config import settings
+    warmed = []
+    monkeypatch.setattr(settings, "TIPS_WARMUP", True)
+    monkeypatch.setattr("app.main.warm_tips_cache", lambda: warmed.append(1))
+    with TestClient(app) as lifespan_client:
+        assert lifespan_client.get("/health").status_code == 200
+    assert warmed == [1]
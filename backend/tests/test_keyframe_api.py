@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel import Session, create_engine, SQLModel, select
 from datetime import datetime
 from app.main import app
 from app.db.models import User, SessionDB, AnnotatedFrame
@@ -31,8 +31,11 @@ def setup_test_db():
 
 @pytest.fixture
 def test_user(setup_test_db):
-    """Create a test user"""
+    """Create a test user (email is unique, so reuse it across tests)"""
     with Session(engine) as session:
+        user = session.exec(select(User).where(User.email == "test@example.com")).first()
+        if user:
+            return user
         user = User(
             email="test@example.com",
             full_name="Test User",
@@ -14,29 +14,46 @@ class TestKeyframeDetector:
         self.timestamp = datetime.now()
     
     def test_plank_keyframe_detection(self):
-        """Test plank keyframe detection (every 30 seconds)"""
+        """Test plank keyframes are emitted on hold quality changes, not on a timer"""
         exercise = 'plank'
+        straight = [
+            {'name': 'LEFT_SHOULDER', 'x': 0.2, 'y': 0.5},
+            {'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5},
+            {'name': 'LEFT_ANKLE', 'x': 0.8, 'y': 0.5},
+        ]
+        sagging = [
+            {'name': 'LEFT_SHOULDER', 'x': 0.2, 'y': 0.5},
+            {'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.6},
+            {'name': 'LEFT_ANKLE', 'x': 0.8, 'y': 0.5},
+        ]
         
-        # First call should return keyframe
+        # First frame establishes hold quality
         keyframe_type, rep_completed = self.detector.should_save_keyframe(
-            self.session_id, exercise, [], self.timestamp
+            self.session_id, exercise, straight, self.timestamp
         )
-        assert keyframe_type == 'plank_interval'
+        assert keyframe_type == 'plank_good'
         assert rep_completed == False
         
-        # Call within 30 seconds should not return keyframe
-        keyframe_type, rep_completed = self.detector.should_save_keyframe(
-            self.session_id, exercise, [], self.timestamp + timedelta(seconds=15)
-        )
-        assert keyframe_type is None
-        assert rep_completed == False
+        # Holding the same quality never emits, however long the hold
+        for i in range(1, 40):
+            keyframe_type, _ = self.detector.should_save_keyframe(
+                self.session_id, exercise, straight, self.timestamp + timedelta(seconds=i)
+            )
+            assert keyframe_type is None
+        
+        # Hips dropping is a quality change
+        types = [
+            self.detector.should_save_keyframe(
+                self.session_id, exercise, sagging, self.timestamp + timedelta(seconds=40 + i)
+            )[0]
+            for i in range(4)
+        ]
+        assert 'plank_sag' in types
         
-        # Call after 30 seconds should return keyframe
-        keyframe_type, rep_completed = self.detector.should_save_keyframe(
-            self.session_id, exercise, [], self.timestamp + timedelta(seconds=35)
-        )
-        assert keyframe_type == 'plank_interval'
-        assert rep_completed == False
+        stats = self.detector.get_plank_stats(self.session_id)
+        assert stats['quality'] == 'sag'
+        assert stats['sag_events'] == 1
+        assert stats['hold_seconds'] == 43.0
     
     def test_squat_rep_counting(self):
         """Test squat rep counting logic"""
@@ -305,10 +322,77 @@ class TestKeyframeDetectorIntegration:
         keyframe_type, rep_completed = self.detector.should_save_keyframe(
             plank_session_id, 'plank', [], self.timestamp + timedelta(seconds=2)
         )
-        assert keyframe_type == 'plank_interval'
+        assert keyframe_type is None  # No landmarks, no hold quality yet
         assert rep_completed == False
         
         # Verify all sessions are isolated
         assert squat_session_id in self.detector.motion_state
         assert pushup_session_id in self.detector.motion_state
-        assert plank_session_id in self.detector.last_keyframe_time
+        assert plank_session_id in self.detector.plank_analyzer.sessions
+
+
+class TestKeyframeDetectorConcurrency:
+    """Concurrent frames for the same and different sessions"""
+    
+    def setup_method(self):
+        self.detector = KeyframeDetector()
+        self.timestamp = datetime.now()
+    
+    def _run_reps(self, session_id, reps):
+        bottom = [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.7}, {'name': 'LEFT_KNEE', 'x': 0.5, 'y': 0.6}]
+        top = [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}, {'name': 'LEFT_KNEE', 'x': 0.5, 'y': 0.6}]
+        self.detector.should_save_keyframe(session_id, 'squat', top, self.timestamp)
+        for i in range(reps):
+            self.detector.should_save_keyframe(session_id, 'squat', bottom, self.timestamp)
+            self.detector.should_save_keyframe(session_id, 'squat', top, self.timestamp)
+    
+    def test_parallel_sessions_keep_isolated_counts(self):
+        """Sessions processed on different threads each count their own reps"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda sid: self._run_reps(sid, 25), range(1, 9)))
+        
+        for sid in range(1, 9):
+            assert self.detector.get_rep_count(sid) == 25
+    
+    def test_session_lock_is_per_session(self):
+        """Holding one session's lock does not block another session"""
+        import threading
+        
+        lock = self.detector._session_lock(1)
+        assert self.detector._session_lock(1) is lock
+        assert self.detector._session_lock(2) is not lock
+        
+        done = threading.Event()
+        with lock:
+            worker = threading.Thread(target=lambda: (self._run_reps(2, 1), done.set()))
+            worker.start()
+            assert done.wait(timeout=5)
+        worker.join()
+        assert self.detector.get_rep_count(2) == 1
+    
+    def test_one_session_from_many_threads(self):
+        """Frames of one session sent from several threads count every completed rep once"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        bottom = [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.7}, {'name': 'LEFT_KNEE', 'x': 0.5, 'y': 0.6}]
+        top = [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}, {'name': 'LEFT_KNEE', 'x': 0.5, 'y': 0.6}]
+        
+        def send(_):
+            completed = 0
+            for _ in range(50):
+                for landmarks in (bottom, top):
+                    _, rep_completed = self.detector.should_save_keyframe(1, 'squat', landmarks, self.timestamp)
+                    completed += rep_completed
+            return completed
+        
+        for _ in range(2):  # Again after a reset, on a fresh lock
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                completed = sum(pool.map(send, range(8)))
+            assert completed > 0
+            assert self.detector.get_rep_count(1) == completed
+            
+            self.detector.reset_session(1)
+            assert 1 not in self.detector.session_locks
+            assert self.detector.get_rep_count(1) == 0
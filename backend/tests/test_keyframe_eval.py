@@ -0,0 +1,85 @@
+import json
+import pytest
+from app.services.keyframe_eval import (
+    LabelledSequence,
+    count_cycles,
+    evaluate_sequence,
+    load_csv_sequences,
+    load_recording,
+    pushup_landmarks,
+    squat_landmarks,
+    summarize,
+    DEFAULT_CSV_PATH,
+)
+
+
+def _squat_frame(hip_y):
+    return [{'name': 'LEFT_HIP', 'x': 0.5, 'y': hip_y}, {'name': 'LEFT_KNEE', 'x': 0.5, 'y': 0.6}]
+
+
+class TestKeyframeEval:
+    """Test suite for the detector evaluation harness"""
+
+    def test_count_cycles_hysteresis(self):
+        """Only full low->high excursions count as reps"""
+        values = [170, 90, 100, 85, 170, 160, 175, 90, 120, 165, 95]
+        assert count_cycles(values, low=100, high=160) == 2
+
+    def test_evaluate_labelled_sequence(self):
+        """A clean squat sequence is counted exactly"""
+        frames = [_squat_frame(0.5)]
+        for _ in range(3):
+            frames += [_squat_frame(0.7), _squat_frame(0.5)]
+        seq = LabelledSequence(name="synthetic", exercise="squat", expected_reps=3, frames=frames)
+
+        result = evaluate_sequence(seq)
+
+        assert result.frames == 7
+        assert result.counted_reps == 3
+        assert result.rep_error == 0
+        assert result.keyframe_types == {'middle': 1, 'bottom': 3, 'top': 3}
+        assert result.frames_per_sec > 0
+
+    def test_summarize_per_exercise(self):
+        """Summary aggregates rep error and keyframes per exercise"""
+        frames = [_squat_frame(0.5), _squat_frame(0.7), _squat_frame(0.5)]
+        results = [
+            evaluate_sequence(LabelledSequence("a", "squat", 1, frames)),
+            evaluate_sequence(LabelledSequence("b", "squat", 3, frames)),
+        ]
+        summary = summarize(results)
+
+        assert summary["squat"]["sequences"] == 2
+        assert summary["squat"]["counted_reps"] == 2
+        assert summary["squat"]["mean_abs_rep_error"] == 1.0
+        assert summary["squat"]["keyframes"] == 6
+
+    def test_pose_builders_geometry(self):
+        """Standing/extended poses put the hip/shoulder above the knee/elbow"""
+        squat = {lm['name']: lm for lm in squat_landmarks(180, 180)}
+        assert squat['LEFT_HIP']['y'] < squat['LEFT_KNEE']['y'] < squat['LEFT_ANKLE']['y']
+
+        pushup = {lm['name']: lm for lm in pushup_landmarks(180, 90)}
+        assert pushup['LEFT_SHOULDER']['y'] < pushup['LEFT_ELBOW']['y']
+
+    @pytest.mark.skipif(not DEFAULT_CSV_PATH.exists(), reason="exercise_angles.csv not available")
+    def test_load_csv_sequences(self):
+        """CSV sequences are produced for the supported exercises with labels"""
+        sequences = load_csv_sequences(chunk_size=1000)
+        exercises = {s.exercise for s in sequences}
+        assert exercises == {"squat", "pushup"}
+        assert all(len(s.frames) <= 1000 for s in sequences)
+        assert sum(s.expected_reps for s in sequences) > 0
+
+    def test_load_recording(self, tmp_path):
+        """Recorded session files load into labelled sequences"""
+        path = tmp_path / "session.json"
+        path.write_text(json.dumps({
+            "exercise": "squat",
+            "expected_reps": 1,
+            "frames": [_squat_frame(0.5), _squat_frame(0.7), _squat_frame(0.5)],
+        }))
+
+        seq = load_recording(path)
+        assert seq.exercise == "squat"
+        assert evaluate_sequence(seq).rep_error == 0
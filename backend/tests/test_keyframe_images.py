@@ -0,0 +1,144 @@
+import base64
+import hashlib
+from datetime import datetime
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.db.models import SessionDB
+from app.db.session import get_async_session, get_session, make_async_engine, make_engine
+from app.main import app
+from app.services import blob_store as blob_store_module
+from app.services.blob_store import BlobStore
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "db")
+    url = f"sqlite:///{tmp_path / 'images.db'}"
+    engine = make_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now()))
+        db.commit()
+
+    def override():
+        with Session(engine) as session:
+            yield session
+
+    async def override_async():
+        # Per request: TestClient runs each request on a fresh event loop
+        async_engine = make_async_engine(url, poolclass=NullPool)
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+        await async_engine.dispose()
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_async_session] = override_async
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_session, None)
+    app.dependency_overrides.pop(get_async_session, None)
+
+
+@pytest.fixture
+def stored(client):
+    ok, jpeg = cv2.imencode('.jpg', np.full((480, 640, 3), 128, dtype=np.uint8))
+    frame = base64.b64encode(jpeg.tobytes()).decode()
+    ids = []
+    for keyframe_type in ["bottom", "top", "bottom", "top", "bottom"]:
+        response = client.post("/keyframes/keyframes", json={
+            "session_id": 1, "frame_data": frame, "keyframe_type": keyframe_type, "exercise": "squat"
+        })
+        ids.append(response.json()["id"])
+    return ids, jpeg.tobytes()
+
+
+class TestKeyframeImageAPI:
+    """Test suite for paginated keyframe metadata and image endpoints"""
+
+    def test_keyset_pagination(self, client, stored):
+        ids, _ = stored
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+            response = client.get("/keyframes/sessions/1/keyframes/page", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page["keyframes"]) <= 2
+            seen += [kf["id"] for kf in page["keyframes"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == ids
+
+    def test_invalid_cursor(self, client):
+        response = client.get("/keyframes/sessions/1/keyframes/page", params={"cursor": "!!"})
+        assert response.status_code == 400
+
+    def test_full_image_with_etag(self, client, stored):
+        ids, jpeg = stored
+        url = f"/keyframes/sessions/1/keyframes/{ids[0]}/image"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.content == jpeg
+        assert response.headers["etag"] == f'"{hashlib.sha256(jpeg).hexdigest()}"'
+        assert response.headers["cache-control"] == "no-cache"
+
+        revalidated = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+    def test_blob_image_served_from_file(self, client, monkeypatch, tmp_path):
+        store = BlobStore(str(tmp_path / "blobs"))
+        monkeypatch.setattr(blob_store_module, "blob_store", store)
+        monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "blob")
+        jpeg = cv2.imencode('.jpg', np.full((48, 64, 3), 200, dtype=np.uint8))[1].tobytes()
+        keyframe_id = client.post("/keyframes/keyframes", json={
+            "session_id": 1, "frame_data": base64.b64encode(jpeg).decode(), "keyframe_type": "top", "exercise": "squat"
+        }).json()["id"]
+        url = f"/keyframes/sessions/1/keyframes/{keyframe_id}/image"
+
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.content == jpeg
+        assert response.headers["etag"] == f'"{hashlib.sha256(jpeg).hexdigest()}"'
+
+        store.path_for(hashlib.sha256(jpeg).hexdigest()).unlink()
+        assert client.get(url).status_code == 404
+
+    def test_versioned_url_is_immutable(self, client, monkeypatch, tmp_path):
+        monkeypatch.setattr(blob_store_module, "blob_store", BlobStore(str(tmp_path / "blobs")))
+        monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "blob")
+        jpeg = cv2.imencode('.jpg', np.full((48, 64, 3), 200, dtype=np.uint8))[1].tobytes()
+        stored = client.post("/keyframes/keyframes", json={
+            "session_id": 1, "frame_data": base64.b64encode(jpeg).decode(), "keyframe_type": "top", "exercise": "squat"
+        }).json()
+        digest = hashlib.sha256(jpeg).hexdigest()
+        assert stored["image_digest"] == digest
+        listed = client.get("/keyframes/sessions/1/keyframes/page").json()["keyframes"]
+        assert [kf["image_digest"] for kf in listed if kf["id"] == stored["id"]] == [digest]
+
+        url = f"/keyframes/sessions/1/keyframes/{stored['id']}/image"
+        response = client.get(url, params={"v": digest})
+        assert response.content == jpeg
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        # A digest from before a re-encode must not be cached as the current image
+        assert client.get(url, params={"v": "stale"}).headers["cache-control"] == "no-cache"
+        assert client.get(url).headers["cache-control"] == "no-cache"
+
+    def test_thumbnail(self, client, stored):
+        ids, _ = stored
+        response = client.get(f"/keyframes/sessions/1/keyframes/{ids[0]}/image", params={"size": "thumb"})
+        assert response.status_code == 200
+        thumb = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        assert thumb.shape[:2] == (240, 320)
+        assert response.headers["etag"].endswith('-t320"')
+
+    def test_image_of_other_session_is_404(self, client, stored):
+        ids, _ = stored
+        assert client.get(f"/keyframes/sessions/2/keyframes/{ids[0]}/image").status_code == 404
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from app.db.models import AnnotatedFrame
+from app.services.keyframe_eval import squat_landmarks
+from app.services.keyframe_selector import keyframe_features, select_keyframes
+from app.services.keyframe_storage import pack_landmarks
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def _keyframe(i, keyframe_type, knee, hip=170.0):
+    return AnnotatedFrame(
+        id=i + 1, session_id=1, exercise="squat", keyframe_type=keyframe_type,
+        timestamp=START + timedelta(seconds=i), landmarks_packed=pack_landmarks(squat_landmarks(knee, hip)),
+    )
+
+
+def _squat_session():
+    """Warm-up frames, then four reps; rep 3 is the deepest and rep 4 leans forward"""
+    keyframes = [_keyframe(i, "middle", 175.0) for i in range(5)]
+    for rep, (depth, hip) in enumerate([(100, 150), (95, 150), (70, 150), (95, 60)]):
+        base = len(keyframes)
+        keyframes.append(_keyframe(base, "bottom", depth, hip))
+        keyframes.append(_keyframe(base + 1, "top", 175.0 - rep))
+    return keyframes
+
+
+class TestKeyframeSelector:
+    """Test suite for choosing informative keyframes for analysis"""
+
+    def test_features_track_reps(self):
+        features = keyframe_features(_squat_session(), "squat")
+        assert [f.rep for f in features][-3:] == [2, 3, 3]
+        assert abs(features[-2].angle - 95.0) < 1.0
+        assert "back_round" in features[-2].flags
+
+    def test_picks_deepest_top_and_worst_form(self):
+        keyframes = _squat_session()
+        selected = select_keyframes(keyframes, "squat", 3)
+        by_reason = {s.reason.split(":")[0]: s.keyframe for s in selected}
+
+        assert by_reason["deepest bottom position"].id == keyframes[9].id  # rep 3 bottom, 70 degrees
+        assert by_reason["representative top position"].keyframe_type == "top"
+        assert by_reason["form issues"].id == keyframes[11].id  # rep 4 bottom, leaning forward
+        assert [s.keyframe.timestamp for s in selected] == sorted(s.keyframe.timestamp for s in selected)
+
+    def test_fills_with_reps_not_warm_up(self):
+        keyframes = _squat_session()
+        selected = select_keyframes(keyframes, "squat", 6)
+        assert len(selected) == 6
+        assert len({s.keyframe.id for s in selected}) == 6
+        warm_up = {kf.id for kf in keyframes[:5]}
+        assert sum(s.keyframe.id in warm_up for s in selected) <= 1
+
+    def test_small_and_empty_sessions(self):
+        keyframes = _squat_session()[:2]
+        assert len(select_keyframes(keyframes, "squat", 8)) == 2
+        assert select_keyframes([], "squat", 8) == []
+
+    def test_keyframes_without_landmarks(self):
+        keyframes = [
+            AnnotatedFrame(id=i + 1, session_id=1, exercise="squat", keyframe_type="middle",
+                           timestamp=START + timedelta(seconds=i))
+            for i in range(10)
+        ]
+        selected = select_keyframes(keyframes, "squat", 3)
+        assert [s.keyframe.id for s in selected] == [1, 5, 10]
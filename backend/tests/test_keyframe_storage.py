@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy.pool import StaticPool
+from app.core.config import settings
+from app.db.migrations import SCHEMA_VERSION, current_version, run_migrations
+from app.db.models import AnnotatedFrame, SessionDB
+from app.services.keyframe_storage import (
+    keyframe_landmarks,
+    load_frame_b64,
+    load_frame_bytes,
+    pack_landmarks,
+    unpack_landmarks,
+    unpack_landmarks_array,
+)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "db")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+class TestKeyframeStorage:
+    """Test suite for binary keyframe image and landmark encoding"""
+
+    def test_pack_round_trip(self):
+        landmarks = [{'name': 'LEFT_HIP', 'x': 0.25, 'y': 0.5}, {'name': 'RIGHT_KNEE', 'x': 0.75, 'y': 1.0}]
+        packed = pack_landmarks(landmarks)
+        assert len(packed) == 1 + 33 * 2 * 4
+        assert unpack_landmarks(packed) == landmarks
+
+    def test_pack_float16_and_enum_ids(self):
+        """MediaPipe ids are accepted as names and float16 halves the size"""
+        packed = pack_landmarks([{'name': 23, 'x': 100, 'y': 200}], dtype=np.float16)
+        assert len(packed) == 1 + 33 * 2 * 2
+        assert unpack_landmarks_array(packed).dtype == np.float16
+        assert unpack_landmarks(packed) == [{'name': 'LEFT_HIP', 'x': 100.0, 'y': 200.0}]
+
+    def test_pack_empty(self):
+        assert pack_landmarks([]) is None
+        assert unpack_landmarks(None) == []
+
+    def test_legacy_json_landmarks(self):
+        frame = AnnotatedFrame(
+            session_id=1, keyframe_type='top', timestamp=datetime.now(), exercise='squat',
+            pose_landmarks=json.dumps([{'name': 25, 'x': 1, 'y': 2}])
+        )
+        assert keyframe_landmarks(frame) == [{'name': 'LEFT_KNEE', 'x': 1, 'y': 2}]
+
+    def test_migration_converts_legacy_rows(self, engine):
+        """v1 moves base64 text and JSON landmarks into binary columns"""
+        jpeg = b'\xff\xd8\xff\xe0fake-jpeg'
+        with Session(engine) as db:
+            db.add(SessionDB(id=1, exercise='squat', start_ts=datetime.now()))
+            db.add(AnnotatedFrame(
+                session_id=1, keyframe_type='bottom', timestamp=datetime.now(), exercise='squat',
+                frame_data=base64.b64encode(jpeg).decode(),
+                pose_landmarks=json.dumps([{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}])
+            ))
+            db.add(AnnotatedFrame(
+                session_id=1, keyframe_type='top', timestamp=datetime.now(), exercise='squat',
+                frame_data='not_base64!'
+            ))
+            db.commit()
+
+        run_migrations(engine)
+        assert current_version(engine) == SCHEMA_VERSION
+
+        with Session(engine) as db:
+            converted, inline = db.exec(select(AnnotatedFrame).order_by(AnnotatedFrame.id)).all()
+            assert converted.frame_data == ""
+            assert converted.frame_bytes == jpeg
+            assert converted.pose_landmarks == "[]"
+            assert keyframe_landmarks(converted) == [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}]
+            assert load_frame_bytes(converted) == jpeg
+            assert load_frame_b64(converted) == base64.b64encode(jpeg).decode()
+            assert inline.frame_data == 'not_base64!'
+
+        # Already applied: running again is a no-op
+        run_migrations(engine)
+        assert current_version(engine) == SCHEMA_VERSION
@@ -0,0 +1,100 @@
+import threading
+import time
+from datetime import datetime
+import pytest
+from sqlmodel import Session, SQLModel, select, func
+from app.core.config import settings
+from app.db.models import AnnotatedFrame, SessionDB
+from app.db.session import make_engine
+from app.services.keyframe_storage import keyframe_landmarks, load_frame_bytes
+from app.services.keyframe_writer import KeyframeWriter
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "KEYFRAME_IMAGE_STORAGE", "db")
+    # File-backed so the writer thread and the test each use their own connection
+    engine = make_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([SessionDB(id=1, exercise="squat", start_ts=datetime.now()),
+                    SessionDB(id=2, exercise="pushup", start_ts=datetime.now())])
+        db.commit()
+    return engine
+
+
+def _count(engine, session_id=None):
+    query = select(func.count()).select_from(AnnotatedFrame)
+    if session_id is not None:
+        query = query.where(AnnotatedFrame.session_id == session_id)
+    with Session(engine) as db:
+        return db.exec(query).one()
+
+
+def _submit(writer, session_id, keyframe_type="bottom"):
+    writer.submit(session_id, "squat", keyframe_type, datetime.now(), {'LEFT_HIP': (0.5, 0.25)}, b'\xff\xd8jpeg')
+
+
+class TestKeyframeWriter:
+    """Test suite for write-behind keyframe persistence"""
+
+    def test_flush_commits_queued_keyframes(self, engine):
+        writer = KeyframeWriter(engine, flush_interval_ms=60_000)
+        _submit(writer, 1)
+        _submit(writer, 2)
+        assert writer.pending(1) == 1
+        assert writer.flush(1)
+        assert writer.pending() == 0
+        assert _count(engine) == 2  # Both sessions went out in the same batch
+
+        with Session(engine) as db:
+            row = db.exec(select(AnnotatedFrame).where(AnnotatedFrame.session_id == 1)).one()
+            assert load_frame_bytes(row) == b'\xff\xd8jpeg'
+            assert keyframe_landmarks(row) == [{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.25}]
+        writer.stop()
+
+    def test_batch_size_triggers_write(self, engine):
+        writer = KeyframeWriter(engine, flush_interval_ms=60_000, max_batch=3)
+        for _ in range(3):
+            _submit(writer, 1)
+        deadline = time.monotonic() + 5
+        while _count(engine) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _count(engine) == 3
+        assert writer.stats['batches'] == 1
+        writer.stop()
+
+    def test_interval_triggers_write(self, engine):
+        writer = KeyframeWriter(engine, flush_interval_ms=20)
+        _submit(writer, 1)
+        deadline = time.monotonic() + 5
+        while _count(engine) < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _count(engine) == 1
+        writer.stop()
+
+    def test_bad_row_does_not_drop_batch(self, engine):
+        writer = KeyframeWriter(engine, flush_interval_ms=60_000)
+        _submit(writer, 1)
+        writer.submit(1, "squat", None, datetime.now(), None, b"jpeg")  # keyframe_type is NOT NULL
+        _submit(writer, 2)
+        writer.flush()
+        assert _count(engine) == 2
+        assert writer.stats['failed'] == 1
+        writer.stop()
+
+    def test_stop_drains_concurrent_submits(self, engine):
+        writer = KeyframeWriter(engine, flush_interval_ms=5, max_batch=8)
+
+        def produce(session_id):
+            for _ in range(20):
+                _submit(writer, session_id)
+
+        threads = [threading.Thread(target=produce, args=(sid,)) for sid in (1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.stop()
+        assert _count(engine, 1) == 20
+        assert _count(engine, 2) == 20
@@ -0,0 +1,135 @@
+import threading
+from types import SimpleNamespace
+import httpx
+import pytest
+from google.genai import errors as genai_errors
+from app.services import tips
+from app.services.llm_client import CircuitBreaker, LLMClient, LLMError, LLMUnavailableError
+
+
+class FakeModels:
+    """generate_content that replays scripted outcomes (exceptions or text)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append(config.http_options.timeout)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(text=outcome)
+
+
+def _client(models, **kwargs):
+    factory_calls = []
+
+    def factory():
+        factory_calls.append(1)
+        return SimpleNamespace(models=models)
+
+    options = dict(backoff_base_sec=0.0, breaker_failures=3, client_factory=factory) | kwargs
+    client = LLMClient(**options)
+    client.factory_calls = factory_calls
+    return client
+
+
+def _server_error(code=503):
+    return genai_errors.ServerError(code, {"error": {"code": code, "message": "unavailable", "status": "UNAVAILABLE"}})
+
+
+class TestLLMClient:
+    """Test suite for the shared Gemini client"""
+
+    def test_reuses_one_client_with_deadline(self):
+        models = FakeModels(" cue one \n")
+        client = _client(models, timeout_sec=5.0)
+        assert client.generate("prompt") == "cue one"
+        assert client.generate("prompt") == "cue one"
+        assert client.factory_calls == [1]
+        assert 0 < models.calls[0] <= 5000  # Per-attempt HTTP timeout in ms
+
+    def test_retries_transient_errors(self):
+        models = FakeModels(httpx.ReadTimeout("slow"), _server_error(), "ok")
+        assert _client(models, max_retries=2).generate("prompt") == "ok"
+        assert len(models.calls) == 3
+
+    def test_does_not_retry_client_errors(self):
+        bad_request = genai_errors.ClientError(400, {"error": {"code": 400, "message": "bad", "status": "INVALID"}})
+        models = FakeModels(bad_request)
+        with pytest.raises(LLMError):
+            _client(models).generate("prompt")
+        assert len(models.calls) == 1
+
+    def test_gives_up_after_max_retries(self):
+        models = FakeModels(_server_error())
+        with pytest.raises(LLMError):
+            _client(models, max_retries=2).generate("prompt")
+        assert len(models.calls) == 3
+
+    def test_circuit_opens_and_refuses_calls(self):
+        models = FakeModels(_server_error())
+        client = _client(models, max_retries=0, breaker_failures=2)
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                client.generate("prompt")
+        with pytest.raises(LLMUnavailableError):
+            client.generate("prompt")
+        assert len(models.calls) == 2
+        assert client.breaker.state == "open"
+
+    def test_refuses_when_saturated(self):
+        started, release = threading.Event(), threading.Event()
+
+        class SlowModels:
+            def generate_content(self, model, contents, config=None):
+                started.set()
+                release.wait(5)
+                return SimpleNamespace(text="ok")
+
+        client = _client(SlowModels(), max_concurrency=1)
+        thread = threading.Thread(target=client.generate, args=("prompt",))
+        thread.start()
+        started.wait(5)
+        with pytest.raises(LLMUnavailableError):
+            client.generate("prompt")
+        release.set()
+        thread.join()
+        assert client.generate("prompt") == "ok"
+
+    def test_unconfigured(self):
+        with pytest.raises(LLMUnavailableError):
+            LLMClient(api_key=None).generate("prompt")
+
+
+class TestCircuitBreaker:
+    def test_half_open_probe(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_sec=10.0, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        now[0] = 11.0
+        assert breaker.state == "half-open"
+        assert breaker.allow()  # One probe...
+        assert not breaker.allow()  # ...at a time
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        now[0] = 22.0
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow()
+
+
+class TestTipsFallback:
+    def test_gemini_tips_empty_when_upstream_fails(self, monkeypatch):
+        monkeypatch.setattr(tips, "llm_client", _client(FakeModels(_server_error()), max_retries=0))
+        assert tips.gemini_tips("squat", ["knees_in"], "beginner") == []
+
+    def test_gemini_tips_parses_bullets(self, monkeypatch):
+        monkeypatch.setattr(tips, "llm_client", _client(FakeModels("- Brace core\n- Knees out\n")))
+        assert tips.gemini_tips("squat", [], "beginner") == ["Brace core", "Knees out"]
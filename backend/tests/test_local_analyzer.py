@@ -0,0 +1,162 @@
+import contextlib
+import io
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel
+from app.db.models import AnnotatedFrame
+from app.db.session import make_engine
+from app.schemas.posture_analysis import PostureAnalysis
+from app.services import gemini_service, local_analyzer
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_jobs import ANALYSIS_PROVIDERS
+from app.services.gemini_service import GeminiPostureAnalyzer
+from app.services.keyframe_detector import KeyframeDetector
+from app.services.keyframe_eval import FRAME_INTERVAL, squat_landmarks
+from app.services.keyframe_storage import pack_landmarks
+from app.services.llm_client import LLMError
+from app.services.local_analyzer import (
+    DEFAULT_REFERENCES, HedgedPostureAnalyzer, LocalPostureAnalyzer, local_suggestions, reference_ranges,
+)
+from app.services.prompt_budget import ImageBudget
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def _squat_session(depth=20.0, lean=0.0, reps=4, stop_at=None):
+    """
+    Keyframes KeyframeDetector stores for `reps` squats from standing (178°)
+    down to a knee angle of `depth` and back; the hip angle stays `lean`
+    degrees below the knee angle. `stop_at` ends the set in the hole at that
+    knee angle.
+    """
+    down = list(np.linspace(178.0, depth, 27))
+    knees = (down + down[::-1]) * reps + (list(np.linspace(178.0, stop_at, 27)) if stop_at else [])
+    detector = KeyframeDetector()
+    keyframes = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, knee in enumerate(knees):
+            landmarks = squat_landmarks(knee, knee - lean)
+            timestamp = START + i * FRAME_INTERVAL
+            keyframe_type, _ = detector.should_save_keyframe(1, "squat", landmarks, timestamp)
+            if keyframe_type:
+                keyframes.append(AnnotatedFrame(
+                    id=len(keyframes) + 1, session_id=1, exercise="squat", keyframe_type=keyframe_type,
+                    timestamp=timestamp, landmarks_packed=pack_landmarks(landmarks),
+                ))
+    return keyframes
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'local.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(_squat_session())
+        db.commit()
+    return engine
+
+
+class TestReferenceRanges:
+    def test_from_csv(self):
+        squat = reference_ranges()["squat"]
+        assert squat.bottom[0] < squat.bottom[1] < squat.top[0] < squat.top[1] <= 180
+        assert 60 < squat.bottom[1] < 100
+
+    def test_defaults_without_csv(self, tmp_path):
+        assert reference_ranges(tmp_path / "missing.csv") == DEFAULT_REFERENCES
+
+
+class TestLocalSuggestions:
+    """Test suite for deterministic, landmark-based posture analysis"""
+
+    def test_deep_consistent_squats(self):
+        suggestions = local_suggestions(_squat_session(), "squat")
+        PostureAnalysis(**suggestions)
+        assert "4 of 4 reps reached the reference depth" in suggestions["overall_assessment"]
+        assert "Every rep reached the reference depth" in suggestions["strengths"]
+        assert suggestions["specific_suggestions"] == []
+
+    def test_shallow_squats(self, monkeypatch):
+        # Squats past the detector's middle threshold against a deeper reference
+        references = {"squat": local_analyzer.ReferenceRanges(bottom=(10.0, 40.0), top=(176.6, 179.6), bottom_hip=(26.0, 80.9))}
+        monkeypatch.setattr(local_analyzer, "reference_ranges", lambda: references)
+        suggestions = local_suggestions(_squat_session(), "squat")
+        PostureAnalysis(**suggestions)
+        top = suggestions["specific_suggestions"][0]
+        assert top["priority"] == "High" and "reference depth (100% of reps)" in top["issue"]
+        assert "Descend until hips reach knee level for a full rep." in suggestions["exercise_specific_tips"]
+        assert suggestions["next_session_focus"] == top["suggestion"]
+
+    def test_set_ended_at_the_bottom(self):
+        suggestions = local_suggestions(_squat_session(stop_at=20.0), "squat")
+        assert "5 of 5 reps reached the reference depth" in suggestions["overall_assessment"]
+        issues = [s["issue"] for s in suggestions["specific_suggestions"]]
+        assert issues == ["Incomplete lockout at the top (20% of reps)"]
+
+    def test_forward_lean_uses_flag_vocabulary(self):
+        suggestions = local_suggestions(_squat_session(lean=35.0), "squat")
+        issues = [s["suggestion"] for s in suggestions["specific_suggestions"]]
+        assert "Brace your core and keep chest up to avoid rounding." in issues
+
+    def test_no_landmarks(self):
+        keyframes = [AnnotatedFrame(id=1, session_id=1, exercise="squat", keyframe_type="top", timestamp=START)]
+        suggestions = local_suggestions(keyframes, "squat")
+        PostureAnalysis(**suggestions)
+        assert suggestions["specific_suggestions"][0]["issue"] == "No pose data captured"
+
+    def test_is_fast(self):
+        keyframes = _squat_session(reps=100)
+        local_suggestions(keyframes, "squat")
+        started = time.perf_counter()
+        local_suggestions(keyframes, "squat")
+        assert time.perf_counter() - started < 0.5
+
+
+class TestProviders:
+    def test_local_provider(self, engine):
+        assert isinstance(ANALYSIS_PROVIDERS["local"](), LocalPostureAnalyzer)
+        with Session(engine) as db:
+            result = LocalPostureAnalyzer().analyze_session_posture(1, "squat", db)
+        assert result["status"] == "success" and result["total_keyframes"] == 10
+        PostureAnalysis(**result["suggestions"])
+
+    def test_hedged_returns_local_when_llm_is_slow(self, engine):
+        release = threading.Event()
+
+        class SlowAnalyzer:
+            def analyze_session_posture(self, session_id, exercise, db):
+                release.wait(5)
+                return {"status": "success", "suggestions": {"overall_assessment": "llm"}}
+
+        hedged = HedgedPostureAnalyzer(SlowAnalyzer, budget_sec=0.1)
+        with Session(engine) as db:
+            result = hedged.analyze_session_posture(1, "squat", db)
+        release.set()
+        assert result["suggestions"]["overall_assessment"].startswith("Measured")
+
+    def test_hedged_prefers_llm_within_budget(self, engine):
+        class FastAnalyzer:
+            def analyze_session_posture(self, session_id, exercise, db):
+                return {"status": "success", "suggestions": {"overall_assessment": "llm"}}
+
+        with Session(engine) as db:
+            result = HedgedPostureAnalyzer(FastAnalyzer, budget_sec=5).analyze_session_posture(1, "squat", db)
+        assert result["suggestions"] == {"overall_assessment": "llm"}
+
+    def test_gemini_failure_falls_back_to_local(self, engine, monkeypatch):
+        monkeypatch.setattr(gemini_service, "analysis_cache", AnalysisCache(engine=engine, ttl_sec=60))
+
+        def generate(contents, model=None, timeout_sec=None):
+            raise LLMError("upstream down")
+
+        analyzer = GeminiPostureAnalyzer.__new__(GeminiPostureAnalyzer)  # No API key needed
+        analyzer.llm = SimpleNamespace(generate=generate)
+        analyzer.image_budget = ImageBudget(max_tokens=8000, max_bytes=512 * 1024, max_images=4)
+        with Session(engine) as db:
+            result = analyzer.analyze_session_posture(1, "squat", db)
+        assert result["status"] == "success"
+        assert "reference depth" in result["suggestions"]["overall_assessment"]
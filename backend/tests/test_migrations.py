@@ -0,0 +1,146 @@
+import re
+from datetime import datetime
+from typing import List
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, inspect, text
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+from app.api.routes import auth as auth_routes
+from app.db.migrations import SCHEMA_VERSION, current_version, run_migrations
+from app.db.models import AnnotatedFrame, SessionDB, SessionMetric, SessionRollup, User
+from app.db.session_data import (
+    add_flags_to_session, add_metric_to_rollup, count_keyframes, keyframe_metadata, keyframe_metadata_page,
+    rebuild_rollup, sample_keyframes,
+)
+from app.schemas.user import UserCreate
+from app.services.blob_store import BlobStore
+
+
+def _engine():
+    return create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+@pytest.fixture
+def engine():
+    engine = _engine()
+    run_migrations(engine)
+    return engine
+
+
+def _executed_plans(engine, run) -> List[str]:
+    """SQLite EXPLAIN QUERY PLAN detail lines of each SELECT that run(db) executes"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as db:
+            run(db)
+            db.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    with engine.connect() as conn:
+        return [
+            " | ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all())
+            for statement, parameters in statements
+        ]
+
+
+def _login(db):
+    """POST /auth/login's lookup (the unknown user is rejected after it)"""
+    with pytest.raises(HTTPException):
+        auth_routes.login(UserCreate(email="a@b.c", password="x"), db)
+
+
+class TestMigrations:
+    """Test suite for versioned migrations and hot-query indexes"""
+
+    def test_fresh_database_is_current(self, engine):
+        assert current_version(engine) == SCHEMA_VERSION
+        run_migrations(engine)  # Idempotent
+        assert current_version(engine) == SCHEMA_VERSION
+
+    def test_legacy_database_gets_indexes(self):
+        """Tables created before the indexes were declared are upgraded in place"""
+        engine = _engine()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE annotatedframe (id INTEGER PRIMARY KEY, session_id INTEGER, "
+                "frame_data VARCHAR, keyframe_type VARCHAR, timestamp DATETIME, exercise VARCHAR, "
+                "pose_landmarks VARCHAR)"
+            ))
+            conn.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, full_name VARCHAR, email VARCHAR, hashed_password VARCHAR)"))
+        run_migrations(engine)
+
+        indexes = {ix["name"] for ix in inspect(engine).get_indexes("annotatedframe")}
+        assert {"ix_annotatedframe_session_id_timestamp", "ix_annotatedframe_frame_ref"} <= indexes
+        assert "ux_user_email" in {ix["name"] for ix in inspect(engine).get_indexes("user")}
+
+    def test_rollups_backfilled(self):
+        """v3 builds SessionRollup rows for metrics ingested before rollups existed"""
+        engine = _engine()
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(SessionDB(id=1, exercise="squat", start_ts=datetime.now()))
+            db.add_all([SessionMetric(session_id=1, reps=r, avg_score=0.5, duration_sec=10, ts=datetime.now())
+                        for r in (2, 3)])
+            db.commit()
+        run_migrations(engine)
+        with Session(engine) as db:
+            rollup = db.get(SessionRollup, 1)
+            assert (rollup.metric_count, rollup.reps_sum, rollup.duration_sum) == (2, 5, 20)
+
+    def test_duplicate_emails_block_unique_index(self):
+        engine = _engine()
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE user (id INTEGER PRIMARY KEY, full_name VARCHAR, email VARCHAR, hashed_password VARCHAR)"))
+            conn.execute(text("INSERT INTO user (email, hashed_password) VALUES ('a@b.c', 'x'), ('a@b.c', 'y')"))
+        with pytest.raises(RuntimeError, match="duplicate"):
+            run_migrations(engine)
+
+    def test_unique_email_enforced(self, engine):
+        with Session(engine) as db:
+            db.add(User(email="a@b.c", hashed_password="x"))
+            db.commit()
+            db.add(User(email="a@b.c", hashed_password="y"))
+            with pytest.raises(Exception):
+                db.commit()
+
+    @pytest.mark.parametrize("name, run, index, sorts", [
+        ("keyframe list", lambda db, tmp: keyframe_metadata(db, 1), "ix_annotatedframe_session_id_timestamp", False),
+        ("keyframe page",
+         lambda db, tmp: keyframe_metadata_page(db, 1, after=(datetime(2024, 1, 1), 3), limit=2),
+         "ix_annotatedframe_session_id_timestamp", False),
+        ("keyframe count", lambda db, tmp: count_keyframes(db, 1), "ix_annotatedframe_session_id_timestamp", False),
+        # Per-type counts and the window's partition sort one session's rows; the output is in index order
+        ("keyframe sample", lambda db, tmp: list(sample_keyframes(db, 1, limit=4)),
+         "ix_annotatedframe_session_id_timestamp", True),
+        ("blob refcount", lambda db, tmp: BlobStore(str(tmp)).release(db, ["ab"]), "ix_annotatedframe_frame_ref", False),
+        ("metric ingest",
+         lambda db, tmp: add_metric_to_rollup(db, SessionMetric(session_id=1, ts=datetime(2024, 1, 1))),
+         "INTEGER PRIMARY KEY", False),
+        ("flags at stop",
+         lambda db, tmp: add_flags_to_session(db, 1, {"frames": 1, "reps": 0, "counts": {}}, datetime(2024, 1, 1)),
+         "ix_sessionmetric_session_id_ts", False),
+        ("rollup rebuild", lambda db, tmp: rebuild_rollup(db, 1), "ix_sessionmetric_session_id_ts", False),
+        ("login", lambda db, tmp: _login(db), "ux_user_email", False),
+    ])
+    def test_route_queries_use_indexes(self, engine, tmp_path, name, run, index, sorts):
+        """Plans of the statements the route helpers actually run"""
+        with Session(engine) as db:
+            db.add(SessionDB(id=1, exercise="squat", start_ts=datetime(2024, 1, 1)))
+            db.add(SessionMetric(session_id=1, ts=datetime(2024, 1, 1)))
+            db.add_all([AnnotatedFrame(session_id=1, keyframe_type=kind, timestamp=datetime(2024, 1, 1, 0, 0, i),
+                                       exercise="squat") for i, kind in enumerate(["top", "middle", "bottom"] * 3)])
+            db.commit()
+
+        plans = _executed_plans(engine, lambda db: run(db, tmp_path))
+        assert plans, f"{name} ran no SELECT"
+        assert any(index in plan for plan in plans), f"{name}: {plans}"
+        for plan in plans:
+            assert not re.search(r"\bSCAN (annotatedframe|sessionmetric|sessionrollup|user)\b", plan), f"{name}: {plan}"
+            assert sorts or "TEMP B-TREE" not in plan, f"{name} sorts in memory: {plan}"
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from app.services.plank_analyzer import PlankAnalyzer, body_line_deviation
+
+
+def _plank(hip_y):
+    return [
+        {'name': 'LEFT_SHOULDER', 'x': 0.2, 'y': 0.5},
+        {'name': 'LEFT_HIP', 'x': 0.5, 'y': hip_y},
+        {'name': 'LEFT_ANKLE', 'x': 0.8, 'y': 0.5},
+    ]
+
+
+class TestPlankAnalyzer:
+    """Test suite for PlankAnalyzer"""
+
+    def setup_method(self):
+        self.analyzer = PlankAnalyzer(capacity=8)
+        self.timestamp = datetime.now()
+
+    def test_body_line_deviation_sign(self):
+        """Hips below the line are positive (sag), above are negative (pike)"""
+        assert abs(body_line_deviation(_plank(0.5))) < 1e-6
+        assert body_line_deviation(_plank(0.6)) > 0
+        assert body_line_deviation(_plank(0.35)) < 0
+        assert body_line_deviation([{'name': 'LEFT_HIP', 'x': 0.5, 'y': 0.5}]) is None
+
+    def test_ring_buffer_is_fixed_size(self):
+        """Long holds do not grow per-session memory"""
+        for i in range(500):
+            self.analyzer.update(1, _plank(0.5), self.timestamp + timedelta(seconds=i))
+
+        state = self.analyzer.sessions[1]
+        assert state['buffer'].shape == (8,)
+        assert state['samples'] == 8
+        assert self.analyzer.get_stats(1)['hold_seconds'] == 499.0
+
+    def test_downsampling_skips_close_frames(self):
+        """Frames closer than the sample interval are not buffered"""
+        for i in range(10):
+            self.analyzer.update(1, _plank(0.5), self.timestamp + timedelta(milliseconds=100 * i))
+        assert self.analyzer.sessions[1]['samples'] == 2
+
+    def test_pike_and_recovery(self):
+        """Quality keyframes fire on each change, counting pike events"""
+        emitted = []
+        hips = [0.5] * 3 + [0.35] * 4 + [0.5] * 4
+        for i, hip_y in enumerate(hips):
+            keyframe = self.analyzer.update(1, _plank(hip_y), self.timestamp + timedelta(seconds=i))
+            if keyframe:
+                emitted.append(keyframe)
+
+        assert emitted == ['plank_good', 'plank_pike', 'plank_good']
+        assert self.analyzer.get_stats(1)['pike_events'] == 1
+
+    def test_missing_landmarks_pause_hold(self):
+        """Frames without a body line do not add hold time"""
+        self.analyzer.update(1, _plank(0.5), self.timestamp)
+        self.analyzer.update(1, [], self.timestamp + timedelta(seconds=1))
+        self.analyzer.update(1, _plank(0.5), self.timestamp + timedelta(seconds=2))
+        assert self.analyzer.get_stats(1)['hold_seconds'] == 0.0
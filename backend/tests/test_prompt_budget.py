@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+from google.genai import types
+from app.services.gemini_service import GeminiPostureAnalyzer
+from app.services.prompt_budget import ImageBudget, evenly_spaced, image_tokens
+
+
+def _jpeg(width=1280, height=720, seed=0) -> bytes:
+    # Noise keeps the JPEG from compressing to almost nothing
+    image = np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def _side(jpeg: bytes) -> int:
+    return max(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape[:2])
+
+
+class TestImageBudget:
+    """Test suite for fitting keyframe images into an analysis request"""
+
+    def test_image_tokens(self):
+        assert image_tokens(384, 216) == 258
+        assert image_tokens(1280, 720) == 2 * 258
+
+    def test_evenly_spaced(self):
+        assert evenly_spaced(3, 9) == [0, 4, 8]
+        assert evenly_spaced(5, 3) == [0, 1, 2]
+        assert evenly_spaced(1, 5) == [2]
+
+    def test_generous_budget_uses_largest_side(self):
+        budget = ImageBudget(max_tokens=10_000, max_bytes=10_000_000, max_images=4)
+        plan = budget.plan([_jpeg(seed=i) for i in range(10)])
+        assert plan.side == 384 and plan.indices == [0, 3, 6, 9]
+        assert all(_side(image) == 384 for image in plan.images)
+        assert plan.tokens == 4 * 258
+
+    def test_token_budget_limits_count(self):
+        budget = ImageBudget(max_tokens=1000, max_bytes=10_000_000, max_images=8)
+        plan = budget.plan([_jpeg(seed=i) for i in range(8)], reserved_tokens=400)
+        assert len(plan.images) == 2  # (1000 - 400) // 258
+
+    def test_byte_budget_lowers_resolution_then_count(self):
+        images = [_jpeg(seed=i) for i in range(4)]
+        full = ImageBudget(max_tokens=10_000, max_bytes=10_000_000, max_images=4).plan(images)
+        smallest = ImageBudget(10_000, 10_000_000, 4, sides=(192,)).plan(images)
+
+        fits_smaller = ImageBudget(max_tokens=10_000, max_bytes=full.bytes - 1, max_images=4).plan(images)
+        assert fits_smaller.side < 384 and len(fits_smaller.images) == 4
+        assert fits_smaller.bytes < full.bytes
+
+        fits_fewer = ImageBudget(max_tokens=10_000, max_bytes=smallest.bytes // 2, max_images=4).plan(images)
+        assert fits_fewer.side == 192 and 0 < len(fits_fewer.images) < 4
+        assert fits_fewer.bytes <= smallest.bytes // 2
+
+    def test_skips_missing_and_undecodable_images(self):
+        budget = ImageBudget(max_tokens=10_000, max_bytes=10_000_000, max_images=4)
+        plan = budget.plan([None, b"not a jpeg", _jpeg()])
+        assert plan.indices == [2]
+
+
+class TestAnalysisRequestParts:
+    """Images go into the request as inline JPEG parts, not prompt text"""
+
+    def test_build_contents(self):
+        analyzer = GeminiPostureAnalyzer.__new__(GeminiPostureAnalyzer)  # No API client needed
+        analyzer.image_budget = ImageBudget(max_tokens=10_000, max_bytes=10_000_000, max_images=2)
+        analysis_data = {
+            "exercise": "squat",
+            "total_keyframes": 2,
+            "keyframes": [
+                {"keyframe_type": kf_type, "timestamp": "2024-01-01T10:00:00",
+                 "landmarks": [{"name": "LEFT_HIP", "x": 0.5, "y": 0.6}], "image": _jpeg(seed=i)}
+                for i, kf_type in enumerate(["top", "bottom"])
+            ],
+        }
+        prompt = analyzer._create_analysis_prompt(analysis_data, "squat")
+        assert "LEFT_HIP" in prompt and "JSON format" in prompt
+
+        plan = analyzer.image_budget.plan([kf["image"] for kf in analysis_data["keyframes"]])
+        contents = analyzer._build_contents(analysis_data, "squat", plan)
+        parts = [part for part in contents if isinstance(part, types.Part)]
+        assert len(parts) == 2
+        assert parts[0].inline_data.mime_type == "image/jpeg"
+        assert _side(parts[0].inline_data.data) == 384
+        text = "".join(part for part in contents if isinstance(part, str))
+        assert text == prompt
+        assert len(text) < 5000
@@ -0,0 +1,187 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select, func
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from app.db.models import AnnotatedFrame, SessionDB, SessionMetric, SessionRollup
+from app.db.session_data import (
+    add_flags_to_session, add_metric_to_rollup, count_keyframes, delete_keyframes, delete_session_cascade,
+    keyframe_metadata, keyframes_by_id, keyframes_without_images, rebuild_rollup, sample_keyframes, sample_quotas,
+    sample_size
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        for sid in (1, 2):
+            db.add(SessionDB(id=sid, exercise="squat", start_ts=datetime.now()))
+            db.add(SessionMetric(session_id=sid, reps=5, avg_score=0.9, duration_sec=30, ts=datetime.now()))
+            for i in range(3):
+                db.add(AnnotatedFrame(
+                    session_id=sid, keyframe_type="top", timestamp=datetime.now(), exercise="squat",
+                    frame_ref="shared" if i else f"own{sid}", frame_bytes=b"x" * 1000
+                ))
+        db.commit()
+    return engine
+
+
+def _statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    return statements
+
+
+class TestSessionData:
+    """Test suite for set-based session data counts and deletes"""
+
+    def test_count_keyframes(self, engine):
+        with Session(engine) as db:
+            statements = _statements(engine)
+            assert count_keyframes(db, 1) == 3
+            assert count_keyframes(db, 99) == 0
+            assert all("frame_bytes" not in sql for sql in statements)
+
+    def test_delete_keyframes(self, engine):
+        with Session(engine) as db:
+            statements = _statements(engine)
+            deleted = delete_keyframes(db, 1)
+            db.commit()
+            assert deleted['keyframes'] == 3
+            assert sorted(deleted['frame_refs']) == ["own1", "shared"]
+            assert count_keyframes(db, 1) == 0
+            assert count_keyframes(db, 2) == 3
+            # Images are never selected
+            assert all("frame_bytes" not in sql for sql in statements)
+
+    def test_delete_session_cascade(self, engine):
+        with Session(engine) as db:
+            deleted = delete_session_cascade(db, 2)
+            db.commit()
+            assert (deleted['keyframes'], deleted['metrics'], deleted['sessions']) == (3, 1, 1)
+            assert db.get(SessionDB, 2) is None
+            assert db.exec(select(func.count()).select_from(SessionMetric)).one() == 1
+            assert count_keyframes(db, 1) == 3
+
+    def test_delete_missing_session(self, engine):
+        with Session(engine) as db:
+            assert delete_session_cascade(db, 99) == {'keyframes': 0, 'frame_refs': [], 'metrics': 0, 'sessions': 0}
+
+    def test_keyframe_metadata_skips_images(self, engine):
+        with Session(engine) as db:
+            statements = _statements(engine)
+            rows = keyframe_metadata(db, 1)
+            assert len(rows) == 3
+            assert rows[0].keyframe_type == "top"
+            assert all("frame_bytes" not in sql for sql in statements)
+
+    def test_deferred_then_loaded_by_id(self, engine):
+        with Session(engine) as db:
+            statements = _statements(engine)
+            keyframes = keyframes_without_images(db, 1)
+            assert all("frame_bytes" not in sql for sql in statements)
+
+            full = keyframes_by_id(db, [keyframes[0].id, keyframes[2].id])
+            n = len(statements)
+            assert [kf.frame_bytes for kf in full] == [b"x" * 1000] * 2
+            assert len(statements) == n  # Images came with the id query, no lazy loads
+
+    def test_sample_keyframes_spreads_in_sql(self, engine):
+        start = datetime(2024, 1, 1)
+        with Session(engine) as db:
+            db.add_all([
+                AnnotatedFrame(session_id=3, keyframe_type="top", timestamp=start + timedelta(seconds=i),
+                               exercise="squat", frame_bytes=b"x" * 1000)
+                for i in range(25)
+            ])
+            db.commit()
+
+        with Session(engine) as db:
+            statements = _statements(engine)
+            sampled = list(sample_keyframes(db, 3, limit=10, batch_size=4))
+            # 10 of 25 rows spread evenly, in time order, images not read
+            assert [(kf.timestamp - start).seconds for kf in sampled] == [0, 3, 5, 8, 10, 13, 15, 18, 20, 23]
+            assert all("frame_bytes" not in sql for sql in statements)
+            assert any("row_number() OVER" in sql for sql in statements)
+
+            assert len(list(sample_keyframes(db, 3, limit=25))) == 25
+            assert len(list(sample_keyframes(db, 1, limit=10))) == 3
+            assert list(sample_keyframes(db, 99, limit=10)) == []
+
+    @pytest.mark.parametrize("total", [960, 241, 7])
+    def test_sample_keyframes_keeps_every_phase(self, engine, total):
+        """The detector's top/middle/bottom/middle cycle must not alias with the sampling"""
+        start = datetime(2024, 1, 1)
+        cycle = ["top", "middle", "bottom", "middle"]
+        with Session(engine) as db:
+            db.add_all([
+                AnnotatedFrame(session_id=3, keyframe_type=cycle[i % 4], timestamp=start + timedelta(seconds=i),
+                               exercise="squat")
+                for i in range(total)
+            ])
+            db.commit()
+
+        limit = 240 if total > 7 else 5
+        with Session(engine) as db:
+            sampled = list(sample_keyframes(db, 3, limit=limit))
+            assert len(sampled) == sample_size(db, 3, limit) == limit
+            types = [kf.keyframe_type for kf in sampled]
+            # Each phase keeps its share of the session
+            assert abs(types.count("middle") - limit / 2) <= 1
+            assert abs(types.count("top") - limit / 4) <= 1 and abs(types.count("bottom") - limit / 4) <= 1
+            assert sampled == sorted(sampled, key=lambda kf: kf.timestamp)
+
+    def test_sample_quotas(self):
+        assert sample_quotas({"top": 3, "middle": 5}, 10) == {"top": 3, "middle": 5}
+        assert sample_quotas({"top": 61, "middle": 120, "bottom": 60}, 240) == {"top": 61, "middle": 119, "bottom": 60}
+        # A rare type keeps one row
+        assert sample_quotas({"top": 1000, "plank_pike": 2}, 10) == {"top": 9, "plank_pike": 1}
+
+    def test_rollup_matches_rebuild(self, engine):
+        """Incremental updates agree with the SQL aggregate rebuild"""
+        with Session(engine) as db:
+            for reps, score, flags in [(3, 0.5, '{"frames":10,"reps":3,"counts":{"knees_in":2}}'),
+                                       (4, 0.9, '["shallow_depth"]')]:
+                metric = SessionMetric(session_id=1, reps=reps, avg_score=score, duration_sec=10,
+                                       flags_json=flags, ts=datetime.now())
+                db.add(metric)
+                db.flush()
+                add_metric_to_rollup(db, metric)
+            db.commit()
+            incremental = db.get(SessionRollup, 1).model_dump()
+
+            # The fixture's metric predates the rollup, so a rebuild adds it
+            rebuilt = rebuild_rollup(db, 1).model_dump()
+            assert rebuilt['metric_count'] == incremental['metric_count'] + 1 == 3
+            assert rebuilt['reps_sum'] == incremental['reps_sum'] + 5 == 12
+            assert (rebuilt['score_min'], rebuilt['score_max']) == (0.5, 0.9)
+            assert json.loads(rebuilt['flags_json'])['counts'] == {'knees_in': 2, 'shallow_depth': 1}
+
+    def test_flags_at_stop_match_rebuild(self, engine):
+        """Flags folded in at stop land in the latest metric, so a rebuild keeps them"""
+        pending = {'frames': 4, 'reps': 1, 'counts': {'knees_in': 2}}
+        with Session(engine) as db:
+            rebuild_rollup(db, 1)
+            add_flags_to_session(db, 1, pending, datetime.now())
+            db.commit()
+            incremental = db.get(SessionRollup, 1).model_dump()
+            assert json.loads(incremental['flags_json'])['counts'] == {'knees_in': 2}
+            assert incremental['metric_count'] == 1
+            assert rebuild_rollup(db, 1).model_dump() == incremental
+
+            # No metrics yet: a flags-only one
+            db.add(SessionDB(id=3, exercise="squat", start_ts=datetime.now()))
+            add_flags_to_session(db, 3, pending, datetime.now())
+            db.commit()
+            assert db.get(SessionRollup, 3).model_dump() == rebuild_rollup(db, 3).model_dump()
+
+    def test_cascade_removes_rollup(self, engine):
+        with Session(engine) as db:
+            rebuild_rollup(db, 1)
+            db.commit()
+            delete_session_cascade(db, 1)
+            db.commit()
+            assert db.get(SessionRollup, 1) is None
@@ -22,3 +22,47 @@ def test_session_flow():
     data = r.json()
     assert data["total_reps"] >= 8
     assert data["exercise"] == "squat"
+
+def test_stop_releases_held_frames(monkeypatch):
+    """Frames waiting in the reorder window for a lost earlier frame are detected at stop"""
+    import base64
+    import cv2
+    import numpy as np
+    from app.api.routes import opencv
+    from app.services.frame_reorder import frame_reorder_buffer
+
+    detected = []
+    monkeypatch.setattr(opencv, "extract_pose", lambda image, session_id: "pose")
+    monkeypatch.setattr(opencv, "_detect", lambda session_id, exercise, item: detected.append(item[1]) or {})
+
+    sid = client.post("/sessions/start", json={"exercise": "squat"}).json()["session_id"]
+    frame = base64.b64encode(cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()).decode()
+    captured = ["2024-01-01T10:00:02", "2024-01-01T10:00:01"]
+    for seq, captured_at in zip((2, 1), captured):  # Frame 0 never arrives
+        r = client.post(f"/frames/{sid}", json={"frame": frame, "seq": seq, "captured_at": captured_at})
+        assert r.json()["status"] == "pending"
+    assert detected == []
+
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
+    assert client.post(f"/sessions/{sid}/stop", json={"ts": now}).status_code == 200
+    assert [d.second for d in detected] == [1, 2]
+    assert sid not in frame_reorder_buffer.sessions and sid not in frame_reorder_buffer.session_locks
+
+def test_stop_keeps_flags_counted_since_last_ingest():
+    """Flags of frames after the last metrics ingest still reach the summary"""
+    from app.services.form_flags import form_flag_detector
+    from app.services.keyframe_eval import squat_landmarks
+
+    sid = client.post("/sessions/start", json={"exercise": "squat"}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
+    form_flag_detector.update(sid, "squat", squat_landmarks(60.0, 20.0))
+    m = {"reps": 1, "avg_score": 0.8, "duration_sec": 5, "ts": now}
+    assert client.post(f"/sessions/{sid}/metrics", json=m).status_code == 200
+    for _ in range(2):  # Counted after the last ingest
+        form_flag_detector.update(sid, "squat", squat_landmarks(60.0, 20.0))
+
+    assert client.post(f"/sessions/{sid}/stop", json={"ts": now}).status_code == 200
+    data = client.get(f"/sessions/{sid}/summary").json()
+    assert data["flag_counts"] == {"back_round": 3}
+    assert data["avg_score"] == 0.8  # No extra metric skews the averages
+    assert sid not in form_flag_detector.sessions
@@ -0,0 +1,92 @@
+import threading
+import time
+from app.services.tips import DEFAULT_TIPS, TipsCache, common_combinations, rule_based_tips, tips_key
+
+
+class FakeFetch:
+    def __init__(self, source="gemini"):
+        self.source = source
+        self.calls = []
+        self.refreshed = threading.Event()
+
+    def __call__(self, exercise, flags, level):
+        self.calls.append((exercise, tuple(flags), level))
+        self.refreshed.set()
+        return [f"tip {len(self.calls)}"], self.source
+
+
+def _cache(fetch, now, **kwargs):
+    options = dict(ttl_sec=10.0, stale_sec=100.0, fallback_ttl_sec=1.0, clock=lambda: now[0]) | kwargs
+    return TipsCache(fetch=fetch, **options)
+
+
+class TestTipsCache:
+    """Test suite for the /tips response cache"""
+
+    def test_key_is_normalized(self):
+        assert tips_key("Squat ", ["knees_in", "back_round", "knees_in"], "Beginner") == \
+            tips_key("squat", ["back_round", "knees_in"], "beginner")
+
+    def test_hit_after_first_fetch(self):
+        fetch, now = FakeFetch(), [0.0]
+        cache = _cache(fetch, now)
+        assert cache.get("squat", ["knees_in", "back_round"], "beginner") == (["tip 1"], "gemini")
+        assert cache.get("SQUAT", ["back_round", "knees_in"], "beginner") == (["tip 1"], "gemini")
+        assert len(fetch.calls) == 1 and cache.stats['hits'] == 1
+
+    def test_stale_while_revalidate(self):
+        fetch, now = FakeFetch(), [0.0]
+        cache = _cache(fetch, now)
+        cache.get("squat", [], "beginner")
+        fetch.refreshed.clear()
+
+        now[0] = 50.0  # Past the TTL, within the stale window
+        assert cache.get("squat", [], "beginner") == (["tip 1"], "gemini")
+        assert fetch.refreshed.wait(5)
+        for _ in range(100):
+            if cache.get("squat", [], "beginner")[0] == ["tip 2"]:
+                break
+            time.sleep(0.01)  # The refresh stores its result just after fetching
+        assert cache.get("squat", [], "beginner") == (["tip 2"], "gemini")
+        cache.shutdown()
+
+    def test_expired_entries_are_fetched_inline(self):
+        fetch, now = FakeFetch(), [0.0]
+        cache = _cache(fetch, now)
+        cache.get("squat", [], "beginner")
+        now[0] = 200.0
+        assert cache.get("squat", [], "beginner") == (["tip 2"], "gemini")
+
+    def test_rule_based_answers_go_stale_sooner(self):
+        fetch, now = FakeFetch(source="rule-based"), [0.0]
+        cache = _cache(fetch, now)
+        cache.get("squat", [], "beginner")
+        now[0] = 2.0
+        cache.get("squat", [], "beginner")
+        assert cache.stats['stale'] == 1
+        cache.shutdown()
+
+    def test_lru_bound(self):
+        fetch, now = FakeFetch(), [0.0]
+        cache = _cache(fetch, now, max_entries=2)
+        cache.get("squat", [], "beginner")
+        cache.get("pushup", [], "beginner")
+        cache.get("squat", [], "beginner")  # Most recently used
+        cache.get("plank", [], "beginner")  # Evicts pushup
+        cache.get("squat", [], "beginner")
+        cache.get("pushup", [], "beginner")
+        assert [call[0] for call in fetch.calls] == ["squat", "pushup", "plank", "pushup"]
+
+    def test_warm(self):
+        fetch, now = FakeFetch(), [0.0]
+        cache = _cache(fetch, now)
+        combinations = common_combinations()
+        assert cache.warm(combinations) == len(combinations)
+        assert cache.warm(combinations) == 0
+        cache.get("squat", ["knees_in"], "beginner")
+        assert len(fetch.calls) == len(combinations)
+
+    def test_rule_based_tips_do_not_grow_the_bank(self):
+        before = list(DEFAULT_TIPS["squat"]["beginner"])
+        rule_based_tips("squat", ["knees_in"], "beginner")
+        assert DEFAULT_TIPS["squat"]["beginner"] == before
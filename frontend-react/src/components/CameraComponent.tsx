@@ -23,6 +23,8 @@ const CameraComponent: React.FC<CameraComponentProps> = ({
   const [isWorkoutActive, setIsWorkoutActive] = useState(false);
   const [repCount, setRepCount] = useState(0);
   const [isDetecting, setIsDetecting] = useState(false);
+  // Frames are sent without waiting for replies; the backend reorders them by seq
+  const frameSeqRef = useRef(0);
 
   const startWorkout = async () => {
     if (!videoRef.current) return;
@@ -113,7 +115,11 @@ const CameraComponent: React.FC<CameraComponentProps> = ({
       headers: { 
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ frame: base64Data }),
+      body: JSON.stringify({
+        frame: base64Data,
+        seq: frameSeqRef.current++,
+        captured_at: new Date().toISOString(),
+      }),
     })
     .then(response => {
       if (!response.ok) {
@@ -122,9 +128,10 @@ const CameraComponent: React.FC<CameraComponentProps> = ({
       return response.json();
     })
     .then(data => {
-      // Handle rep counting from backend
-      if (data.result && data.result.current_rep_count !== undefined) {
-        const newCount = data.result.current_rep_count;
+      // Handle rep counting from backend (pending frames still report the current count)
+      const currentRepCount = data.result?.current_rep_count ?? data.current_rep_count;
+      if (currentRepCount !== undefined) {
+        const newCount = currentRepCount;
         setRepCount(newCount);
         
         if (onRepCount) {
@@ -158,6 +165,7 @@ const CameraComponent: React.FC<CameraComponentProps> = ({
   // Send frames to backend
   useEffect(() => {
     if (isWorkoutActive && sessionId) {
+      frameSeqRef.current = 0;
       const interval = setInterval(() => {
         const canvas = canvasRef.current;
         if (canvas) {
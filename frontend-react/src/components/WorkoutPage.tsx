@@ -120,23 +120,38 @@ const WorkoutPage: React.FC = () => {
     setPostureAnalysis(null);
 
     try {
-      const response = await fetch(`${API_URLS.ANALYSIS}/analyze-and-cleanup/${sessionIdToAnalyze}`, {
+      // Queue the analysis (and cleanup) as a background job, then poll for its result
+      const response = await fetch(`${API_URLS.ANALYSIS}/jobs`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
+        body: JSON.stringify({ session_id: sessionIdToAnalyze, cleanup: true }),
       });
 
-      if (response.ok) {
-        const data = await response.json();
-        if (data.analysis && data.analysis.suggestions) {
-          setPostureAnalysis(data.analysis.suggestions);
-        } else {
-          setAnalysisError('Analysis completed but no suggestions were generated');
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
+        setAnalysisError(errorData.detail || 'Failed to analyze session');
+        return;
+      }
+
+      let job = await response.json();
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const poll = await fetch(`${API_URLS.ANALYSIS}/jobs/${job.job_id}`);
+        if (!poll.ok) {
+          setAnalysisError('Lost track of the analysis job');
+          return;
         }
+        job = await poll.json();
+      }
+
+      if (job.status === 'succeeded' && job.result && job.result.suggestions) {
+        setPostureAnalysis(job.result.suggestions);
+      } else if (job.status === 'succeeded') {
+        setAnalysisError('Analysis completed but no suggestions were generated');
       } else {
-        const errorData = await response.json().catch(() => ({ message: 'Unknown error' }));
-        setAnalysisError(errorData.message || 'Failed to analyze session');
+        setAnalysisError(job.error || 'Failed to analyze session');
       }
     } catch (error) {
       setAnalysisError('Network error during analysis');